@@ -0,0 +1,202 @@
+"""Benchmark sintético del monitor de juegos (``cogs.eventosjuegos``).
+
+Construye guilds falsos de distintos tamaños y mide, por tick:
+``get_monitored_players_cached`` en frío, el tiempo acumulado en
+``_update_game_state_optimized``, el tick completo de
+``unified_game_monitor`` y el comando ``ºestado_juegos``. Un segundo pase
+con ``tracemalloc`` mide las asignaciones. No usa red.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_monitor
+    python -m benchmarks.bench_monitor --members 1000 10000 --play-rate 0.3 --ticks 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from benchmarks.fakes import FakeBot, FakeContext, FakeHttpSession, build_guild, churn_activities
+from utils.json_store import JsonStore
+from utils.outbound import OutboundScheduler
+
+@contextmanager
+def _in_temp_dir():
+    """Los cogs escriben en rutas relativas (json/, db/): se aíslan en un temporal"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+class _Timer:
+    """Envuelve un método de instancia y acumula su tiempo y llamadas"""
+
+    def __init__(self, obj, name: str):
+        self.calls = 0
+        self.total = 0.0
+        original = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.total += time.perf_counter() - start
+                self.calls += 1
+
+        setattr(obj, name, wrapper)
+
+    def reset(self):
+        self.calls = 0
+        self.total = 0.0
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'max': samples[-1],
+    }
+
+def _fmt_ms(stats) -> str:
+    return f"{stats['mean'] * 1000:9.2f} {stats['p50'] * 1000:9.2f} {stats['max'] * 1000:9.2f}"
+
+async def _make_cog(bot):
+    from cogs.eventosjuegos import EventosJuegosOptimizado
+
+    cog = EventosJuegosOptimizado(bot)
+    cog.unified_game_monitor.cancel()  # los ticks se invocan a mano
+    cog._http_session = FakeHttpSession()
+    return cog
+
+def _reset_caches(cog):
+    cog._member_cache.clear()
+    cog._last_member_update.clear()
+    cog.last_check = cog.last_check.replace(year=2000)
+
+async def _tick(cog):
+    _reset_caches(cog)
+    await cog.unified_game_monitor.coro(cog)
+
+async def bench_size(n_members: int, args) -> dict:
+    bot = FakeBot()
+    bot.json_store = JsonStore(flush_interval=3600)  # la persistencia diferida no interfiere con la medida
+    if not args.real_rate_limits:
+        # Se mide CPU, no el ritmo de Discord: el scheduler de envíos no limita
+        bot.outbound = OutboundScheduler(rate=1e9, burst=1e9)
+    cog = await _make_cog(bot)
+    guild = build_guild(
+        bot, n_members,
+        monitored_roles=cog.roles_monitoreados,
+        monitored_rate=args.monitored_rate,
+        play_rate=args.play_rate,
+        n_games=args.games,
+        seed=args.seed
+    )
+    ctx = FakeContext(bot, guild)
+    update_timer = _Timer(cog, '_update_game_state_optimized')
+
+    players_t, update_t, update_calls, tick_t, estado_t = [], [], [], [], []
+    rest_before = sum(bot.rest_calls.values())
+
+    for i in range(args.ticks):
+        churn_activities(guild, args.churn, args.play_rate, args.games, seed=args.seed + i)
+
+        _reset_caches(cog)
+        update_timer.reset()
+        start = time.perf_counter()
+        await cog.get_monitored_players_cached(guild)
+        players_t.append(time.perf_counter() - start)
+        update_t.append(update_timer.total)
+        update_calls.append(update_timer.calls)
+
+        start = time.perf_counter()
+        await _tick(cog)
+        tick_t.append(time.perf_counter() - start)
+
+        _reset_caches(cog)
+        start = time.perf_counter()
+        await cog.check_current_games_optimized.callback(cog, ctx)
+        estado_t.append(time.perf_counter() - start)
+
+    rest_calls = sum(bot.rest_calls.values()) - rest_before
+
+    # Pase de asignaciones (tracemalloc ralentiza, por eso va aparte)
+    churn_activities(guild, args.churn, args.play_rate, args.games, seed=args.seed + args.ticks)
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    await _tick(cog)
+    _, tick_peak = tracemalloc.get_traced_memory()
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    _reset_caches(cog)
+    await cog.check_current_games_optimized.callback(cog, ctx)
+    _, estado_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    diff = snapshot_after.compare_to(snapshot_before, 'filename')
+    net_bytes = sum(stat.size_diff for stat in diff)
+    net_blocks = sum(stat.count_diff for stat in diff)
+
+    await cog.cog_unload()
+    await bot.outbound.close()
+
+    return {
+        'members': n_members,
+        'monitored': sum(1 for m in guild.members if any(r.id in cog.roles_monitoreados for r in m.roles)),
+        'playing': sum(1 for m in guild.members if m.activities),
+        'players': _summary(players_t),
+        'update': _summary(update_t),
+        'update_calls': statistics.fmean(update_calls),
+        'tick': _summary(tick_t),
+        'estado': _summary(estado_t),
+        'tick_peak_kib': tick_peak / 1024,
+        'estado_peak_kib': estado_peak / 1024,
+        'tick_net_kib': net_bytes / 1024,
+        'tick_net_blocks': net_blocks,
+        'rest_per_tick': rest_calls / args.ticks,
+    }
+
+def _print_report(results, args):
+    print(f"play_rate={args.play_rate} monitored_rate={args.monitored_rate} games={args.games} "
+          f"churn={args.churn} ticks={args.ticks}")
+    print(f"{'':32}{'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+    for r in results:
+        print(f"\n== {r['members']} miembros ({r['monitored']} monitorizados, {r['playing']} jugando) ==")
+        print(f"{'get_monitored_players_cached':32}{_fmt_ms(r['players'])}")
+        print(f"{'  _update_game_state_optimized':32}{_fmt_ms(r['update'])}   ({r['update_calls']:.0f} llamadas/tick)")
+        print(f"{'unified_game_monitor (tick)':32}{_fmt_ms(r['tick'])}")
+        print(f"{'ºestado_juegos':32}{_fmt_ms(r['estado'])}")
+        print(f"pico memoria tick: {r['tick_peak_kib']:.0f} KiB · estado_juegos: {r['estado_peak_kib']:.0f} KiB · "
+              f"neto tick: {r['tick_net_kib']:+.0f} KiB ({r['tick_net_blocks']:+d} bloques) · "
+              f"REST/tick: {r['rest_per_tick']:.1f}")
+
+async def main(args):
+    results = []
+    with _in_temp_dir():
+        for n in args.members:
+            results.append(await bench_size(n, args))
+    _print_report(results, args)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--play-rate', type=float, default=0.2, help='fracción de miembros jugando')
+    parser.add_argument('--monitored-rate', type=float, default=0.5, help='fracción con rol monitorizado')
+    parser.add_argument('--games', type=int, default=25, help='número de juegos distintos')
+    parser.add_argument('--churn', type=float, default=0.05, help='fracción de miembros que cambia de juego por tick')
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real-rate-limits', action='store_true',
+                        help='usa los token buckets reales del scheduler de envíos (los ticks esperan)')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,302 @@
+"""Benchmark de la persistencia de los cogs a escala.
+
+Genera datasets realistas para cada almacén (cumpleaños, horarios y
+eventos de juegos) de 100 a 100k usuarios y mide, para cada backend:
+tiempo de carga, latencia por mutación (tiempo que bloquea el event loop
+y tiempo de disco), número de escrituras, tamaño del fichero y memoria
+pico.
+
+Backends:
+    legacy      json.dump síncrono de todo el fichero en cada cambio (lo de antes)
+    json_store  utils.json_store (marcar sucio + escritura diferida en un hilo)
+    sqlite_kv   una fila por usuario en SQLite (WAL), como referencia
+
+Añadir un backend es subclasificar ``Backend`` y registrarlo en BACKENDS.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_persistence
+    python -m benchmarks.bench_persistence --users 1000 100000 --stores birthdays --mutations 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from utils.json_store import JsonStore
+
+DIAS = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+# --- Datasets ---
+
+def _uid(rng):
+    return str(rng.randrange(10**17, 10**18))
+
+def gen_birthdays(n, rng):
+    return {_uid(rng): {"day": rng.randint(1, 28), "month": rng.randint(1, 12),
+                        "year": rng.randint(1970, 2010), "name": f"Usuario {i}"}
+            for i in range(n)}
+
+def mutate_birthdays(data, rng):
+    user = _uid(rng)
+    data[user] = {"day": rng.randint(1, 28), "month": rng.randint(1, 12), "year": 2000, "name": "Nuevo"}
+    return user
+
+def gen_horarios(n, rng):
+    data = {}
+    for i in range(n):
+        data[_uid(rng)] = {
+            dia: {"entrada": f"{rng.randint(6, 10):02d}:00", "salida": f"{rng.randint(14, 22):02d}:00",
+                  "canal": 498474737563861004, "nombre": f"Usuario {i}"}
+            for dia in rng.sample(DIAS, rng.randint(1, 7))
+        }
+    return data
+
+def mutate_horarios(data, rng):
+    user = rng.choice(list(data)) if data and rng.random() < 0.7 else _uid(rng)
+    data.setdefault(user, {})[rng.choice(DIAS)] = {
+        "entrada": "09:00", "salida": "17:30", "canal": 498474737563861004, "nombre": "Editado"}
+    return user
+
+def gen_events(n, rng):
+    # Sesiones de 5 jugadores repartidas en 20 guilds
+    events = {}
+    for s in range(max(1, n // 5)):
+        guild = events.setdefault(str(10**17 + s % 20), {})
+        guild[f"Juego {s}"] = {
+            "event_id": rng.randrange(10**17, 10**18),
+            "start_time": "2025-01-01T20:00:00+00:00",
+            "last_update": "2025-01-01T20:30:00",
+            "player_names": [f"Jugador {s}-{p}" for p in range(5)],
+            "channel_message": {"message_id": rng.randrange(10**17, 10**18), "timestamp": "2025-01-01T20:30:00"},
+        }
+    return {"active_events": events}
+
+def mutate_events(data, rng):
+    guild = rng.choice(list(data["active_events"].values()))
+    session = guild[rng.choice(list(guild))]
+    session["player_names"] = session["player_names"][1:] + [f"Jugador {rng.randrange(10**6)}"]
+    return "active_events"
+
+STORES = {
+    # nombre: (generador, mutación que devuelve la clave de primer nivel tocada, formato del código anterior)
+    'birthdays': (gen_birthdays, mutate_birthdays, {'indent': 4, 'ensure_ascii': False}),
+    'horarios': (gen_horarios, mutate_horarios, {'ensure_ascii': False}),
+    'events_data': (gen_events, mutate_events, {'indent': 2}),
+}
+
+# --- Backends ---
+
+class Backend:
+    name = "base"
+
+    def __init__(self, directory: str, store: str, legacy_format: dict):
+        self.directory = directory
+        self.store = store
+        self.legacy_format = legacy_format
+        self.path = os.path.join(directory, f"{store}.json")
+        self.loop_times = []   # tiempo que bloquea el event loop por mutación
+        self.disk_times = []   # latencia de disco por escritura
+        self.writes = 0
+
+    async def setup(self, data):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **self.legacy_format)
+
+    async def load(self):
+        raise NotImplementedError
+
+    async def mutate(self, mutation, rng):
+        raise NotImplementedError
+
+    async def finish(self):
+        pass
+
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+class LegacyBackend(Backend):
+    name = "legacy"
+
+    async def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.data = json.load(f)
+
+    async def mutate(self, mutation, rng):
+        start = time.perf_counter()
+        mutation(self.data, rng)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, **self.legacy_format)
+        elapsed = time.perf_counter() - start
+        self.loop_times.append(elapsed)
+        self.disk_times.append(elapsed)
+        self.writes += 1
+
+class JsonStoreBackend(Backend):
+    """Ráfagas de ``burst`` mutaciones: cada ráfaga cuesta una escritura"""
+    name = "json_store"
+    burst = 10
+
+    async def load(self):
+        self.json_store = JsonStore(base_dir=self.directory, flush_interval=3600)
+        self.doc = self.json_store.document(self.store)
+        self.pending = 0
+
+    async def mutate(self, mutation, rng):
+        start = time.perf_counter()
+        mutation(self.doc.data, rng)
+        self.doc.mark_dirty()
+        self.loop_times.append(time.perf_counter() - start)
+        self.pending += 1
+        if self.pending >= self.burst:
+            await self._flush()
+
+    async def _flush(self):
+        writes_before = self.doc.writes
+        # La serialización se hace en el loop: se mide aparte de la escritura en disco
+        start = time.perf_counter()
+        self.doc.serialize()
+        serialize = time.perf_counter() - start
+        await self.doc.flush()
+        if self.doc.writes > writes_before:
+            self.writes += 1
+            self.disk_times.append(self.doc.last_latency)
+            share = serialize / max(1, self.pending)
+            self.loop_times[-self.pending:] = [t + share for t in self.loop_times[-self.pending:]]
+        self.pending = 0
+
+    async def finish(self):
+        if self.pending:
+            await self._flush()
+        await self.json_store.close()
+        self.json_store._executor.shutdown(wait=True)
+
+class SqliteKVBackend(Backend):
+    """Una fila JSON por clave de primer nivel; cada mutación reescribe solo esa fila"""
+    name = "sqlite_kv"
+
+    async def setup(self, data):
+        self.path = os.path.join(self.directory, f"{self.store}.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        with conn:
+            conn.executemany("INSERT INTO kv VALUES (?, ?)",
+                             ((k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()))
+        conn.close()
+
+    async def load(self):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.data = {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM kv")}
+
+    async def mutate(self, mutation, rng):
+        start = time.perf_counter()
+        key = mutation(self.data, rng)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?)",
+                              (key, json.dumps(self.data[key], ensure_ascii=False)))
+        elapsed = time.perf_counter() - start
+        self.loop_times.append(elapsed)
+        self.disk_times.append(elapsed)
+        self.writes += 1
+
+    async def finish(self):
+        self.conn.close()
+
+    def size(self) -> int:
+        wal = self.path + "-wal"
+        return os.path.getsize(self.path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+BACKENDS = {cls.name: cls for cls in (LegacyBackend, JsonStoreBackend, SqliteKVBackend)}
+
+# --- Ejecución ---
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def _run(store: str, backend_name: str, users: int, mutations: int, seed: int, trace_memory: bool):
+    generate, mutation, legacy_format = STORES[store]
+    rng = random.Random(seed)
+    data = generate(users, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = BACKENDS[backend_name](tmp, store, legacy_format)
+        await backend.setup(data)
+        del data
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await backend.load()
+        load_time = time.perf_counter() - start
+
+        for _ in range(mutations):
+            await backend.mutate(mutation, rng)
+        await backend.finish()
+
+        peak = 0
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return backend, load_time, backend.size(), peak
+
+async def bench(store: str, backend_name: str, users: int, mutations: int, seed: int) -> dict:
+    # tracemalloc ralentiza mucho: los tiempos y la memoria se miden en pases separados
+    backend, load_time, size, _ = await _run(store, backend_name, users, mutations, seed, trace_memory=False)
+    _, _, _, peak = await _run(store, backend_name, users, min(mutations, 3), seed, trace_memory=True)
+
+    return {
+        'store': store,
+        'backend': backend_name,
+        'users': users,
+        'load_ms': load_time * 1000,
+        'loop_ms_mean': statistics.fmean(backend.loop_times) * 1000,
+        'loop_ms_p99': _pct(backend.loop_times, 0.99) * 1000,
+        'disk_ms_mean': statistics.fmean(backend.disk_times) * 1000 if backend.disk_times else 0.0,
+        'writes': backend.writes,
+        'mutations': mutations,
+        'size_kib': size / 1024,
+        'peak_mib': peak / (1024 * 1024),
+    }
+
+def _print_table(results):
+    header = (f"{'store':12} {'backend':11} {'usuarios':>9} {'carga ms':>9} {'loop ms/mut':>12} "
+              f"{'p99 ms':>8} {'disco ms/esc':>13} {'escrituras':>11} {'KiB':>9} {'pico MiB':>9}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['store']:12} {r['backend']:11} {r['users']:>9} {r['load_ms']:>9.1f} {r['loop_ms_mean']:>12.3f} "
+              f"{r['loop_ms_p99']:>8.2f} {r['disk_ms_mean']:>13.2f} {r['writes']:>5}/{r['mutations']:<5} "
+              f"{r['size_kib']:>9.0f} {r['peak_mib']:>9.1f}")
+
+async def main(args):
+    results = []
+    for store in args.stores:
+        for users in args.users:
+            for backend in args.backends:
+                results.append(await bench(store, backend, users, args.mutations, args.seed))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument('--stores', nargs='+', choices=list(STORES), default=list(STORES))
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--mutations', type=int, default=50, help='mutaciones medidas por combinación')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
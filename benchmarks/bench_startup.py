@@ -0,0 +1,121 @@
+"""Perfil de arranque en frío: tiempo de importación y memoria residente.
+
+Cada medida se hace en un proceso nuevo para que la caché de módulos no
+falsee los resultados. Compara:
+
+    eager  lo de antes: todos los cogs (incluidos magik y voicechat) y sus
+           dependencias pesadas importadas al arrancar
+    lazy   lo de ahora: solo los cogs que main.py carga al arrancar, con
+           las dependencias pesadas diferidas (utils.lazy)
+
+Las dependencias que no estén instaladas se omiten (y se indica cuáles).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --importtime 15
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ['cv2', 'numpy', 'PIL.Image', 'yt_dlp', 'aiohttp', 'psutil']
+
+# Mismas listas que main.py (importar main arrancaría el bot)
+COGS_AL_ARRANCAR = ['cogs.basico', 'cogs.cumpleanos', 'cogs.flexionesdelguille', 'cogs.eventosjuegos',
+                    'cogs.BeerNight', 'cogs.robusotrabaja', 'cogs.grabadora']
+COGS_BAJO_DEMANDA = ['cogs.magik', 'cogs.voicechat']
+
+def _installed(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+def _modules(mode: str):
+    if mode == 'eager':
+        return [m for m in HEAVY if _installed(m)] + COGS_AL_ARRANCAR + COGS_BAJO_DEMANDA
+    return COGS_AL_ARRANCAR
+
+# Se ejecuta en el proceso hijo: importa y devuelve tiempo, RSS y módulos pesados cargados
+_CHILD = r"""
+import importlib, json, resource, sys, time
+import discord  # lo importa main.py antes que los cogs en los dos casos
+start = time.perf_counter()
+errors = {}
+for name in json.loads(sys.argv[1]):
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        errors[name] = f"{type(e).__name__}: {e}"
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in json.loads(sys.argv[2]) if m in sys.modules]
+print(json.dumps({'ms': elapsed, 'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  'heavy': heavy, 'errors': errors}))
+"""
+
+def measure(mode: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, '-c', _CHILD, json.dumps(_modules(mode)), json.dumps(HEAVY)],
+        capture_output=True, text=True, check=True, cwd=os.getcwd(),
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def importtime_top(mode: str, top: int):
+    """Los ``top`` módulos con más tiempo acumulado según ``-X importtime``"""
+    code = "import discord, importlib, json, sys\nfor n in json.loads(sys.argv[1]):\n    try: importlib.import_module(n)\n    except Exception: pass"
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code, json.dumps(_modules(mode))],
+                         capture_output=True, text=True, cwd=os.getcwd())
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        if len(name) - len(name.lstrip()) <= 2:  # Solo importaciones de primer nivel
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help="procesos por modo (se toma la mediana)")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="muestra los N módulos más lentos de importar en cada modo")
+    parser.add_argument('--json', action='store_true', help="salida en JSON")
+    args = parser.parse_args()
+
+    missing = [m for m in HEAVY if not _installed(m)]
+    results = {}
+    for mode in ('eager', 'lazy'):
+        runs = [measure(mode) for _ in range(args.repeat)]
+        results[mode] = {
+            'ms': statistics.median(r['ms'] for r in runs),
+            'rss_mb': statistics.median(r['rss_mb'] for r in runs),
+            'heavy': runs[-1]['heavy'],
+            'errors': runs[-1]['errors'],
+        }
+
+    if args.json:
+        print(json.dumps({'missing': missing, **results}, indent=2))
+        return
+
+    if missing:
+        print(f"No instalados (omitidos): {', '.join(missing)}")
+    print(f"{'modo':<6} {'import ms':>10} {'RSS MB':>8}  dependencias pesadas cargadas")
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['ms']:>10.0f} {r['rss_mb']:>8.1f}  {', '.join(r['heavy']) or '-'}")
+        for name, error in r['errors'].items():
+            print(f"       ! {name}: {error}")
+    eager, lazy = results['eager'], results['lazy']
+    print(f"\nAhorro: {eager['ms'] - lazy['ms']:.0f} ms y {eager['rss_mb'] - lazy['rss_mb']:.1f} MB de RSS")
+
+    if args.importtime:
+        for mode in ('eager', 'lazy'):
+            print(f"\n-X importtime ({mode}), acumulado:")
+            for cumulative_us, name in importtime_top(mode, args.importtime):
+                print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""Objetos falsos de discord.py para ejecutar los cogs sin red.
+
+Solo implementan lo que usan los cogs (ids, roles, actividades, canales,
+mensajes y eventos programados); las llamadas REST se registran en
+``FakeBot.rest_calls`` en lugar de hacerse.
+"""
+import io
+import itertools
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import discord
+from PIL import Image
+
+_ids = itertools.count(10**17)
+
+def next_id() -> int:
+    return next(_ids)
+
+@dataclass(eq=False)
+class FakeRole:
+    id: int
+    name: str = "rol"
+
+@dataclass(eq=False)
+class FakeAsset:
+    url: str
+
+@dataclass(eq=False)
+class FakeMember:
+    id: int
+    display_name: str
+    roles: List[FakeRole]
+    activities: tuple = ()
+    voice: object = None
+    display_avatar: Optional[FakeAsset] = None
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+class FakeMessage:
+    def __init__(self, bot, channel, content=None, embed=None, **kwargs):
+        self.id = next_id()
+        self.bot = bot
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+
+    async def edit(self, **kwargs):
+        self.bot.rest_calls['message.edit'] += 1
+        self.embed = kwargs.get('embed', self.embed)
+        return self
+
+class FakeChannel:
+    def __init__(self, bot, channel_id: Optional[int] = None, name: str = "general"):
+        self.bot = bot
+        self.id = channel_id or next_id()
+        self.name = name
+        self.sent: List[FakeMessage] = []
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, **kwargs):
+        self.bot.rest_calls['channel.send'] += 1
+        message = FakeMessage(self.bot, self, content, **kwargs)
+        self.sent.append(message)
+        return message
+
+    def get_partial_message(self, message_id: int):
+        message = FakeMessage(self.bot, self)
+        message.id = message_id
+        return message
+
+class FakeScheduledEvent:
+    def __init__(self, guild, name: str):
+        self.id = next_id()
+        self.guild = guild
+        self.guild_id = guild.id
+        self.name = name
+        self.status = discord.EventStatus.scheduled
+
+    @property
+    def url(self) -> str:
+        return f"https://discord.com/events/{self.guild_id}/{self.id}"
+
+    async def start(self, **kwargs):
+        self.guild.bot.rest_calls['scheduled_event.edit'] += 1
+        self.status = discord.EventStatus.active
+        return self
+
+    async def edit(self, *, status=None, **kwargs):
+        self.guild.bot.rest_calls['scheduled_event.edit'] += 1
+        if status is not None:
+            self.status = status
+        return self
+
+    async def end(self, **kwargs):
+        return await self.edit(status=discord.EventStatus.completed)
+
+class FakeGuild:
+    def __init__(self, bot, members: List[FakeMember], roles: List[FakeRole], guild_id: Optional[int] = None):
+        self.bot = bot
+        self.id = guild_id or next_id()
+        self.name = f"guild-{self.id}"
+        self.roles = roles
+        self.members = members
+        self.channels: List[FakeChannel] = []
+        self._members: Dict[int, FakeMember] = {m.id: m for m in members}
+        self._events: Dict[int, FakeScheduledEvent] = {}
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+    def add_member(self, member: FakeMember):
+        self._members[member.id] = member
+        self.members.append(member)
+
+    def get_channel(self, channel_id: int):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+    def get_scheduled_event(self, event_id: int):
+        return self._events.get(event_id)
+
+    async def fetch_scheduled_event(self, event_id: int, **kwargs):
+        self.bot.rest_calls['scheduled_event.fetch'] += 1
+        event = self._events.get(event_id)
+        if event is None:
+            raise discord.NotFound(_FakeResponse(404), "Unknown Guild Scheduled Event")
+        return event
+
+    async def fetch_scheduled_events(self, **kwargs):
+        self.bot.rest_calls['scheduled_event.list'] += 1
+        return list(self._events.values())
+
+    async def create_scheduled_event(self, *, name: str, **kwargs):
+        self.bot.rest_calls['scheduled_event.create'] += 1
+        event = FakeScheduledEvent(self, name)
+        self._events[event.id] = event
+        return event
+
+class _FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+        self.reason = "fake"
+
+class FakeUser:
+    def __init__(self, bot, user_id: int, name: str = "usuario"):
+        self.bot = bot
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.sent: List[FakeMessage] = []
+
+    async def send(self, content=None, **kwargs):
+        self.bot.rest_calls['user.send'] += 1
+        message = FakeMessage(self.bot, self, content, **kwargs)
+        self.sent.append(message)
+        return message
+
+class FakeBot:
+    """Bot mínimo: guilds, canales y usuarios en memoria"""
+
+    def __init__(self):
+        self.guilds: List[FakeGuild] = []
+        self.channels: Dict[int, FakeChannel] = {}
+        self.users: Dict[int, FakeUser] = {}
+        self.rest_calls: Counter = Counter()
+        self.latency = 0.05
+        self.user = FakeUser(self, next_id(), "bot")
+
+    def get_channel(self, channel_id: int):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(self, channel_id)
+        return channel
+
+    def get_guild(self, guild_id: int):
+        return next((g for g in self.guilds if g.id == guild_id), None)
+
+    def get_user(self, user_id: int):
+        return self.users.get(user_id)
+
+    async def fetch_user(self, user_id: int):
+        self.rest_calls['user.fetch'] += 1
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = FakeUser(self, user_id)
+        return user
+
+    async def wait_until_ready(self):
+        return None
+
+    def is_closed(self) -> bool:
+        return False
+
+class FakeContext:
+    """Contexto de comando que guarda las respuestas"""
+
+    def __init__(self, bot: FakeBot, guild: FakeGuild, author=None, channel: Optional[FakeChannel] = None):
+        self.bot = bot
+        self.guild = guild
+        self.author = author or bot.user
+        self.channel = channel or FakeChannel(bot)
+        self.prefix = "º"
+        self.replies: List[dict] = []
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append({'content': content, **kwargs})
+        return await self.channel.send(content, **kwargs)
+
+def build_guild(bot: FakeBot, n_members: int, *, monitored_roles=(), monitored_rate: float = 0.5,
+                play_rate: float = 0.2, n_games: int = 25, seed: int = 0) -> FakeGuild:
+    """Crea un guild sintético.
+
+    ``monitored_rate`` es la fracción de miembros con algún rol monitorizado
+    y ``play_rate`` la fracción de miembros que está jugando a uno de
+    ``n_games`` juegos (con popularidad tipo Zipf).
+    """
+    rng = random.Random(seed)
+    monitored = [FakeRole(role_id, f"monitorizado-{role_id}") for role_id in monitored_roles]
+    others = [FakeRole(next_id(), f"rol-{i}") for i in range(20)]
+    games = [discord.Game(name=f"Juego {i}") for i in range(n_games)]
+    weights = [1 / (i + 1) for i in range(n_games)]
+
+    members = []
+    for i in range(n_members):
+        roles = rng.sample(others, 3)
+        if monitored and rng.random() < monitored_rate:
+            roles.append(rng.choice(monitored))
+        activities = (rng.choices(games, weights)[0],) if rng.random() < play_rate else ()
+        member_id = next_id()
+        members.append(FakeMember(
+            id=member_id,
+            display_name=f"miembro{i}",
+            roles=roles,
+            activities=activities,
+            display_avatar=FakeAsset(f"https://cdn.discordapp.com/avatars/{member_id}/a.png")
+        ))
+
+    guild = FakeGuild(bot, members, monitored + others)
+    bot.guilds.append(guild)
+    return guild
+
+def churn_activities(guild: FakeGuild, fraction: float, play_rate: float, n_games: int, seed: int = 0):
+    """Cambia la actividad de una fracción de miembros (simula entradas/salidas de juegos)"""
+    rng = random.Random(seed)
+    games = [discord.Game(name=f"Juego {i}") for i in range(n_games)]
+    weights = [1 / (i + 1) for i in range(n_games)]
+    for member in rng.sample(guild.members, int(len(guild.members) * fraction)):
+        member.activities = (rng.choices(games, weights)[0],) if rng.random() < play_rate else ()
+
+def fake_avatar_png(seed: int, size: int = 128) -> bytes:
+    """PNG sintético para sustituir la descarga de avatares"""
+    rng = random.Random(seed)
+    img = Image.new('RGBA', (size, size), (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class _FakeHttpResponse:
+    def __init__(self, data: bytes):
+        self.status = 200
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeHttpSession:
+    """Sustituye a aiohttp.ClientSession: cada URL devuelve un PNG sintético"""
+
+    def __init__(self):
+        self.closed = False
+        self.requests = 0
+
+    def get(self, url: str, **kwargs):
+        self.requests += 1
+        return _FakeHttpResponse(fake_avatar_png(hash(url)))
+
+    async def close(self):
+        self.closed = True
@@ -0,0 +1,291 @@
+"""Reproduce una traza del gateway contra los cogs con un reloj falso.
+
+La traza (grabada con ``ºgrabar_gateway`` o generada con ``--storm``) se
+aplica sobre los objetos falsos de ``benchmarks.fakes``: cada evento cambia
+el estado del miembro/guild y se despacha a los listeners de los cogs, y el
+tick de ``unified_game_monitor`` se ejecuta cada ``check_interval`` segundos
+del tiempo de la traza. Con ``--speed 0`` va tan rápido como puede; con
+``--speed 1`` respeta el ritmo original (``--speed 10`` = 10x).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.replay traces/gateway_20250101_120000.jsonl.gz
+    python -m benchmarks.replay --storm 20000 --storm-out /tmp/storm.jsonl.gz
+    python -m benchmarks.replay /tmp/storm.jsonl.gz --speed 0 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import discord
+
+from benchmarks.fakes import (FakeBot, FakeContext, FakeGuild, FakeHttpSession, FakeMember, FakeRole,
+                              FakeAsset)
+from utils.gateway_trace import TRACE_VERSION, read_trace, write_trace
+from utils.json_store import JsonStore
+from utils.outbound import OutboundScheduler
+
+class FakeClock:
+    """Reloj de la traza: ``discord.utils.utcnow`` devuelve este tiempo"""
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.offset_ms = 0
+
+    def now(self) -> datetime:
+        return self.start + timedelta(milliseconds=self.offset_ms)
+
+def _games(names):
+    return tuple(discord.Game(name=name) for name in names)
+
+def _voice(channel_id):
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id)) if channel_id else None
+
+def build_world(header: dict) -> FakeBot:
+    """Construye bot y guilds falsos a partir de la foto inicial de la traza"""
+    bot = FakeBot()
+    for g in header['guilds']:
+        roles = {role_id: FakeRole(role_id) for role_id in g['roles']}
+        members = [
+            FakeMember(
+                id=member_id,
+                display_name=name,
+                roles=[roles.setdefault(r, FakeRole(r)) for r in role_ids],
+                activities=_games(games),
+                voice=_voice(voice),
+                display_avatar=FakeAsset(f"https://cdn.discordapp.com/avatars/{member_id}/a.png")
+            )
+            for member_id, name, role_ids, games, voice in g['members']
+        ]
+        guild = FakeGuild(bot, members, list(roles.values()), guild_id=g['id'])
+        guild.name = g.get('name', guild.name)
+        bot.guilds.append(guild)
+    return bot
+
+class Replayer:
+    def __init__(self, bot: FakeBot, cogs, clock: FakeClock):
+        self.bot = bot
+        self.cogs = cogs
+        self.clock = clock
+        self.guilds = {g.id: g for g in bot.guilds}
+        self.applied = 0
+
+    async def dispatch(self, event: str, *args):
+        """Llama a los listeners ``event`` de los cogs cargados"""
+        for cog in self.cogs:
+            for name, listener in cog.get_listeners():
+                if name == event:
+                    await listener(*args)
+
+    def _role(self, guild, role_id):
+        role = next((r for r in guild.roles if r.id == role_id), None)
+        if role is None:
+            role = FakeRole(role_id)
+            guild.roles.append(role)
+        return role
+
+    async def apply(self, event: list):
+        dt, kind, guild_id, *fields = event
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            return
+        self.applied += 1
+
+        if kind == "p":
+            member = guild.get_member(fields[0])
+            if member is not None:
+                member.activities = _games(fields[1])
+        elif kind == "mj":
+            member_id, name, role_ids, games = fields
+            member = FakeMember(member_id, name, [self._role(guild, r) for r in role_ids], _games(games),
+                                display_avatar=FakeAsset(f"https://cdn.discordapp.com/avatars/{member_id}/a.png"))
+            guild.add_member(member)
+            await self.dispatch("on_member_join", member)
+        elif kind == "mu":
+            member = guild.get_member(fields[0])
+            if member is not None:
+                member.display_name = fields[1]
+                member.roles = [self._role(guild, r) for r in fields[2]]
+        elif kind == "mr":
+            member = guild._members.pop(fields[0], None)
+            if member is not None:
+                guild.members.remove(member)
+                await self.dispatch("on_member_remove", member)
+        elif kind == "v":
+            member = guild.get_member(fields[0])
+            if member is not None:
+                member.voice = _voice(fields[1])
+        elif kind in ("se", "sd"):
+            event_obj = guild._events.get(fields[0])
+            if kind == "sd":
+                if event_obj is not None:
+                    del guild._events[fields[0]]
+                    await self.dispatch("on_scheduled_event_delete", event_obj)
+            elif event_obj is not None:
+                event_obj.status = discord.EventStatus(fields[1])
+                await self.dispatch("on_scheduled_event_update", event_obj, event_obj)
+
+async def replay(path: str, speed: float = 0, check_interval: float = 30) -> dict:
+    from cogs.eventosjuegos import EventosJuegosOptimizado
+
+    header, events = read_trace(path)
+    clock = FakeClock(datetime.fromisoformat(header['started_at']))
+    bot = build_world(header)
+    bot.outbound = OutboundScheduler(rate=1e9, burst=1e9)
+    bot.json_store = JsonStore(flush_interval=3600)
+
+    with mock.patch('discord.utils.utcnow', clock.now):
+        cog = EventosJuegosOptimizado(bot)
+        cog.unified_game_monitor.cancel()
+        cog._http_session = FakeHttpSession()
+        cog.check_interval = check_interval
+        replayer = Replayer(bot, [cog], clock)
+
+        tick_times = []
+        interval_ms = int(check_interval * 1000)
+        next_tick = interval_ms
+        real_start = time.perf_counter()
+        apply_time = 0.0
+        last_dt = 0
+
+        async def run_ticks_until(dt):
+            nonlocal next_tick
+            while next_tick <= dt:
+                clock.offset_ms = next_tick
+                start = time.perf_counter()
+                await cog.unified_game_monitor.coro(cog)
+                tick_times.append(time.perf_counter() - start)
+                next_tick += interval_ms
+
+        for event in events:
+            dt = event[0]
+            await run_ticks_until(dt)
+            if speed > 0:
+                delay = real_start + dt / 1000 / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            clock.offset_ms = dt
+            start = time.perf_counter()
+            await replayer.apply(event)
+            apply_time += time.perf_counter() - start
+            last_dt = dt
+
+        # Un último tick para procesar el estado final
+        await run_ticks_until(last_dt + interval_ms)
+        wall = time.perf_counter() - real_start
+
+        estado_start = time.perf_counter()
+        if bot.guilds:
+            await cog.check_current_games_optimized.callback(cog, FakeContext(bot, bot.guilds[0]))
+        estado_time = time.perf_counter() - estado_start
+
+        await cog.cog_unload()
+    await bot.outbound.close()
+
+    ticks = sorted(tick_times) or [0.0]
+    return {
+        'trace': os.path.basename(path),
+        'events': replayer.applied,
+        'trace_seconds': last_dt / 1000,
+        'wall_seconds': wall,
+        'events_per_second': replayer.applied / apply_time if apply_time else 0.0,
+        'ticks': len(tick_times),
+        'tick_ms_mean': statistics.fmean(ticks) * 1000,
+        'tick_ms_p95': ticks[int(len(ticks) * 0.95) - 1 if len(ticks) > 1 else 0] * 1000,
+        'tick_ms_max': ticks[-1] * 1000,
+        'estado_juegos_ms': estado_time * 1000,
+        'active_sessions': len(cog.games_state),
+        'rest_calls': dict(bot.rest_calls),
+    }
+
+def make_storm_trace(path: str, members: int = 10_000, storm_fraction: float = 0.3,
+                     storm_seconds: float = 60, duration: float = 1800, seed: int = 0) -> str:
+    """Genera una traza sintética: tras una actualización, muchos lanzan el mismo juego"""
+    from cogs.eventosjuegos import ROLES_MONITOREADOS
+
+    rng = random.Random(seed)
+    monitored = sorted(ROLES_MONITOREADOS)
+    guild_id = 10**17
+    roles = monitored + [guild_id + i for i in range(1, 6)]
+    snapshot = []
+    for i in range(members):
+        role_ids = [rng.choice(roles[2:])]
+        if rng.random() < 0.5:
+            role_ids.append(rng.choice(monitored))
+        games = [f"Juego {rng.randrange(10)}"] if rng.random() < 0.1 else []
+        snapshot.append([guild_id + 1000 + i, f"miembro{i}", role_ids, games, None])
+
+    events = []
+    storm_start = rng.uniform(60, 120)
+    for member_id, _, _, _, _ in rng.sample(snapshot, int(members * storm_fraction)):
+        t = storm_start + rng.expovariate(3 / storm_seconds)
+        events.append([int(t * 1000), "p", guild_id, member_id, ["Juego Actualizado"]])
+        leave = t + rng.uniform(600, duration)
+        if leave < duration:
+            events.append([int(leave * 1000), "p", guild_id, member_id, []])
+    for _ in range(members // 10):
+        member_id = rng.choice(snapshot)[0]
+        t = rng.uniform(0, duration)
+        events.append([int(t * 1000), "p", guild_id, member_id, [f"Juego {rng.randrange(10)}"] if rng.random() < 0.5 else []])
+    events.sort(key=lambda e: e[0])
+
+    header = {
+        'version': TRACE_VERSION,
+        'started_at': '2025-01-01T20:00:00+00:00',
+        'guilds': [{'id': guild_id, 'name': 'storm', 'roles': roles, 'members': snapshot}],
+    }
+    write_trace(path, header, events)
+    return path
+
+def _print_report(result: dict):
+    print(f"traza {result['trace']}: {result['events']} eventos en {result['trace_seconds']:.0f}s de traza "
+          f"({result['wall_seconds']:.2f}s reales)")
+    print(f"aplicación de eventos: {result['events_per_second']:.0f} eventos/s")
+    print(f"ticks del monitor: {result['ticks']} · media {result['tick_ms_mean']:.2f} ms · "
+          f"p95 {result['tick_ms_p95']:.2f} ms · máx {result['tick_ms_max']:.2f} ms")
+    print(f"ºestado_juegos al final: {result['estado_juegos_ms']:.2f} ms · sesiones activas: {result['active_sessions']}")
+    print("llamadas REST: " + ", ".join(f"{k}={v}" for k, v in sorted(result['rest_calls'].items())))
+
+async def main(args):
+    path = args.trace
+    if args.storm:
+        path = args.storm_out or os.path.join(tempfile.gettempdir(), f"storm_{args.storm}.jsonl.gz")
+        make_storm_trace(path, members=args.storm, seed=args.seed)
+        print(f"traza sintética escrita en {path}")
+    if not path:
+        raise SystemExit("Indica una traza o usa --storm N")
+
+    path = os.path.abspath(path)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # los cogs escriben json/ y db/ en rutas relativas
+        try:
+            result = await replay(path, speed=args.speed, check_interval=args.check_interval)
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', nargs='?', help='fichero .jsonl.gz grabado con ºgrabar_gateway')
+    parser.add_argument('--speed', type=float, default=0, help='0 = lo más rápido posible, 1 = tiempo real, N = Nx')
+    parser.add_argument('--check-interval', type=float, default=30, help='segundos de traza entre ticks del monitor')
+    parser.add_argument('--storm', type=int, metavar='MIEMBROS', help='genera y reproduce una tormenta sintética')
+    parser.add_argument('--storm-out', help='dónde guardar la traza sintética')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='salida JSON (para comparar entre versiones)')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -1,11 +1,52 @@
 import discord        
-from discord.ext import commands, tasks
-import asyncio
+from discord.ext import commands
+import heapq
+import itertools
 import random
 import datetime # Import datetime for time comparisons
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from utils.outbound import get_outbound, LOW
+from utils.scheduler import Schedule, get_scheduler
+
+RECORDATORIO = 0
+FIN = 1
+
+@dataclass
+class SesionBeer:
+    """Beer Night activa en un canal"""
+    __slots__ = ('channel', 'id', 'start', 'active_rules', 'available_rules')
+    channel: discord.abc.Messageable
+    id: int
+    start: float
+    active_rules: List[str]
+    available_rules: List[str]
+
+class RuedaBeer(Schedule):
+    """Regla del planificador: el siguiente segundo de la rueda con algo pendiente"""
+    __slots__ = ('cog',)
+
+    def __init__(self, cog: 'BeerNight'):
+        self.cog = cog
+
+    def next_after(self, after: datetime.datetime) -> Optional[datetime.datetime]:
+        tick = self.cog._proximo_tick(after.timestamp())
+        return datetime.datetime.fromtimestamp(tick) if tick is not None else None
 
 class BeerNight(commands.Cog):
-    __slots__ = ('bot', 'all_rules', 'active_rules', 'available_rules', 'reminder_task', 'end_timer_task', 'beer_night_start_time')
+    """Beer Nights independientes por canal.
+
+    Todas las sesiones comparten una rueda de temporización con huecos de un
+    segundo: cada hueco guarda los avisos y finales que vencen en él, y una
+    única tarea del planificador atiende todos los de un mismo segundo.
+    """
+    __slots__ = ('bot', 'all_rules', 'sesiones', '_rueda', '_ticks', '_ids')
+    DURACION = 2 * 60 * 60
+    # Cadencia de los avisos por canal: nunca más de uno cada INTERVALO_MIN segundos
+    INTERVALO_MIN = 5
+    INTERVALO_MAX = 30
+    JOB = "beernight"
+
     def __init__(self, bot):
         self.bot = bot
         self.all_rules = [
@@ -26,93 +67,90 @@ class BeerNight(commands.Cog):
             "Si fallas un ultimátum = bebes",
             "Conseguir un 'clutch' = el equipo contrario bebe"
         ]
-        self.active_rules = []
-        self.available_rules = []
-        self.reminder_task = None
-        self.end_timer_task = None
-        self.beer_night_start_time = None
-
-    async def _send_drink_reminder(self, ctx):
-        while True:
-            try:
-                delay = random.uniform(0, 5)
-                await asyncio.sleep(delay)
-                await ctx.send("¡A BEBER! 🍻")
-            except asyncio.CancelledError:
-                break
-            except Exception:
-                break
+        self.sesiones: Dict[int, SesionBeer] = {}
+        # Rueda de temporización: segundo -> [(tipo, canal, id de sesión)]
+        self._rueda: Dict[int, List[Tuple[int, int, int]]] = {}
+        self._ticks: List[int] = []  # Heap de segundos con entradas en la rueda
+        self._ids = itertools.count(1)
+        get_scheduler(bot).add(self.JOB, RuedaBeer(self), self._atender_rueda, persist=False)
+
+    # --- Rueda de temporización ---
+
+    def _programar(self, when: float, tipo: int, sesion: SesionBeer):
+        tick = int(when) + 1
+        hueco = self._rueda.get(tick)
+        if hueco is None:
+            hueco = self._rueda[tick] = []
+            heapq.heappush(self._ticks, tick)
+        hueco.append((tipo, sesion.channel.id, sesion.id))
+
+    def _proximo_tick(self, despues: float) -> Optional[int]:
+        """Primer segundo de la rueda con algo pendiente posterior a ``despues``"""
+        if not self._ticks or self._ticks[0] > despues:
+            return self._ticks[0] if self._ticks else None
+        return min((tick for tick in self._ticks if tick > despues), default=None)
+
+    async def _atender_rueda(self):
+        now = datetime.datetime.now().timestamp()
+        outbound = get_outbound(self.bot)
+        while self._ticks and self._ticks[0] <= now:
+            for tipo, channel_id, sesion_id in self._rueda.pop(heapq.heappop(self._ticks)):
+                sesion = self.sesiones.get(channel_id)
+                if sesion is None or sesion.id != sesion_id:
+                    continue  # Sesión terminada o sustituida
+                if tipo == FIN:
+                    del self.sesiones[channel_id]
+                    outbound.enqueue(sesion.channel, content="El tiempo se ha acabado, ¡la Beer Night ha finalizado automáticamente! Que los efectos secundarios sean leves. 🤢")
+                else:
+                    # Si el canal va saturado, los avisos pendientes se fusionan en uno
+                    outbound.enqueue(sesion.channel, content="¡A BEBER! 🍻", priority=LOW, coalesce_key="beer_reminder")
+                    self._programar(now + random.uniform(self.INTERVALO_MIN, self.INTERVALO_MAX), RECORDATORIO, sesion)
+
+    # --- Comandos ---
 
     @commands.command(name="BeerNight")
     async def beer_night(self, ctx):
-        if self.reminder_task and not self.reminder_task.done():
+        if ctx.channel.id in self.sesiones:
             await ctx.send("¡La Beer Night ya está en curso! Usa `ºendOfBeer` para terminarla o `ºmoreRules` para añadir otra regla.")
             return
-        self.active_rules = []
-        self.available_rules = list(self.all_rules)
-        if not self.available_rules:
+        available_rules = list(self.all_rules)
+        if not available_rules:
             await ctx.send("No hay reglas disponibles para iniciar la Beer Night.")
             return
-        random_rule = self.available_rules.pop(random.randrange(len(self.available_rules)))
-        self.active_rules.append(random_rule)
+        random_rule = available_rules.pop(random.randrange(len(available_rules)))
         await ctx.send(f"Empieza la noche del alcohol y el guarreo perras 🍻\n\n**Mandamientos divinos:**\n>>> {random_rule}")
-        self.reminder_task = self.bot.loop.create_task(self._send_drink_reminder(ctx))
-        self.beer_night_start_time = datetime.datetime.now()
-        if self.end_timer_task:
-            self.end_timer_task.cancel()
-        self.end_timer_task = self.bot.loop.create_task(self._auto_end_beer_night(ctx.channel))
-
-    async def _auto_end_beer_night(self, channel):
-        time_to_wait = 7200
-        if self.beer_night_start_time:
-            elapsed_time = (datetime.datetime.now() - self.beer_night_start_time).total_seconds()
-            time_to_wait = max(0, time_to_wait - elapsed_time)
-        try:
-            await asyncio.sleep(time_to_wait)
-            if self.reminder_task:
-                self.reminder_task.cancel()
-                self.reminder_task = None
-                self.active_rules = []
-                self.available_rules = []
-                await channel.send("El tiempo se ha acabado, ¡la Beer Night ha finalizado automáticamente! Que los efectos secundarios sean leves. 🤢")
-                self.end_timer_task = None
-        except asyncio.CancelledError:
-            pass
-        except Exception:
-            pass
+
+        now = datetime.datetime.now().timestamp()
+        sesion = SesionBeer(ctx.channel, next(self._ids), now, [random_rule], available_rules)
+        self.sesiones[ctx.channel.id] = sesion
+        self._programar(now + random.uniform(self.INTERVALO_MIN, self.INTERVALO_MAX), RECORDATORIO, sesion)
+        self._programar(now + self.DURACION, FIN, sesion)
+        get_scheduler(self.bot).reschedule(self.JOB)
 
     @commands.command(name="endOfBeer")
     async def end_of_beer(self, ctx):
-        if self.reminder_task:
-            self.reminder_task.cancel()
-            self.reminder_task = None
-            self.active_rules = []
-            self.available_rules = []
+        if self.sesiones.pop(ctx.channel.id, None) is not None:
             await ctx.send("¡La Beer Night ha terminado! Que los efectos secundarios sean leves. 🤢")
-            if self.end_timer_task:
-                self.end_timer_task.cancel()
-                self.end_timer_task = None
         else:
             await ctx.send("No hay ninguna Beer Night activa.")
 
     @commands.command(name="moreRules")
     async def more_rules(self, ctx):
-        if not self.active_rules:
+        sesion = self.sesiones.get(ctx.channel.id)
+        if sesion is None:
             await ctx.send("No hay una Beer Night activa para añadir más reglas. ¡Inicia una con `ºBeerNight`!")
             return
-        if not self.available_rules:
+        if not sesion.available_rules:
             await ctx.send("¡No quedan normas por poner en esta sesión! ¡A cumplir las que ya hay! 😈")
             return
-        new_rule = self.available_rules.pop(random.randrange(len(self.available_rules)))
-        self.active_rules.append(new_rule)
-        rules_text = "\n".join([f"- {rule}" for rule in self.active_rules])
+        new_rule = sesion.available_rules.pop(random.randrange(len(sesion.available_rules)))
+        sesion.active_rules.append(new_rule)
+        rules_text = "\n".join([f"- {rule}" for rule in sesion.active_rules])
         await ctx.send(f"¡Más reglas para la Beer Night! 🤯\n\n**Mandamientos Actuales:**\n>>> {rules_text}")
 
     def cog_unload(self):
-        if self.reminder_task:
-            self.reminder_task.cancel()
-        if self.end_timer_task:
-            self.end_timer_task.cancel()
+        get_scheduler(self.bot).remove(self.JOB)
+        self.sesiones.clear()
 
 async def setup(bot):
     await bot.add_cog(BeerNight(bot))
\ No newline at end of file
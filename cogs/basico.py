@@ -1,8 +1,12 @@
 import discord
 from discord.ext import commands
-import psutil
 import time
-import os
+from utils.json_store import get_store
+from utils.loop_monitor import get_loop_monitor
+from utils.metrics import get_metrics
+from utils.outbound import get_outbound
+from utils.resources import WINDOWS, get_resource_sampler
+from utils.scheduler import get_scheduler
 
 class Basico(commands.Cog):
     __slots__ = ('bot', 'start_time', 'last_command')
@@ -11,6 +15,10 @@ class Basico(commands.Cog):
         self.start_time = time.time()
         self.last_command = None
 
+    async def cog_load(self):
+        # Arranca el muestreo de recursos para que ºinfo tenga historial desde el principio
+        await get_resource_sampler(self.bot).sample()
+
     @commands.Cog.listener()
     async def on_command(self, ctx):
         self.last_command = ctx.command.qualified_name
@@ -26,14 +34,12 @@ class Basico(commands.Cog):
         return round(self.bot.latency * 1000)
 
     def _get_resources(self):
-        proc = psutil.Process(os.getpid())
-        cpu = proc.cpu_percent(interval=0.1)
-        ram = proc.memory_info().rss / (1024*1024)  # MB
-        return cpu, ram
+        """Última muestra y ventanas de 1, 5 y 15 minutos del muestreador (sin medir aquí)"""
+        return get_resource_sampler(self.bot).stats()
 
     def _get_uptime(self):
-        proc = psutil.Process(os.getpid())
-        uptime_segundos = int(time.time() - proc.create_time())
+        inicio = get_resource_sampler(self.bot).create_time or self.start_time
+        uptime_segundos = int(time.time() - inicio)
         horas, resto = divmod(uptime_segundos, 3600)
         minutos, segundos = divmod(resto, 60)
         return f"{horas}h {minutos}m {segundos}s"
@@ -45,19 +51,168 @@ class Basico(commands.Cog):
     async def info(self, ctx):
         estado = '🟢 Online'
         latencia = self._get_latency()
-        cpu, ram = self._get_resources()
+        recursos = self._get_resources()
         uptime = self._get_uptime()
         ultimo_cmd = self._get_last_command()
+        actual = recursos['latest']
+
+        def resumen(columna, formato, unidad):
+            """Valor actual y media (p95) de cada ventana"""
+            if actual is None:
+                return "Midiendo..."
+            partes = [f"{actual[columna]:{formato}}{unidad}"]
+            for ventana in WINDOWS:
+                datos = recursos[ventana][columna]
+                if datos['n']:
+                    partes.append(f"{ventana} {datos['avg']:{formato}}{unidad} (p95 {datos['p95']:{formato}})")
+            return " · ".join(partes)
 
         embed = discord.Embed(title="🤖 Información del Bot", color=discord.Color.green())
         embed.add_field(name="Estado", value=estado, inline=False)
         embed.add_field(name="Latencia", value=f"🏓 {latencia} ms", inline=False)
-        embed.add_field(name="CPU", value=f"🖥️ {cpu:.1f}%", inline=False)
-        embed.add_field(name="RAM", value=f"💾 {ram:.1f} MB", inline=False)
+        embed.add_field(name="CPU", value=f"🖥️ {resumen('cpu', '.1f', '%')}", inline=False)
+        embed.add_field(name="RAM", value=f"💾 {resumen('rss_mb', '.1f', ' MB')}", inline=False)
+        embed.add_field(name="Lag del loop", value=f"🧊 {resumen('lag_ms', '.0f', ' ms')}", inline=False)
+        if actual is not None:
+            embed.add_field(name="Hilos / descriptores", value=f"🧵 {actual['threads']:.0f} / {actual['fds']:.0f}", inline=False)
         embed.add_field(name="Uptime", value=f"⏱️ {uptime}", inline=False)
         embed.add_field(name="Último comando", value=f"⌨️ {ultimo_cmd}", inline=False)
         embed.set_footer(text=f"Solicitado por {ctx.author.display_name}")
         await ctx.send(embed=embed)
 
+    @commands.command(name='envios', help='Muestra el estado de la cola de mensajes salientes.')
+    @commands.is_owner()
+    async def envios(self, ctx):
+        stats = get_outbound(self.bot).stats()
+        embed = discord.Embed(title="📤 Cola de envíos", color=discord.Color.blurple())
+        embed.add_field(name="En cola", value=f"{stats['queue_depth']} ({stats['destinations']} destinos)", inline=False)
+        embed.add_field(name="Enviando", value=str(stats['in_flight']), inline=False)
+        embed.add_field(name="Enviados", value=str(stats['sent']), inline=False)
+        embed.add_field(name="Fusionados", value=str(stats['coalesced']), inline=False)
+        embed.add_field(name="Errores / 429", value=f"{stats['failed']} / {stats['rate_limited']}", inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='persistencia', help='Muestra las escrituras y latencias de los ficheros JSON.')
+    @commands.is_owner()
+    async def persistencia(self, ctx):
+        stats = get_store(self.bot).stats()
+        embed = discord.Embed(title="💽 Persistencia JSON", color=discord.Color.blurple())
+        embed.add_field(
+            name="Latencia de escritura",
+            value=f"p50 {stats['write_ms_p50']:.1f} ms · p99 {stats['write_ms_p99']:.1f} ms",
+            inline=False
+        )
+        embed.add_field(name="Pendientes", value=", ".join(stats['dirty']) or "Ninguno", inline=False)
+        for name, doc in stats['documents'].items():
+            embed.add_field(
+                name=name,
+                value=f"{doc['writes']} escrituras · {doc['failures']} errores · última {doc['last_ms']:.1f} ms · máx {doc['max_ms']:.1f} ms",
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='tareas', help='Muestra las tareas programadas, su retraso y duración.')
+    @commands.is_owner()
+    async def tareas(self, ctx):
+        stats = get_scheduler(self.bot).stats()
+        embed = discord.Embed(title="⏰ Tareas programadas", color=discord.Color.blurple())
+        for name, job in list(stats.items())[:25]:
+            siguiente = job['next_run'].strftime('%d/%m %H:%M:%S') if job['next_run'] else "—"
+            embed.add_field(
+                name=f"{name}{' (ejecutando)' if job['running'] else ''}",
+                value=f"Próxima: {siguiente} · {job['runs']} ejecuciones · {job['failures']} errores\n"
+                      f"Retraso {job['last_lag_ms']:.0f} ms (máx {job['max_lag_ms']:.0f} ms) · "
+                      f"duración {job['last_runtime_ms']:.1f} ms (media {job['avg_runtime_ms']:.1f} ms)",
+                inline=False
+            )
+        if not stats:
+            embed.description = "No hay tareas registradas."
+        await ctx.send(embed=embed)
+
+    @commands.command(name='arranque', help='Muestra cuánto tardó en cargar cada cog al arrancar.')
+    @commands.is_owner()
+    async def arranque(self, ctx):
+        report = getattr(self.bot, 'startup_report', None)
+        if not report:
+            await ctx.send("No hay informe de arranque.")
+            return
+        embed = discord.Embed(title="🚀 Arranque", color=discord.Color.blurple())
+        ready = f"{report['ready_ms']:.0f} ms" if report['ready_ms'] is not None else "—"
+        embed.description = f"Cogs cargados en **{report['setup_ms']:.0f} ms** · listo en **{ready}**"
+        for name, cog in sorted(report['cogs'].items(), key=lambda item: -(item[1]['import_ms'] + item[1]['setup_ms'])):
+            value = f"import {cog['import_ms']:.0f} ms · setup {cog['setup_ms']:.0f} ms"
+            if cog['error']:
+                value = f"❌ {cog['error'][:200]}"
+            embed.add_field(name=name, value=value, inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='metricas', help='Muestra la latencia y errores de comandos, peticiones REST, bucles y bloqueos del loop. Uso: ºmetricas [comandos|rest|bucles|loop]')
+    @commands.is_owner()
+    async def metricas(self, ctx, seccion: str = None):
+        registry = get_metrics(self.bot)
+        secciones = ('comandos', 'rest', 'bucles', 'loop')
+        if seccion is not None and seccion not in secciones:
+            await ctx.send(f"⚠️ Sección desconocida. Usa una de: {', '.join(secciones)}")
+            return
+
+        def totales(nombre, etiqueta):
+            metrica = registry.get(nombre)
+            if metrica is None:
+                return {}
+            indice = metrica.labelnames.index(etiqueta)
+            suma = {}
+            for valores, serie in metrica.series.items():
+                suma[valores[indice]] = suma.get(valores[indice], 0) + serie.value
+            return suma
+
+        def latencias(nombre, etiqueta):
+            metrica = registry.get(nombre)
+            return metrica.grouped(etiqueta) if metrica is not None else {}
+
+        def linea(nombre, llamadas, errores, hist):
+            tiempos = "—"
+            if hist is not None and hist.count:
+                tiempos = f"p50 {hist.quantile(0.5) * 1000:.0f} ms · p95 {hist.quantile(0.95) * 1000:.0f} ms"
+            return f"`{nombre}` {llamadas:.0f} · {errores:.0f} errores · {tiempos}"
+
+        embed = discord.Embed(title="📊 Métricas", color=discord.Color.blurple())
+
+        if seccion in (None, 'comandos'):
+            llamadas = totales('bot_commands_total', 'command')
+            errores = totales('bot_command_errors_total', 'command')
+            hists = latencias('bot_command_duration_seconds', 'command')
+            filas = [linea(c, n, errores.get(c, 0), hists.get(c))
+                     for c, n in sorted(llamadas.items(), key=lambda item: -item[1])[:15]]
+            embed.add_field(name="⌨️ Comandos", value="\n".join(filas)[:1024] or "Sin datos", inline=False)
+
+        if seccion in (None, 'rest'):
+            rest = registry.get('bot_rest_requests_total')
+            peticiones = totales('bot_rest_requests_total', 'cog')
+            fallos = {}
+            if rest is not None:
+                for (cog, _, _, estado), serie in rest.series.items():
+                    if estado != '2xx':
+                        fallos[cog] = fallos.get(cog, 0) + serie.value
+            hists = latencias('bot_rest_duration_seconds', 'cog')
+            filas = [linea(c, n, fallos.get(c, 0), hists.get(c))
+                     for c, n in sorted(peticiones.items(), key=lambda item: -item[1])]
+            embed.add_field(name="🌐 REST por cog", value="\n".join(filas)[:1024] or "Sin datos", inline=False)
+
+        if seccion in (None, 'bucles'):
+            hists = latencias('bot_loop_duration_seconds', 'loop')
+            fallos = totales('bot_loop_failures_total', 'loop')
+            filas = [linea(b, h.count, fallos.get(b, 0), h) for b, h in sorted(hists.items())]
+            embed.add_field(name="🔁 Bucles y tareas", value="\n".join(filas)[:1024] or "Sin datos", inline=False)
+
+        if seccion in (None, 'loop'):
+            monitor = get_loop_monitor(self.bot)
+            lag = monitor.stats()
+            filas = [f"Lag p50 {lag['p50_ms']:.0f} ms · p90 {lag['p90_ms']:.0f} ms · "
+                     f"p99 {lag['p99_ms']:.0f} ms · máx {lag['max_ms']:.0f} ms"]
+            filas += [f"`{lugar}` ×{n}" for lugar, n in monitor.block_counts.most_common(5)]
+            embed.add_field(name="🧊 Event loop", value="\n".join(filas)[:1024], inline=False)
+
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(Basico(bot))
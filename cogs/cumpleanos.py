@@ -1,44 +1,94 @@
 import discord
-from discord.ext import commands, tasks
-import json
-import os
-from datetime import datetime
+from discord.ext import commands
+from datetime import date, timedelta
+from calendar import isleap
+import asyncio
+import bisect
+from typing import Dict, List, Set, Tuple
+from utils.json_store import get_store
+from utils.outbound import get_outbound
+from utils.scheduler import Cron, get_scheduler
 
 class Cumpleanos(commands.Cog):
-    __slots__ = ('bot', 'birthdays_file', 'birthdays')
+    __slots__ = ('bot', 'birthdays_doc', 'estado_doc', 'birthdays', 'por_fecha', 'orden')
+    MAX_DMS_CONCURRENTES = 5
+    MAX_PROXIMOS = 25
 
     def __init__(self, bot):
         self.bot = bot
-        self.birthdays_file = os.path.join("json", "birthdays.json")
+        self.birthdays_doc = get_store(bot).document("birthdays")
+        # Último día ya felicitado, para no repetir ni saltarse días tras un reinicio
+        self.estado_doc = get_store(bot).document("birthdays_estado", lambda: {'processed': None})
         self.birthdays = self.cargar_cumpleanos()
-        self.check_birthdays.start()
+        # Índice (mes, día) -> usuarios, para visitar solo los cumpleaños de hoy
+        self.por_fecha: Dict[Tuple[int, int], Set[str]] = {}
+        # Lista ordenada de (mes * 100 + día, user_id) para buscar los próximos con bisect
+        self.orden: List[Tuple[int, str]] = []
+        for user_id, b in self.birthdays.items():
+            self._indexar(user_id, b)
+        # A medianoche; si el bot estaba caído, se recupera durante el mismo día
+        get_scheduler(bot).add("cumpleanos", Cron(hour=0), self.check_birthdays, catch_up=timedelta(hours=23))
 
     def cargar_cumpleanos(self):
-        try:
-            if os.path.exists(self.birthdays_file):
-                with open(self.birthdays_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-        except Exception:
-            pass
-        return {}
+        return self.birthdays_doc.data
 
     def guardar_cumpleanos(self):
-        try:
-            os.makedirs(os.path.dirname(self.birthdays_file), exist_ok=True)
-            with open(self.birthdays_file, "w", encoding="utf-8") as f:
-                json.dump(self.birthdays, f, indent=4, ensure_ascii=False)
-        except Exception:
-            pass
+        self.birthdays_doc.mark_dirty()
+
+    def _indexar(self, user_id: str, b: dict):
+        self.por_fecha.setdefault((b["month"], b["day"]), set()).add(user_id)
+        bisect.insort(self.orden, (b["month"] * 100 + b["day"], user_id))
+
+    def _desindexar(self, user_id: str, b: dict):
+        usuarios = self.por_fecha.get((b["month"], b["day"]))
+        if usuarios:
+            usuarios.discard(user_id)
+            if not usuarios:
+                del self.por_fecha[(b["month"], b["day"])]
+        entrada = (b["month"] * 100 + b["day"], user_id)
+        i = bisect.bisect_left(self.orden, entrada)
+        if i < len(self.orden) and self.orden[i] == entrada:
+            del self.orden[i]
+
+    def proximos(self, desde: date, n: int) -> List[Tuple[date, str]]:
+        """Los ``n`` próximos cumpleaños a partir de ``desde`` (incluido), dando la vuelta al año"""
+        inicio = bisect.bisect_left(self.orden, (desde.month * 100 + desde.day, ""))
+        resultado = []
+        for k in range(min(n, len(self.orden))):
+            i = (inicio + k) % len(self.orden)
+            clave, user_id = self.orden[i]
+            anio = desde.year + (1 if inicio + k >= len(self.orden) else 0)
+            mes, dia = divmod(clave, 100)
+            if mes == 2 and dia == 29 and not isleap(anio):
+                dia = 28
+            resultado.append((date(anio, mes, dia), user_id))
+        return resultado
+
+    def cumpleanos_de(self, dia: date) -> Set[str]:
+        """Usuarios que cumplen años ese día (los del 29/2 lo celebran el 28/2 si el año no es bisiesto)"""
+        usuarios = set(self.por_fecha.get((dia.month, dia.day), ()))
+        if dia.month == 2 and dia.day == 28 and not isleap(dia.year):
+            usuarios |= self.por_fecha.get((2, 29), set())
+        return usuarios
 
     @commands.command(name="cumple", help="Registra tu cumpleaños. Ejemplo: ºcumple 10 5 2002")
     async def registrar_cumple(self, ctx, dia: int, mes: int, anio: int):
+        try:
+            date(anio, mes, dia)
+        except ValueError:
+            await ctx.send("❌ Esa fecha no existe. Ejemplo: `ºcumple 10 5 2002`")
+            return
+
         user_id = str(ctx.author.id)
+        if user_id in self.birthdays:
+            self._desindexar(user_id, self.birthdays[user_id])
         self.birthdays[user_id] = {
             "day": dia,
             "month": mes,
             "year": anio,
             "name": ctx.author.display_name
         }
+        self._indexar(user_id, self.birthdays[user_id])
         self.guardar_cumpleanos()
         await ctx.send(f"🎉 Cumpleaños registrado para {ctx.author.display_name}: {dia}/{mes}/{anio}")
 
@@ -51,21 +101,53 @@ class Cumpleanos(commands.Cog):
         else:
             await ctx.send("No tienes cumpleaños registrado. Usa `ºcumple <día> <mes> <año>` para registrarlo.")
 
-    @tasks.loop(hours=24)
+    @commands.command(name="proximos_cumples", help="Muestra los próximos cumpleaños. Ejemplo: ºproximos_cumples 10")
+    async def proximos_cumples(self, ctx, cantidad: int = 10):
+        hoy = date.today()
+        proximos = self.proximos(hoy, max(1, min(cantidad, self.MAX_PROXIMOS)))
+        if not proximos:
+            await ctx.send("No hay cumpleaños registrados. Usa `ºcumple <día> <mes> <año>` para registrar el tuyo.")
+            return
+
+        lineas = []
+        for fecha, user_id in proximos:
+            b = self.birthdays[user_id]
+            dias = (fecha - hoy).days
+            cuando = "¡hoy!" if dias == 0 else "mañana" if dias == 1 else f"en {dias} días"
+            lineas.append(f"• **{b['name']}** — {fecha.day}/{fecha.month} ({cuando}) · cumple {fecha.year - b['year']}")
+
+        embed = discord.Embed(title="🎂 Próximos cumpleaños", description="\n".join(lineas), color=discord.Color.magenta())
+        await ctx.send(embed=embed)
+
     async def check_birthdays(self):
-        today = datetime.now()
-        for user_id, b in self.birthdays.items():
-            if b["day"] == today.day and b["month"] == today.month:
-                user = self.bot.get_user(int(user_id))
-                if user:
-                    try:
-                        await user.send(f"🎉 ¡Feliz cumpleaños, {b['name']}! 🎉")
-                    except Exception:
-                        pass
-
-    @check_birthdays.before_loop
-    async def before_check_birthdays(self):
-        await self.bot.wait_until_ready()
+        today = date.today()
+        if self.estado_doc.data.get('processed') == today.isoformat():
+            return  # Ya felicitados (p. ej. recuperación tras un reinicio)
+
+        semaphore = asyncio.Semaphore(self.MAX_DMS_CONCURRENTES)
+        await asyncio.gather(*(self._felicitar(user_id, semaphore) for user_id in self.cumpleanos_de(today)))
+
+        self.estado_doc.data['processed'] = today.isoformat()
+        self.estado_doc.mark_dirty()
+
+    async def _felicitar(self, user_id: str, semaphore: asyncio.Semaphore):
+        b = self.birthdays.get(user_id)
+        if not b:
+            return
+        async with semaphore:
+            try:
+                # Si el usuario no está en caché, se pide a la API
+                user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
+                await get_outbound(self.bot).send(user, content=f"🎉 ¡Feliz cumpleaños, {b['name']}! 🎉")
+            except Exception as e:
+                # Incluye discord.RateLimited, que no es HTTPException: un DM fallido
+                # no debe impedir que el día quede marcado como procesado
+                print(f"Error felicitando a {user_id}: {e}")
+
+    async def cog_unload(self):
+        get_scheduler(self.bot).remove("cumpleanos")
+        await self.birthdays_doc.flush()
+        await self.estado_doc.flush()
 
 async def setup(bot):
     await bot.add_cog(Cumpleanos(bot))
\ No newline at end of file
@@ -1,14 +1,32 @@
-import os
+from __future__ import annotations
+
 import json
 from datetime import datetime, timedelta
 import discord
 from discord.ext import commands, tasks
 import asyncio
-from typing import Dict, Set, List, Tuple, Optional
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Set, List, Tuple, Optional, Union
 from dataclasses import dataclass, field
-from PIL import Image
 import io
-import aiohttp
+from utils.json_store import get_store
+from utils.historial_juegos import GameHistoryStore, GameSession
+from utils.lazy import lazy_import
+from utils.metrics import timed_loop
+from utils.outbound import get_outbound, HIGH
+from utils.scheduler import Every, get_scheduler
+from utils.series_juegos import GameSeriesRegistry, RESOLUTIONS, render_chart, preload as preload_series
+
+# PIL solo hace falta al montar el collage de avatares (en un hilo)
+Image = lazy_import("PIL.Image")
+aiohttp = lazy_import("aiohttp")
+
+# Roles cuyos miembros se monitorizan
+ROLES_MONITOREADOS = frozenset([631903790156480532, 777931594500407327])
+
+# Clave del estado de un juego: (guild_id, nombre del juego)
+GameKey = Tuple[int, str]
 
 @dataclass
 class JugadorInfo:
@@ -22,34 +40,114 @@ class GameState:
     """Estado completo de un juego con persistencia"""
     active_players: Set[int] = field(default_factory=set)
     start_time: Optional[datetime] = None
-    notification_message: Optional[discord.Message] = None
+    notification_message: Optional[Union[discord.Message, discord.PartialMessage]] = None
+    notification_message_id: Optional[int] = None
     tracking_start: Optional[datetime] = None
     event_id: Optional[int] = None
     last_update: Optional[datetime] = None
     player_names: List[str] = field(default_factory=list)
+    participants: Set[str] = field(default_factory=set)
+    peak_players: int = 0
+    roster_signature: Optional[str] = None
+    roster_players: Optional[List[str]] = None  # Jugadores del último roster publicado
+    last_roster_edit: float = 0.0
+    roster_task: Optional[asyncio.Task] = None
+
+class ByteLRUCache:
+    """Cache LRU limitada por tamaño en bytes en lugar de por número de entradas"""
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[object], int]):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self.total_bytes -= self.sizeof(self._data.pop(key))
+        self._data[key] = value
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.total_bytes -= self.sizeof(evicted)
+
+    def clear(self):
+        self._data.clear()
+        self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+def _image_nbytes(img: Image.Image) -> int:
+    """Tamaño aproximado en memoria de una imagen decodificada"""
+    return img.width * img.height * len(img.getbands())
+
+# Configuraciones predefinidas del collage de avatares
+AVATAR_SIZE = (128, 128)
+COLLAGE_LAYOUTS = {
+    1: ((128, 128), [(0, 0)]),
+    2: ((256, 128), [(0, 0), (128, 0)]),
+    3: ((256, 256), [(0, 0), (128, 0), (0, 128)]),
+    4: ((256, 256), [(0, 0), (128, 0), (0, 128), (128, 128)])
+}
 
 class EventosJuegosOptimizado(commands.Cog):
     """Cog optimizado para eventos de juegos con persistencia completa"""
+    SERIES_JOB = "series_juegos"
 
     def __init__(self, bot):
         self.bot = bot
 
         # Configuración principal
-        self.roles_monitoreados = frozenset([631903790156480532, 777931594500407327])
-        self.EVENTS_FILE = "json/events_data.json"
+        self.roles_monitoreados = ROLES_MONITOREADOS
+        self.HISTORY_DB = "db/historial_juegos.db"
         self.NOTIFICATION_CHANNEL = 498474737563861004
         self.channel_id = 792184660091338784
         self.notification_channel_id = 498474737563861004
         self.robuso_id = 430508168385134622
+        self.roster_edit_interval = 20  # Máximo una edición del roster cada N segundos
 
         # Estado unificado y optimizado
-        self.games_state: Dict[str, GameState] = {}
-        self.eventos_activos: Set[str] = set()
+        self.games_state: Dict[GameKey, GameState] = {}
+        self.eventos_activos: Set[GameKey] = set()
+
+        # Persistencia diferida: se marca como sucio y se guarda una vez por ráfaga
+        self.events_doc = get_store(bot).document(
+            "events_data",
+            lambda: {"active_events": {}},
+            snapshot=self._build_persistent_state,
+            indent=2
+        )
 
         # Cache optimizado para reducir API calls
         self._member_cache = {}
         self._last_member_update = {}
-        self._avatar_cache = {}
+        self._avatar_cache = ByteLRUCache(4 * 1024 * 1024, _image_nbytes)  # avatares decodificados
+        self._collage_cache = ByteLRUCache(2 * 1024 * 1024, len)  # PNG por tupla ordenada de URLs
+
+        # Sesión HTTP compartida (se crea al primer uso)
+        self._http_session: Optional[aiohttp.ClientSession] = None
+
+        # Cache local de eventos programados por guild (alimentado por el gateway)
+        self._scheduled_events: Dict[int, Dict[int, discord.ScheduledEvent]] = {}
+
+        # Historial de sesiones finalizadas (SQLite con inserciones por lotes)
+        self.historial = GameHistoryStore(self.HISTORY_DB)
+
+        # Series de jugadores concurrentes por juego (buffers circulares de tamaño fijo).
+        # Se guardan cada pocos minutos para no perder las vistas de semana y año al reiniciar
+        self.series_doc = get_store(bot).document("series_juegos", snapshot=lambda: self.series.dump())
+        self.series = GameSeriesRegistry(saved=self.series_doc.data)
+        get_scheduler(bot).add(self.SERIES_JOB, Every(minutes=5), self._guardar_series, persist=False)
 
         # Control de timing optimizado
         self.last_check = discord.utils.utcnow()
@@ -65,63 +163,101 @@ class EventosJuegosOptimizado(commands.Cog):
     def load_persistent_state(self):
         """Carga el estado persistente optimizado"""
         try:
-            if os.path.exists(self.EVENTS_FILE):
-                with open(self.EVENTS_FILE, 'r') as f:
-                    data = json.load(f)
-
-                # Reconstruir estados de juego desde datos persistentes
-                for guild_id, guild_events in data.get("active_events", {}).items():
-                    for game_name, event_data in guild_events.items():
-                        state = GameState()
-                        state.event_id = event_data.get("event_id")
-                        state.start_time = datetime.fromisoformat(event_data["start_time"]) if event_data.get("start_time") else None
-                        state.player_names = event_data.get("player_names", [])
-                        state.last_update = datetime.fromisoformat(event_data.get("last_update", datetime.utcnow().isoformat()))
-
-                        self.games_state[game_name] = state
-                        self.eventos_activos.add(game_name)
-
-            else:
-                self.events_data = {"active_events": {}}
-                self.save_persistent_state()
+            data = self.events_doc.data
+
+            # Reconstruir estados de juego desde datos persistentes
+            for guild_id, guild_events in data.get("active_events", {}).items():
+                for game_name, event_data in guild_events.items():
+                    state = GameState()
+                    state.event_id = event_data.get("event_id")
+                    state.start_time = datetime.fromisoformat(event_data["start_time"]) if event_data.get("start_time") else None
+                    state.player_names = event_data.get("player_names", [])
+                    state.participants = set(state.player_names)
+                    state.notification_message_id = (event_data.get("channel_message") or {}).get("message_id")
+                    state.last_update = datetime.fromisoformat(event_data.get("last_update", datetime.utcnow().isoformat()))
+
+                    key = (int(guild_id), game_name)
+                    self.games_state[key] = state
+                    self.eventos_activos.add(key)
 
         except Exception as e:
             print(f"Error loading persistent state: {e}")
-            self.events_data = {"active_events": {}}
+
+    def _build_persistent_state(self) -> dict:
+        """Construye los datos a guardar desde el estado actual"""
+        save_data = {"active_events": {}}
+        now = datetime.utcnow().isoformat()
+
+        for (guild_id, game_name), state in self.games_state.items():
+            if state.event_id and len(state.active_players) > 0:
+                guild_data = save_data["active_events"].setdefault(str(guild_id), {})
+                guild_data[game_name] = {
+                    "event_id": state.event_id,
+                    "start_time": state.start_time.isoformat() if state.start_time else None,
+                    "last_update": now,
+                    "player_names": state.player_names,
+                    "channel_message": {
+                        "message_id": state.notification_message.id if state.notification_message else state.notification_message_id,
+                        "timestamp": now
+                    }
+                }
+
+        return save_data
+
+    async def _guardar_series(self):
+        """Tarea del planificador: guarda las series (la escritura va en el hilo del almacén)"""
+        self.series_doc.mark_dirty()
 
     def save_persistent_state(self):
-        """Guarda el estado de manera optimizada (solo cuando hay cambios)"""
+        """Marca el estado como modificado; el almacén lo escribe en diferido"""
+        self.events_doc.mark_dirty()
+
+    @staticmethod
+    def _is_event_open(event) -> bool:
+        """Indica si un evento programado sigue abierto (programado o en curso)"""
+        return event.status in (discord.EventStatus.scheduled, discord.EventStatus.active)
+
+    def _cache_scheduled_event(self, event):
+        """Guarda un evento en la cache local (o lo elimina si ya terminó)"""
+        if self._is_event_open(event):
+            self._scheduled_events.setdefault(event.guild_id, {})[event.id] = event
+        else:
+            self._forget_scheduled_event(event.guild_id, event.id)
+
+    def _forget_scheduled_event(self, guild_id: int, event_id: int):
+        """Elimina un evento de la cache local"""
+        guild_events = self._scheduled_events.get(guild_id)
+        if guild_events is not None:
+            guild_events.pop(event_id, None)
+            if not guild_events:
+                del self._scheduled_events[guild_id]
+
+    async def _get_scheduled_event(self, guild, event_id: int) -> Optional[discord.ScheduledEvent]:
+        """Busca un evento en cache (gateway y local); solo usa REST si no está"""
+        event = guild.get_scheduled_event(event_id) or self._scheduled_events.get(guild.id, {}).get(event_id)
+        if event is not None:
+            return event
+
         try:
-            os.makedirs(os.path.dirname(self.EVENTS_FILE), exist_ok=True)
+            event = await guild.fetch_scheduled_event(event_id, with_counts=False)
+        except discord.NotFound:
+            self._forget_scheduled_event(guild.id, event_id)
+            return None
 
-            # Construir datos para guardar desde el estado actual
-            save_data = {"active_events": {}}
+        self._cache_scheduled_event(event)
+        return event
 
-            for guild in self.bot.guilds:
-                guild_id = str(guild.id)
-                guild_data = {}
-
-                for game_name, state in self.games_state.items():
-                    if state.event_id and len(state.active_players) > 0:
-                        guild_data[game_name] = {
-                            "event_id": state.event_id,
-                            "start_time": state.start_time.isoformat() if state.start_time else None,
-                            "last_update": datetime.utcnow().isoformat(),
-                            "player_names": state.player_names,
-                            "channel_message": {
-                                "message_id": state.notification_message.id if state.notification_message else None,
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                        }
-
-                if guild_data:
-                    save_data["active_events"][guild_id] = guild_data
-
-            with open(self.EVENTS_FILE, 'w') as f:
-                json.dump(save_data, f, indent=2)
+    @commands.Cog.listener()
+    async def on_scheduled_event_create(self, event):
+        self._cache_scheduled_event(event)
 
-        except Exception as e:
-            print(f"Error saving persistent state: {e}")
+    @commands.Cog.listener()
+    async def on_scheduled_event_update(self, before, after):
+        self._cache_scheduled_event(after)
+
+    @commands.Cog.listener()
+    async def on_scheduled_event_delete(self, event):
+        self._forget_scheduled_event(event.guild_id, event.id)
 
     async def get_monitored_players_cached(self, guild) -> List[JugadorInfo]:
         """Versión con cache optimizada para reducir procesamiento"""
@@ -154,7 +290,7 @@ class EventosJuegosOptimizado(commands.Cog):
                 jugadores_procesados.add(member.id)
 
                 if current_game:
-                    self._update_game_state_optimized(member.id, current_game, member.display_name)
+                    self._update_game_state_optimized(guild.id, member.id, current_game, member.display_name)
 
         # Actualizar cache
         self._member_cache[cache_key] = jugadores
@@ -173,13 +309,15 @@ class EventosJuegosOptimizado(commands.Cog):
         except Exception:
             return None
 
-    def _update_game_state_optimized(self, member_id: int, current_game: str, display_name: str):
+    def _update_game_state_optimized(self, guild_id: int, member_id: int, current_game: str, display_name: str):
         """Actualización optimizada del estado de juego"""
+        key = (guild_id, current_game)
+
         # Crear estado si no existe
-        if current_game not in self.games_state:
-            self.games_state[current_game] = GameState()
+        if key not in self.games_state:
+            self.games_state[key] = GameState()
 
-        state = self.games_state[current_game]
+        state = self.games_state[key]
 
         # Actualizar jugadores activos
         state.active_players.add(member_id)
@@ -190,18 +328,17 @@ class EventosJuegosOptimizado(commands.Cog):
         if not state.start_time and len(state.active_players) >= 2:
             state.start_time = discord.utils.utcnow()
 
-        # Limpiar de otros juegos (optimizado)
-        for game, other_state in list(self.games_state.items()):
-            if game != current_game and member_id in other_state.active_players:
+        # Limpiar de otros juegos del mismo guild (optimizado)
+        for other_key, other_state in list(self.games_state.items()):
+            if other_key[0] == guild_id and other_key != key and member_id in other_state.active_players:
                 other_state.active_players.discard(member_id)
                 if display_name in other_state.player_names:
                     other_state.player_names.remove(display_name)
 
                 # Limpiar estados vacíos
                 if not other_state.active_players:
-                    if game in self.eventos_activos:
-                        self.eventos_activos.discard(game)
-                    del self.games_state[game]
+                    self.eventos_activos.discard(other_key)
+                    del self.games_state[other_key]
 
         state.last_update = discord.utils.utcnow()
 
@@ -215,7 +352,7 @@ class EventosJuegosOptimizado(commands.Cog):
         )
 
         if is_ended:
-            state = self.games_state.get(game_name)
+            state = self.games_state.get((guild.id, game_name))
             if state and state.start_time:
                 duration = discord.utils.utcnow() - state.start_time
                 hours = int(duration.total_seconds() // 3600)
@@ -239,23 +376,45 @@ class EventosJuegosOptimizado(commands.Cog):
 
         return embed
 
-    async def _download_avatar_cached(self, session: aiohttp.ClientSession, url: str) -> Optional[Image.Image]:
-        """Descarga de avatar con cache optimizada"""
-        if url in self._avatar_cache:
-            return self._avatar_cache[url]
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        """Sesión HTTP de larga duración con pool de conexiones"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=8, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._http_session
+
+    @staticmethod
+    def _decode_avatar(data: bytes) -> Image.Image:
+        """Decodifica y redimensiona un avatar (se ejecuta fuera del loop)"""
+        return Image.open(io.BytesIO(data)).convert('RGBA').resize(AVATAR_SIZE)
+
+    @staticmethod
+    def _compose_avatars(avatars: List[Image.Image]) -> bytes:
+        """Compone el collage y lo codifica a PNG (se ejecuta fuera del loop)"""
+        size, positions = COLLAGE_LAYOUTS[len(avatars)]
+        combined = Image.new('RGBA', size, (0, 0, 0, 0))
+
+        for img, pos in zip(avatars, positions):
+            combined.paste(img, pos, img)
+
+        buffer = io.BytesIO()
+        combined.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue()
+
+    async def _download_avatar_cached(self, url: str) -> Optional[Image.Image]:
+        """Descarga de avatar con cache LRU limitada por bytes"""
+        img = self._avatar_cache.get(url)
+        if img is not None:
+            return img
 
         try:
-            async with session.get(url) as response:
+            async with self._get_http_session().get(url) as response:
                 if response.status == 200:
                     data = await response.read()
-                    img = Image.open(io.BytesIO(data)).convert('RGBA').resize((128, 128))
-
-                    # Cache limitado (máximo 20 avatares)
-                    if len(self._avatar_cache) >= 20:
-                        # Remover el más antiguo
-                        self._avatar_cache.pop(next(iter(self._avatar_cache)))
-
-                    self._avatar_cache[url] = img
+                    img = await asyncio.to_thread(self._decode_avatar, data)
+                    self._avatar_cache.put(url, img)
                     return img
         except Exception:
             pass
@@ -266,11 +425,12 @@ class EventosJuegosOptimizado(commands.Cog):
         if not avatar_urls:
             return None
 
-        avatar_urls = avatar_urls[:4]
+        key = tuple(sorted(avatar_urls[:4]))
 
-        async with aiohttp.ClientSession() as session:
+        png = self._collage_cache.get(key)
+        if png is None:
             avatars = await asyncio.gather(
-                *[self._download_avatar_cached(session, url) for url in avatar_urls],
+                *[self._download_avatar_cached(url) for url in key],
                 return_exceptions=True
             )
 
@@ -278,38 +438,23 @@ class EventosJuegosOptimizado(commands.Cog):
             if not valid_avatars:
                 return None
 
-            # Configuraciones optimizadas predefinidas
-            configs = {
-                1: ((128, 128), [(0, 0)]),
-                2: ((256, 128), [(0, 0), (128, 0)]),
-                3: ((256, 256), [(0, 0), (128, 0), (0, 128)]),
-                4: ((256, 256), [(0, 0), (128, 0), (0, 128), (128, 128)])
-            }
-
-            size, positions = configs[len(valid_avatars)]
-            combined = Image.new('RGBA', size, (0, 0, 0, 0))
-
-            for img, pos in zip(valid_avatars, positions):
-                combined.paste(img, pos, img)
-
-            buffer = io.BytesIO()
-            combined.save(buffer, 'PNG', optimize=True, quality=85)
-            buffer.seek(0)
+            png = await asyncio.to_thread(self._compose_avatars, valid_avatars)
+            # Solo se cachea el collage completo para no fijar descargas fallidas
+            if len(valid_avatars) == len(key):
+                self._collage_cache.put(key, png)
 
-            return discord.File(buffer, 'combined_avatar.png')
+        return discord.File(io.BytesIO(png), 'combined_avatar.png')
 
     async def _create_and_activate_event_unified(self, guild, game_name: str, players: List[str]):
         """Creación de evento unificada y optimizada"""
         try:
             # Verificar si ya existe evento activo
-            state = self.games_state.get(game_name)
+            key = (guild.id, game_name)
+            state = self.games_state.get(key)
             if state and state.event_id:
-                try:
-                    event = discord.utils.get(await guild.fetch_scheduled_events(), id=state.event_id)
-                    if event and not event.ended:
-                        return event
-                except discord.NotFound:
-                    pass
+                event = await self._get_scheduled_event(guild, state.event_id)
+                if event and self._is_event_open(event):
+                    return event
 
             current_time = discord.utils.utcnow()
             start_time = current_time + timedelta(minutes=5)
@@ -324,11 +469,12 @@ class EventosJuegosOptimizado(commands.Cog):
                 privacy_level=discord.PrivacyLevel.guild_only,
                 location=game_name
             )
+            self._cache_scheduled_event(event)
 
             # Actualizar estado
             if not state:
                 state = GameState()
-                self.games_state[game_name] = state
+                self.games_state[key] = state
 
             state.event_id = event.id
             state.start_time = current_time
@@ -336,8 +482,9 @@ class EventosJuegosOptimizado(commands.Cog):
             # Enviar notificación optimizada
             await self._send_optimized_notification(guild, game_name, players, event)
 
-            await event.start()
-            self.eventos_activos.add(game_name)
+            event = await event.start()
+            self._cache_scheduled_event(event)
+            self.eventos_activos.add(key)
 
             # Guardar estado persistente
             self.save_persistent_state()
@@ -348,8 +495,37 @@ class EventosJuegosOptimizado(commands.Cog):
             print(f"Error creating unified event: {e}")
             return None
 
+    async def _render_roster_embed(self, guild, game_name: str, state: GameState, is_ended: bool = False) -> discord.Embed:
+        """Embed del roster de la sesión (en curso o finalizada)"""
+        players = sorted(state.participants or state.player_names) if is_ended else state.player_names
+        embed = await self.create_game_embed_optimized(guild, game_name, players, is_ended=is_ended)
+
+        # Añadir información del evento
+        if state.event_id:
+            embed.add_field(
+                name="📅 Evento",
+                value=f"[Ver evento](https://discord.com/events/{guild.id}/{state.event_id})",
+                inline=True
+            )
+        return embed
+
+    @staticmethod
+    def _embed_signature(embed: discord.Embed) -> str:
+        """Firma del contenido del embed ignorando el timestamp"""
+        data = embed.to_dict()
+        data.pop('timestamp', None)
+        return json.dumps(data, sort_keys=True)
+
+    def _get_notification_message(self, state: GameState):
+        """Mensaje del roster; tras un reinicio se reconstruye desde su ID"""
+        if state.notification_message is None and state.notification_message_id:
+            channel = self.bot.get_channel(self.NOTIFICATION_CHANNEL)
+            if channel:
+                state.notification_message = channel.get_partial_message(state.notification_message_id)
+        return state.notification_message
+
     async def _send_optimized_notification(self, guild, game_name: str, players: List[str], event):
-        """Notificación optimizada con menos recursos"""
+        """Publica el mensaje del roster de la sesión (luego se edita en el sitio)"""
         try:
             channel = self.bot.get_channel(self.NOTIFICATION_CHANNEL)
             if not channel:
@@ -361,53 +537,119 @@ class EventosJuegosOptimizado(commands.Cog):
             should_ping = (robuso and voice_channel and 
                           (not robuso.voice or robuso.voice.channel.id != self.channel_id))
 
-            embed = await self.create_game_embed_optimized(guild, game_name, players)
-
-            # Añadir información del evento
-            embed.add_field(
-                name="📅 Evento",
-                value=f"[Ver evento]({event.url})" if hasattr(event, 'url') else "Evento creado",
-                inline=True
-            )
+            state = self.games_state[(guild.id, game_name)]
+            state.player_names = list(players)
+            embed = await self._render_roster_embed(guild, game_name, state)
 
             content = f"<@{self.robuso_id}> ¡Únete a la partida de {game_name}!" if should_ping else None
 
-            message = await channel.send(content=content, embed=embed)
+            message = await get_outbound(self.bot).send(channel, content=content, embed=embed, priority=HIGH)
 
             # Actualizar estado con mensaje
-            state = self.games_state[game_name]
             state.notification_message = message
+            state.notification_message_id = message.id
+            state.roster_signature = self._embed_signature(embed)
+            state.roster_players = list(state.player_names)
+            state.last_roster_edit = time.monotonic()
 
         except Exception as e:
             print(f"Error sending notification: {e}")
 
+    def _schedule_roster_update(self, guild, game_name: str, state: GameState):
+        """Programa una edición del roster; las ediciones se agrupan por intervalo"""
+        if not (state.notification_message or state.notification_message_id):
+            return
+        if state.roster_task is None or state.roster_task.done():
+            state.roster_task = asyncio.create_task(self._update_roster_message(guild, game_name, state))
+
+    async def _update_roster_message(self, guild, game_name: str, state: GameState):
+        """Edita el mensaje del roster como mucho una vez cada roster_edit_interval"""
+        try:
+            wait = state.last_roster_edit + self.roster_edit_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            # La sesión puede haber terminado mientras esperábamos
+            if self.games_state.get((guild.id, game_name)) is not state:
+                return
+
+            message = self._get_notification_message(state)
+            if message is None:
+                return
+
+            players = list(state.player_names)
+            embed = await self._render_roster_embed(guild, game_name, state)
+            signature = self._embed_signature(embed)
+            if signature == state.roster_signature:
+                state.roster_players = players
+                return
+
+            await message.edit(embed=embed)
+            state.roster_signature = signature
+            state.roster_players = players
+            state.last_roster_edit = time.monotonic()
+
+        except asyncio.CancelledError:
+            pass
+        except discord.NotFound:
+            state.notification_message = None
+            state.notification_message_id = None
+        except Exception as e:
+            print(f"Error updating roster message: {e}")
+
     async def end_event_unified(self, guild, game_name: str):
         """Finalización unificada y optimizada de eventos"""
         try:
-            state = self.games_state.get(game_name)
+            key = (guild.id, game_name)
+            state = self.games_state.get(key)
             if not state:
                 return
 
             # Finalizar evento de Discord
             if state.event_id:
                 try:
-                    events = await guild.fetch_scheduled_events()
-                    event = discord.utils.get(events, id=state.event_id)
-                    if event and not event.ended:
+                    event = await self._get_scheduled_event(guild, state.event_id)
+                    if event and self._is_event_open(event):
                         await event.edit(status=discord.EventStatus.ended)
                 except Exception:
                     pass
+                self._forget_scheduled_event(guild.id, state.event_id)
+
+            # Guardar la sesión en el historial (se escribe por lotes)
+            if state.start_time:
+                end_time = state.tracking_start or discord.utils.utcnow()
+                participants = state.participants or set(state.player_names)
+                self.historial.record(GameSession(
+                    guild_id=guild.id,
+                    game=game_name,
+                    start_ts=int(state.start_time.timestamp()),
+                    end_ts=int(end_time.timestamp()),
+                    peak_players=max(state.peak_players, len(state.player_names)),
+                    participants=sorted(participants)
+                ))
+
+            # Marcar el roster como finalizado (o publicarlo si ya no existe)
+            if state.roster_task and not state.roster_task.done():
+                state.roster_task.cancel()
+
+            embed = await self._render_roster_embed(guild, game_name, state, is_ended=True)
+            message = self._get_notification_message(state)
+            edited = False
+            if message is not None:
+                try:
+                    await message.edit(embed=embed)
+                    edited = True
+                except discord.NotFound:
+                    pass
 
-            # Enviar notificación de finalización
-            channel = self.bot.get_channel(self.NOTIFICATION_CHANNEL)
-            if channel:
-                embed = await self.create_game_embed_optimized(guild, game_name, state.player_names, is_ended=True)
-                await channel.send(embed=embed)
+            if not edited:
+                channel = self.bot.get_channel(self.NOTIFICATION_CHANNEL)
+                if channel:
+                    get_outbound(self.bot).enqueue(channel, embed=embed)
 
             # Limpiar estado
-            self.eventos_activos.discard(game_name)
-            if game_name in self.games_state:
-                del self.games_state[game_name]
+            self.eventos_activos.discard(key)
+            self.games_state.pop(key, None)
 
             # Actualizar persistencia
             self.save_persistent_state()
@@ -416,6 +658,7 @@ class EventosJuegosOptimizado(commands.Cog):
             print(f"Error ending unified event: {e}")
 
     @tasks.loop(seconds=30)  # Optimizado a 30 segundos
+    @timed_loop("unified_game_monitor")
     async def unified_game_monitor(self):
         """Task principal optimizado que combina todas las funciones de monitoreo"""
         try:
@@ -440,22 +683,40 @@ class EventosJuegosOptimizado(commands.Cog):
                                 active_games[jugador.current_game] = []
                             active_games[jugador.current_game].append(jugador.display_name)
 
+                    # Registrar la muestra del tick en las series temporales
+                    self.series.observe_guild(
+                        guild.id,
+                        {game: len(players) for game, players in active_games.items()},
+                        current_time.timestamp()
+                    )
+
                     # Procesar cada juego activo
                     for game_name, players in active_games.items():
+                        key = (guild.id, game_name)
                         if len(players) >= 2:  # Mínimo 2 jugadores
-                            if game_name not in self.eventos_activos:
+                            if key not in self.eventos_activos:
                                 await self._create_and_activate_event_unified(guild, game_name, players)
 
                         # Actualizar estado del juego
-                        if game_name in self.games_state:
-                            state = self.games_state[game_name]
+                        state = self.games_state.get(key)
+                        if state:
+                            # Se compara con el último roster publicado: state.player_names
+                            # ya puede incluir a quien entró al refrescar la caché en este tick
+                            if state.roster_players != players:
+                                self._schedule_roster_update(guild, game_name, state)
                             state.player_names = players
+                            state.participants.update(players)
+                            state.peak_players = max(state.peak_players, len(players))
                             state.last_update = current_time
 
-                    # Limpiar juegos inactivos (optimizado)
-                    for game_name in list(self.games_state.keys()):
+                    # Limpiar juegos inactivos de este guild (optimizado)
+                    for key in [k for k in self.games_state if k[0] == guild.id]:
+                        game_name = key[1]
+                        state = self.games_state[key]
                         if game_name not in active_games:
-                            state = self.games_state[game_name]
+                            if state.player_names:
+                                state.player_names = []
+                                self._schedule_roster_update(guild, game_name, state)
 
                             if not state.tracking_start:
                                 state.tracking_start = current_time
@@ -463,7 +724,6 @@ class EventosJuegosOptimizado(commands.Cog):
                                 await self.end_event_unified(guild, game_name)
                         else:
                             # Reset tracking si vuelve a estar activo
-                            state = self.games_state[game_name]
                             state.tracking_start = None
 
                     # Limpiar mensajes antiguos (cada hora)
@@ -485,12 +745,6 @@ class EventosJuegosOptimizado(commands.Cog):
                 del self._member_cache[guild.id]
                 del self._last_member_update[guild.id]
 
-            # Limpiar cache de avatares (mantener solo los 10 más recientes)
-            if len(self._avatar_cache) > 10:
-                keys_to_remove = list(self._avatar_cache.keys())[:-10]
-                for key in keys_to_remove:
-                    del self._avatar_cache[key]
-
         except Exception as e:
             print(f"Error in cleanup: {e}")
 
@@ -584,30 +838,128 @@ class EventosJuegosOptimizado(commands.Cog):
             await ctx.send("❌ Error al procesar el estado de jugadores")
             print(f"Error in check_current_games_optimized: {e}")
 
+    @commands.command(name="historial_juegos")
+    async def historial_juegos(self, ctx, *, juego: str = None):
+        """Muestra las últimas sesiones de juego del servidor (opcionalmente de un juego)"""
+        try:
+            sesiones = await self.historial.recent_sessions(ctx.guild.id, juego, limit=10)
+
+            embed = discord.Embed(
+                title=f"📜 Historial de {juego}" if juego else "📜 Historial de Partidas",
+                color=discord.Color.blurple(),
+                timestamp=discord.utils.utcnow()
+            )
+
+            if not sesiones:
+                embed.description = "*No hay sesiones registradas*"
+
+            for sesion in sesiones:
+                hours, rest = divmod(sesion.duration, 3600)
+                jugadores = ", ".join(sesion.participants[:10])
+                if len(sesion.participants) > 10:
+                    jugadores += f" y {len(sesion.participants) - 10} más"
+
+                embed.add_field(
+                    name=f"{sesion.game} · <t:{sesion.start_ts}:d>" if not juego else f"<t:{sesion.start_ts}:f>",
+                    value=f"⏱️ {hours}h {rest // 60}m · 👥 Pico: {sesion.peak_players}\n{jugadores or '*Sin datos*'}",
+                    inline=False
+                )
+
+            await ctx.send(embed=embed)
+
+        except Exception as e:
+            await ctx.send("❌ Error al consultar el historial")
+            print(f"Error in historial_juegos: {e}")
+
+    @commands.command(name="top_juegos")
+    async def top_juegos(self, ctx, dias: int = 30):
+        """Muestra los juegos más jugados del servidor en los últimos días"""
+        try:
+            top = await self.historial.top_games(ctx.guild.id, days=dias, limit=10)
+
+            embed = discord.Embed(
+                title=f"🏆 Juegos más jugados ({dias} días)",
+                color=discord.Color.gold(),
+                timestamp=discord.utils.utcnow()
+            )
+
+            if not top:
+                embed.description = "*No hay sesiones registradas en ese periodo*"
+            else:
+                lineas = []
+                for pos, (game, sesiones, segundos, pico) in enumerate(top, 1):
+                    hours, rest = divmod(segundos or 0, 3600)
+                    lineas.append(f"**{pos}. {game}** · {hours}h {rest // 60}m · {sesiones} sesiones · pico {pico}")
+                embed.description = "\n".join(lineas)
+
+            await ctx.send(embed=embed)
+
+        except Exception as e:
+            await ctx.send("❌ Error al consultar el historial")
+            print(f"Error in top_juegos: {e}")
+
+    @commands.command(name="grafica_juegos")
+    async def grafica_juegos(self, ctx, periodo: str = "dia", *, juego: str = None):
+        """Gráfica de jugadores concurrentes por juego. Periodo: dia, semana o año"""
+        periodos = {"dia": ("minute", "últimas 24 horas"), "semana": ("hour", "últimos 7 días"), "año": ("day", "último año")}
+        if periodo.lower() not in periodos:
+            await ctx.send(f"⚠️ Periodo no válido. Usa: {', '.join(periodos)}")
+            return
+
+        try:
+            resolution, descripcion = periodos[periodo.lower()]
+            datos = self.series.windows(ctx.guild.id, resolution, games=[juego] if juego else None)
+            if not datos:
+                await ctx.send("📉 No hay datos de jugadores para ese periodo.")
+                return
+
+            step = RESOLUTIONS[resolution][0]
+            titulo = f"Jugadores concurrentes - {descripcion}"
+            png = await asyncio.to_thread(render_chart, datos, step, titulo)
+
+            embed = discord.Embed(title="📈 Actividad de Juegos", color=discord.Color.green(), timestamp=discord.utils.utcnow())
+            embed.set_image(url="attachment://grafica_juegos.png")
+            await ctx.send(file=discord.File(io.BytesIO(png), 'grafica_juegos.png'), embed=embed)
+
+        except Exception as e:
+            await ctx.send("❌ Error al generar la gráfica")
+            print(f"Error in grafica_juegos: {e}")
+
     @unified_game_monitor.before_loop
     async def before_unified_monitor(self):
         """Preparación antes del loop principal"""
         await self.bot.wait_until_ready()
+        # Las series temporales usan numpy desde el primer tick: se importa en un hilo
+        await preload_series()
+        self.series.restore()
 
         # Restaurar eventos activos desde persistencia
         try:
-            for guild in self.bot.guilds:
-                for game_name, state in self.games_state.items():
-                    if state.event_id:
-                        self.eventos_activos.add(game_name)
+            for key, state in self.games_state.items():
+                if state.event_id:
+                    self.eventos_activos.add(key)
         except Exception as e:
             print(f"Error restoring active events: {e}")
 
-    def cog_unload(self):
+    async def cog_unload(self):
         """Limpieza optimizada al descargar"""
         try:
             self.unified_game_monitor.cancel()
-            self.save_persistent_state()
+            await self.events_doc.flush()
+            get_scheduler(self.bot).remove(self.SERIES_JOB)
+            await self._guardar_series()
+            await self.series_doc.flush()
+            await self.historial.close()
 
             # Limpiar caches
             self._member_cache.clear()
             self._last_member_update.clear()
             self._avatar_cache.clear()
+            self._collage_cache.clear()
+            self._scheduled_events.clear()
+
+            if self._http_session and not self._http_session.closed:
+                await self._http_session.close()
 
         except Exception as e:
             print(f"Error during cog unload: {e}")
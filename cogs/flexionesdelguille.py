@@ -1,114 +1,298 @@
 import discord
-from discord.ext import commands, tasks
-from datetime import datetime, time
-import json
-import os
+from discord.ext import commands
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from utils.json_store import get_store
+from utils.outbound import get_outbound, HIGH, LOW
+from utils.scheduler import Cron, Schedule, get_scheduler
 
-class FlexionesDelGuille(commands.Cog):
-    __slots__ = ('bot', 'guille_id', 'channel_id', 'start_date', 'data_file', 'data')
+# Participación compacta: [inicio, base, incremento, último día confirmado, racha, mejor racha]
+# (los días son ordinales de date.toordinal(); 0 = nunca)
+INICIO, BASE, INCREMENTO, ULTIMO, RACHA, MEJOR = range(6)
+
+MAX_MENSAJE = 2000
+
+def parse_hora(texto: str) -> int:
+    """Convierte 'H:MM' o 'HH:MM' en minutos desde medianoche"""
+    hora = datetime.strptime(texto.strip(), '%H:%M')
+    return hora.hour * 60 + hora.minute
+
+def repeticiones(participacion: List[int], hoy: int) -> Tuple[int, int]:
+    """(día del reto, repeticiones que tocan) según la fórmula del participante"""
+    dia = hoy - participacion[INICIO] + 1
+    return dia, participacion[BASE] + participacion[INCREMENTO] * (dia - 1)
+
+def trocear(lineas: List[str], cabecera: str) -> List[str]:
+    """Agrupa líneas en mensajes que no superen el límite de Discord"""
+    mensajes, actual = [], cabecera
+    for linea in lineas:
+        if len(actual) + len(linea) + 1 > MAX_MENSAJE:
+            mensajes.append(actual)
+            actual = cabecera
+        actual += "\n" + linea
+    mensajes.append(actual)
+    return mensajes
+
+class HorasRetos(Schedule):
+    """Regla del planificador: la siguiente hora de recordatorio de cualquier reto"""
+    __slots__ = ('cog',)
+
+    def __init__(self, cog: 'Retos'):
+        self.cog = cog
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        minutos = sorted({reto['hora'] for reto in self.cog.retos.values()})
+        if not minutos:
+            return None
+        dia = after.replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in (0, 1):
+            for minuto in minutos:
+                candidato = dia + timedelta(days=offset, minutes=minuto)
+                if candidato > after:
+                    return candidato
+        return None
+
+class Retos(commands.Cog):
+    """Retos de ejercicio diarios con fórmula de progresión y rachas por participante.
+
+    Todos los recordatorios que caen en el mismo minuto se envían en una sola
+    ejecución del planificador, con un mensaje por reto; el cierre del día
+    (23:59) revisa todos los retos a la vez.
+    """
+    __slots__ = ('bot', 'data_doc', 'data', 'retos', 'participantes')
+
+    JOB_RECORDATORIOS = "retos_recordatorios"
+    JOB_CIERRE = "retos_cierre"
+    RETO_GUILLE = "flexiones"
+    GUILLE_ID = 335099198221320192
 
     def __init__(self, bot):
         self.bot = bot
-        self.guille_id = 335099198221320192
-        self.channel_id = 498474737563861004
-        self.start_date = datetime(2025, 6, 8)  # Día 1
-        self.data_file = os.path.join('json', 'flexiones_data.json')
+        self.data_doc = get_store(bot).document('retos', lambda: {'retos': {}, 'participantes': {}})
         self.load_data()
-        self.recordatorio_diario.start()
-        self.check_confirmacion.start()
+
+        scheduler = get_scheduler(bot)
+        # Recordatorios; si el bot estaba caído se envían igualmente durante las 6 h siguientes
+        scheduler.add(self.JOB_RECORDATORIOS, HorasRetos(self), self.enviar_recordatorios, catch_up=timedelta(hours=6))
+        # Todos los días a las 23:59
+        scheduler.add(self.JOB_CIERRE, Cron(hour=23, minute=59), self.check_confirmacion)
 
     def load_data(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    self.data = json.load(f)
-            except Exception:
-                self.data = {'last_reminder': None}
-        else:
-            self.data = {'last_reminder': None}
+        self.data = self.data_doc.data
+        self.retos: Dict[str, dict] = self.data['retos']
+        self.participantes: Dict[str, Dict[str, List[int]]] = self.data['participantes']
+        if not self.data.get('migrado'):
+            self._migrar_flexiones()
+
+    def _migrar_flexiones(self):
+        """Convierte el reto fijo de Guille (flexiones_data.json) en un reto más"""
+        antiguo = get_store(self.bot).document('flexiones_data', lambda: {'last_reminder': None}).data
+        hoy = date.today().toordinal()
+        recordado = antiguo.get('last_reminder')
+        recordado = date.fromisoformat(recordado).toordinal() if recordado else 0
+        confirmado = hoy if recordado == hoy and antiguo.get('confirmed') else 0
+
+        self.retos[self.RETO_GUILLE] = {
+            'ejercicio': 'flexiones', 'canal': 498474737563861004, 'hora': 16 * 60, 'recordado': recordado,
+        }
+        self.participantes[self.RETO_GUILLE] = {
+            str(self.GUILLE_ID): [date(2025, 6, 8).toordinal(), 1, 1, confirmado, 1 if confirmado else 0, 1 if confirmado else 0],
+        }
+        self.data['migrado'] = True
+        self.save_data()
 
     def save_data(self):
-        try:
-            os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            with open(self.data_file, 'w') as f:
-                json.dump(self.data, f)
-        except Exception:
-            pass
-
-    async def send_flexiones_reminder(self):
-        days_passed = (datetime.now() - self.start_date).days + 1
-        flexiones = days_passed
-        channel = self.bot.get_channel(self.channel_id)
-        today = datetime.now().strftime('%Y-%m-%d')
-        if channel:
-            await channel.send(
-                f"<@{self.guille_id}> ¡ES HORA DE TUS FLEXIONES DIARIAS! 💪\n"
-                f"Hoy es el día {days_passed}, así que toca hacer {flexiones} flexiones 🏋️‍♂️\n"
-                f"¡Cada día más fuerte! 💪💪\n"
-                f"Cuando termines, usa el comando `ºconfirmar_flexiones` para confirmar que las has hecho."
-            )
-            self.data['last_reminder'] = today
-            self.data['confirmed'] = False
-            self.save_data()
-
-    @tasks.loop(time=time(hour=16))  # Se ejecuta todos los días a las 16:00
-    async def recordatorio_diario(self):
-        await self.send_flexiones_reminder()
-
-    @tasks.loop(time=time(hour=23, minute=59))  # Se ejecuta todos los días a las 23:59
+        self.data_doc.mark_dirty()
+
+    # --- Planificador ---
+
+    async def enviar_recordatorios(self, forzar: Optional[str] = None):
+        """Envía los recordatorios de todos los retos cuya hora ya ha llegado hoy"""
+        ahora = datetime.now()
+        hoy = ahora.date().toordinal()
+        minuto = ahora.hour * 60 + ahora.minute
+        outbound = get_outbound(self.bot)
+
+        for nombre, reto in self.retos.items():
+            if forzar is not None:
+                if nombre != forzar:
+                    continue
+            elif reto['hora'] > minuto or reto.get('recordado') == hoy:
+                continue
+
+            lineas = []
+            for user_id, p in self.participantes.get(nombre, {}).items():
+                if p[INICIO] > hoy or p[ULTIMO] == hoy:
+                    continue
+                dia, reps = repeticiones(p, hoy)
+                lineas.append(f"<@{user_id}> día {dia}: **{reps}** {reto['ejercicio']} 🏋️‍♂️")
+            if forzar is None:
+                # Una prueba con ºtest_flexiones no cuenta como el recordatorio del día
+                reto['recordado'] = hoy
+
+            channel = self.bot.get_channel(reto['canal'])
+            if channel and lineas:
+                cabecera = f"¡ES HORA DEL RETO **{nombre}**! 💪 Cuando termines, usa `ºconfirmar {nombre}`."
+                for mensaje in trocear(lineas, cabecera):
+                    outbound.enqueue(channel, priority=HIGH, content=mensaje)
+        self.save_data()
+
     async def check_confirmacion(self):
-        today = datetime.now().strftime('%Y-%m-%d')
-        if self.data.get('last_reminder') == today and not self.data.get('confirmed', False):
-            channel = self.bot.get_channel(self.channel_id)
+        """Cierre del día: avisa a quien no ha confirmado y le corta la racha"""
+        hoy = date.today().toordinal()
+        outbound = get_outbound(self.bot)
+
+        for nombre, reto in self.retos.items():
+            if reto.get('recordado') != hoy:
+                continue
+            pendientes = []
+            for user_id, p in self.participantes.get(nombre, {}).items():
+                if p[INICIO] <= hoy and p[ULTIMO] != hoy:
+                    p[RACHA] = 0
+                    pendientes.append(user_id)
+            if not pendientes:
+                continue
+
+            channel = self.bot.get_channel(reto['canal'])
             if channel:
-                await channel.send(f"<@{self.guille_id}> ¡NO HAS CONFIRMADO TUS FLEXIONES DE HOY! 😡 ¡Hazlas o atente a las consecuencias!")
-            # Intentar enviar DM
-            user = self.bot.get_user(self.guille_id)
-            if user:
-                try:
-                    await user.send(
-                        "¿Te crees que puedes escaquearte de las flexiones? Última advertencia... 😈",
+                lineas = [f"<@{user_id}>" for user_id in pendientes]
+                cabecera = f"¡NO HABÉIS CONFIRMADO EL RETO **{nombre}** DE HOY! 😡 ¡Hacedlo o ateneos a las consecuencias!"
+                for mensaje in trocear(lineas, cabecera):
+                    outbound.enqueue(channel, content=mensaje)
+            for user_id in pendientes:
+                user = self.bot.get_user(int(user_id))
+                if user:
+                    outbound.enqueue(
+                        user,
+                        priority=LOW,
+                        content=f"¿Te crees que puedes escaquearte de las {reto['ejercicio']}? Última advertencia... 😈",
                         embed=discord.Embed().set_image(url="https://media.tenor.com/2g6lQkU4QJwAAAAC/spongebob-spunch-bop.gif")
                     )
-                except Exception:
-                    pass
-        # Resetear confirmación para el día siguiente
-        self.data['confirmed'] = False
         self.save_data()
 
-    @recordatorio_diario.before_loop
-    async def before_reminder(self):
-        await self.bot.wait_until_ready()
+    # --- Comandos ---
 
-    @check_confirmacion.before_loop
-    async def before_check(self):
-        await self.bot.wait_until_ready()
+    @commands.command(name="reto_crear", help="Crea un reto diario. Ejemplo: ºreto_crear sentadillas 18:00 #canal sentadillas")
+    @commands.has_permissions(administrator=True)
+    async def reto_crear(self, ctx, nombre: str, hora: str, canal: Optional[discord.TextChannel] = None, *, ejercicio: str = None):
+        nombre = nombre.lower()
+        try:
+            minuto = parse_hora(hora)
+        except ValueError:
+            await ctx.send("Formato de hora incorrecto. Usa `HH:MM`, por ejemplo `18:00`.")
+            return
+        self.retos[nombre] = {
+            'ejercicio': ejercicio or nombre,
+            'canal': (canal or ctx.channel).id,
+            'hora': minuto,
+            'recordado': self.retos.get(nombre, {}).get('recordado', 0),
+        }
+        self.participantes.setdefault(nombre, {})
+        self.save_data()
+        get_scheduler(self.bot).reschedule(self.JOB_RECORDATORIOS)
+        await ctx.send(f"Reto **{nombre}** creado: recordatorio diario a las {hora} en {(canal or ctx.channel).mention} 💪")
+
+    @commands.command(name="reto_borrar", help="Borra un reto y sus participantes.")
+    @commands.has_permissions(administrator=True)
+    async def reto_borrar(self, ctx, nombre: str):
+        nombre = nombre.lower()
+        if self.retos.pop(nombre, None) is None:
+            await ctx.send(f"No existe el reto **{nombre}**.")
+            return
+        self.participantes.pop(nombre, None)
+        self.save_data()
+        get_scheduler(self.bot).reschedule(self.JOB_RECORDATORIOS)
+        await ctx.send(f"Reto **{nombre}** eliminado.")
+
+    @commands.command(name="unirse_reto", help="Únete a un reto. Ejemplo: ºunirse_reto flexiones 10 2 (empieza en 10 y suma 2 cada día)")
+    async def unirse_reto(self, ctx, nombre: str, base: int = 1, incremento: int = 1):
+        nombre = nombre.lower()
+        if nombre not in self.retos:
+            await ctx.send(f"No existe el reto **{nombre}**. Usa `ºretos` para ver los disponibles.")
+            return
+        if base < 1 or incremento < 0:
+            await ctx.send("La base debe ser al menos 1 y el incremento no puede ser negativo.")
+            return
+        self.participantes[nombre][str(ctx.author.id)] = [date.today().toordinal(), base, incremento, 0, 0, 0]
+        self.save_data()
+        await ctx.send(f"¡{ctx.author.display_name} se une al reto **{nombre}**! Hoy tocan {base} {self.retos[nombre]['ejercicio']} y {incremento} más cada día 💪")
+
+    @commands.command(name="salir_reto", help="Abandona un reto.")
+    async def salir_reto(self, ctx, nombre: str):
+        if self.participantes.get(nombre.lower(), {}).pop(str(ctx.author.id), None) is None:
+            await ctx.send(f"No participas en el reto **{nombre}**.")
+            return
+        self.save_data()
+        await ctx.send(f"Has abandonado el reto **{nombre}**. Cobarde. 🐔")
+
+    @commands.command(name="confirmar", help="Confirma que has hecho el reto de hoy. Ejemplo: ºconfirmar flexiones")
+    async def confirmar(self, ctx, nombre: str = None):
+        await self._confirmar(ctx, nombre)
+
+    async def _confirmar(self, ctx, nombre: Optional[str]):
+        user_id = str(ctx.author.id)
+        if nombre is None:
+            # Si solo participa en un reto, no hace falta decir cuál
+            mios = [reto for reto, participantes in self.participantes.items() if user_id in participantes]
+            if len(mios) != 1:
+                await ctx.send("Indica qué reto confirmas, por ejemplo `ºconfirmar flexiones`.")
+                return
+            nombre = mios[0]
+
+        p = self.participantes.get(nombre.lower(), {}).get(user_id)
+        if p is None:
+            await ctx.send(f"No participas en el reto **{nombre}**.")
+            return
+        hoy = date.today().toordinal()
+        if self.retos[nombre.lower()].get('recordado') != hoy:
+            # Solo se confirma después del recordatorio del día
+            await ctx.send(f"No hay reto **{nombre}** pendiente para hoy.")
+            return
+        if p[ULTIMO] == hoy:
+            await ctx.send("Ya has confirmado el reto de hoy.")
+            return
+        p[RACHA] = p[RACHA] + 1 if p[ULTIMO] == hoy - 1 else 1
+        p[MEJOR] = max(p[MEJOR], p[RACHA])
+        p[ULTIMO] = hoy
+        self.save_data()
+        await ctx.send(f"¡Reto confirmado! Buen trabajo 💪 Racha: {p[RACHA]} día(s)")
 
     @commands.command(name="confirmar_flexiones")
     async def confirmar_flexiones(self, ctx):
-        if ctx.author.id != self.guille_id:
+        # El comando de siempre sigue siendo solo de Guille; el resto usa ºconfirmar
+        if ctx.author.id != self.GUILLE_ID:
             await ctx.send("Este comando solo puede usarlo Guille para confirmar sus flexiones.")
             return
-        today = datetime.now().strftime('%Y-%m-%d')
-        if self.data.get('last_reminder') == today:
-            if not self.data.get('confirmed', False):
-                self.data['confirmed'] = True
-                self.save_data()
-                await ctx.send("¡Flexiones confirmadas! Buen trabajo 💪")
-            else:
-                await ctx.send("Ya has confirmado tus flexiones hoy.")
-        else:
-            await ctx.send("No hay flexiones pendientes para hoy.")
+        await self._confirmar(ctx, self.RETO_GUILLE)
+
+    @commands.command(name="retos", help="Muestra los retos y tus rachas.")
+    async def listar_retos(self, ctx):
+        if not self.retos:
+            await ctx.send("No hay retos creados.")
+            return
+        hoy = date.today().toordinal()
+        embed = discord.Embed(title="🏋️ Retos", color=discord.Color.orange())
+        for nombre, reto in list(self.retos.items())[:25]:
+            participantes = self.participantes.get(nombre, {})
+            valor = f"{reto['ejercicio']} · {reto['hora'] // 60:02d}:{reto['hora'] % 60:02d} · {len(participantes)} participante(s)"
+            p = participantes.get(str(ctx.author.id))
+            if p is not None:
+                dia, reps = repeticiones(p, hoy)
+                valor += f"\nTú: día {dia}, hoy {reps} · racha {p[RACHA]} (mejor {p[MEJOR]})"
+            embed.add_field(name=nombre, value=valor, inline=False)
+        await ctx.send(embed=embed)
 
     @commands.command(name="test_flexiones")
     @commands.has_permissions(administrator=True)
-    async def test_flexiones(self, ctx):
-        await self.send_flexiones_reminder()
+    async def test_flexiones(self, ctx, nombre: str = RETO_GUILLE):
+        await self.enviar_recordatorios(forzar=nombre.lower())
         await ctx.send("Recordatorio de prueba enviado.")
 
-    def cog_unload(self):
-        self.recordatorio_diario.cancel()
-        self.check_confirmacion.cancel()
+    async def cog_unload(self):
+        scheduler = get_scheduler(self.bot)
+        scheduler.remove(self.JOB_RECORDATORIOS)
+        scheduler.remove(self.JOB_CIERRE)
+        await self.data_doc.flush()
 
 async def setup(bot):
-    await bot.add_cog(FlexionesDelGuille(bot))
\ No newline at end of file
+    await bot.add_cog(Retos(bot))
\ No newline at end of file
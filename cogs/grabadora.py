@@ -0,0 +1,102 @@
+from discord.ext import commands
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional
+from utils.gateway_trace import TraceWriter, playing_names
+
+class GrabadoraGateway(commands.Cog):
+    """Graba los eventos de presencia, miembros, voz y eventos programados para reproducirlos offline"""
+    __slots__ = ('bot', 'trace_dir', 'writer', 'stop_task')
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.trace_dir = "traces"
+        self.writer: Optional[TraceWriter] = None
+        self.stop_task: Optional[asyncio.Task] = None
+
+    def _record(self, kind, guild_id, *fields):
+        if self.writer is not None:
+            self.writer.record(kind, guild_id, *fields)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        if self.writer is not None:
+            games = playing_names(after.activities)
+            if games != playing_names(before.activities):
+                self._record("p", after.guild.id, after.id, games)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self._record("mj", member.guild.id, member.id, member.display_name,
+                     [r.id for r in member.roles], playing_names(member.activities))
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if self.writer is not None and (before.display_name != after.display_name or before.roles != after.roles):
+            self._record("mu", after.guild.id, after.id, after.display_name, [r.id for r in after.roles])
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self._record("mr", member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        if before.channel != after.channel:
+            self._record("v", member.guild.id, member.id, after.channel.id if after.channel else None)
+
+    @commands.Cog.listener()
+    async def on_scheduled_event_create(self, event):
+        self._record("se", event.guild_id, event.id, event.status.value)
+
+    @commands.Cog.listener()
+    async def on_scheduled_event_update(self, before, after):
+        self._record("se", after.guild_id, after.id, after.status.value)
+
+    @commands.Cog.listener()
+    async def on_scheduled_event_delete(self, event):
+        self._record("sd", event.guild_id, event.id)
+
+    async def _stop_recording(self) -> Optional[TraceWriter]:
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            await writer.close()
+        return writer
+
+    async def _stop_after(self, ctx, minutes: float):
+        await asyncio.sleep(minutes * 60)
+        writer = await self._stop_recording()
+        if writer is not None:
+            await ctx.send(f"⏹️ Grabación terminada: `{writer.path}` ({writer.count} eventos)")
+
+    @commands.command(name="grabar_gateway", help="Graba eventos del gateway durante N minutos (por defecto 30).")
+    @commands.is_owner()
+    async def grabar_gateway(self, ctx, minutos: float = 30):
+        if self.writer is not None:
+            await ctx.send("⚠️ Ya hay una grabación en curso. Usa `ºparar_grabacion` para terminarla.")
+            return
+
+        os.makedirs(self.trace_dir, exist_ok=True)
+        path = os.path.join(self.trace_dir, f"gateway_{datetime.now():%Y%m%d_%H%M%S}.jsonl.gz")
+        self.writer = TraceWriter(path, self.bot.guilds)
+        self.stop_task = asyncio.create_task(self._stop_after(ctx, minutos))
+        await ctx.send(f"⏺️ Grabando eventos del gateway durante {minutos:g} minutos en `{path}`")
+
+    @commands.command(name="parar_grabacion", help="Termina la grabación de eventos del gateway.")
+    @commands.is_owner()
+    async def parar_grabacion(self, ctx):
+        if self.stop_task and not self.stop_task.done():
+            self.stop_task.cancel()
+        writer = await self._stop_recording()
+        if writer is None:
+            await ctx.send("No hay ninguna grabación en curso.")
+        else:
+            await ctx.send(f"⏹️ Grabación terminada: `{writer.path}` ({writer.count} eventos)")
+
+    async def cog_unload(self):
+        if self.stop_task and not self.stop_task.done():
+            self.stop_task.cancel()
+        await self._stop_recording()
+
+async def setup(bot):
+    await bot.add_cog(GrabadoraGateway(bot))
@@ -2,15 +2,12 @@ import discord
 from discord.ext import commands
 import os
 import io
-from PIL import Image
+from utils.lazy import lazy_import
 
-try:
-    import cv2
-    import numpy as np
-    OPENCV_AVAILABLE = True
-except ImportError as e:
-    print(f"OpenCV or numpy import failed: {e}")
-    OPENCV_AVAILABLE = False
+# Solo se importan la primera vez que alguien usa ºmagik
+Image = lazy_import("PIL.Image")
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
 
 class Magik(commands.Cog):
     def __init__(self, bot):
@@ -27,6 +24,13 @@ class Magik(commands.Cog):
             await ctx.send("❌ El archivo debe ser una imagen (PNG, JPG o JPEG).")
             return
 
+        if not (cv2.available() and np.available()):
+            await ctx.send("❌ OpenCV o numpy no están instalados en el bot.")
+            return
+        # Importarlos en un hilo la primera vez, sin bloquear el bot
+        for module in (cv2, np, Image):
+            await module.load_async()
+
         # Descargar la imagen
         image_bytes = await attachment.read()
         image = Image.open(io.BytesIO(image_bytes))
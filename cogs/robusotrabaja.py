@@ -1,54 +1,179 @@
 import discord
-from discord.ext import commands, tasks
-from datetime import datetime, time
+from discord.ext import commands
+from datetime import datetime, timedelta
 import asyncio
-import json
-import os
-from typing import Dict, Optional
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+from utils.json_store import get_store
+from utils.outbound import get_outbound
+from utils.scheduler import Schedule, get_scheduler
+
+MINUTOS_DIA = 24 * 60
+MINUTOS_SEMANA = 7 * MINUTOS_DIA
+
+def parse_hora(texto: str) -> int:
+    """Convierte 'H:MM' o 'HH:MM' en minutos desde medianoche"""
+    horas, sep, minutos = texto.strip().partition(':')
+    if not sep or not horas.isdigit() or not minutos.isdigit() or len(minutos) != 2:
+        raise ValueError(f"Hora inválida: {texto!r}")
+    h, m = int(horas), int(minutos)
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"Hora inválida: {texto!r}")
+    return h * 60 + m
+
+def formatear_hora(minutos: int) -> str:
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def turno_semanal(dia_index: int, entrada: int, salida: int) -> Tuple[int, int]:
+    """Minutos de la semana (lunes 00:00 = 0) de entrada y salida.
+
+    Si la salida es anterior o igual a la entrada, el turno cruza la
+    medianoche y termina al día siguiente (domingo -> lunes incluido).
+    """
+    inicio = dia_index * MINUTOS_DIA + entrada
+    fin = dia_index * MINUTOS_DIA + salida + (MINUTOS_DIA if salida <= entrada else 0)
+    return inicio, fin % MINUTOS_SEMANA
+
+class IndiceTurnos:
+    """Índice de intervalos sobre los minutos de la semana.
+
+    La semana se divide en cubos de una hora; cada turno se registra en los
+    cubos que solapa, así que una consulta solo revisa los turnos de su cubo.
+    Los turnos que cruzan el final de la semana se guardan en dos tramos.
+    """
+    CUBO = 60
+    __slots__ = ('_cubos', '_por_usuario')
+
+    def __init__(self):
+        self._cubos: List[Dict[Tuple[str, str], Tuple[int, int]]] = [{} for _ in range(MINUTOS_SEMANA // self.CUBO)]
+        self._por_usuario: Dict[str, List[Tuple[Tuple[str, str], int]]] = {}
+
+    def agregar(self, user_id: str, dia: str, dia_index: int, entrada: int, salida: int) -> None:
+        inicio = dia_index * MINUTOS_DIA + entrada
+        duracion = (salida - entrada) % MINUTOS_DIA or MINUTOS_DIA
+        fin = inicio + duracion
+        tramos = [(inicio, fin)] if fin <= MINUTOS_SEMANA else [(inicio, MINUTOS_SEMANA), (0, fin - MINUTOS_SEMANA)]
+
+        clave = (user_id, dia)
+        registros = self._por_usuario.setdefault(user_id, [])
+        for ini, fi in tramos:
+            for cubo in range(ini // self.CUBO, (fi - 1) // self.CUBO + 1):
+                self._cubos[cubo][clave] = (ini, fi)
+                registros.append((clave, cubo))
+
+    def quitar_usuario(self, user_id: str) -> None:
+        for clave, cubo in self._por_usuario.pop(user_id, ()):
+            self._cubos[cubo].pop(clave, None)
+
+    def consultar(self, minuto_semana: int) -> List[Tuple[str, str]]:
+        """Devuelve (user_id, día del turno) de quienes trabajan en ese minuto"""
+        minuto_semana %= MINUTOS_SEMANA
+        return [clave for clave, (ini, fin) in self._cubos[minuto_semana // self.CUBO].items()
+                if ini <= minuto_semana < fin]
+
+class ProximoAviso(Schedule):
+    """Regla del planificador: el siguiente aviso pendiente de la cola del cog"""
+    __slots__ = ('cog',)
+
+    def __init__(self, cog: 'HorarioTrabajo'):
+        self.cog = cog
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        return self.cog._proximo_aviso(after)
 
 class HorarioTrabajo(commands.Cog):
-    __slots__ = ('bot', 'archivo_horarios', 'horarios', 'canal_default_name', 'dias_semana')
+    __slots__ = ('bot', 'horarios_doc', 'horarios', 'canal_default_name', 'dias_semana',
+                 'grace', 'indice', '_heap', '_seq', '_generacion')
+    JOB = "horario_avisos"
     
     DIAS_SEMANA = {
         0: 'lunes', 1: 'martes', 2: 'miercoles', 3: 'jueves', 
         4: 'viernes', 5: 'sabado', 6: 'domingo'
     }
+    DIA_INDEX = {dia: index for index, dia in DIAS_SEMANA.items()}
 
     def __init__(self, bot):
         self.bot = bot
-        self.archivo_horarios = os.path.join("json", "horarios.json")
+        self.horarios_doc = get_store(bot).document("horarios")
         self.horarios: Dict = {}
         self.canal_default_name = "el-cónclave-de-los-racistas"
         self.dias_semana = self.DIAS_SEMANA
-        self._ensure_json_dir()
+        self.grace = timedelta(minutes=15)  # Ventana para recuperar avisos perdidos
+
+        # Cola de prioridad de avisos: (cuándo, seq, tipo, user_id, dia, generación)
+        self._heap: List[Tuple[datetime, int, str, str, str, int]] = []
+        self._seq = itertools.count()
+        self._generacion: Dict[str, int] = {}
+        self.indice = IndiceTurnos()
+
         self.cargar_horarios()
-        self.revisar_horarios.start()
-    
-    def _ensure_json_dir(self) -> None:
-        """Asegura que existe el directorio json"""
-        os.makedirs(os.path.dirname(self.archivo_horarios), exist_ok=True)
-    
-    def cog_unload(self):
-        self.revisar_horarios.cancel()
-        self.guardar_horarios()
+        get_scheduler(bot).add(self.JOB, ProximoAviso(self), self.revisar_horarios, catch_up=self.grace)
+
+    async def cog_unload(self):
+        get_scheduler(self.bot).remove(self.JOB)
+        await self.horarios_doc.flush()
     
     def cargar_horarios(self) -> None:
-        if not os.path.exists(self.archivo_horarios):
-            self.horarios = {}
-            return
-        
-        try:
-            with open(self.archivo_horarios, 'r', encoding='utf-8') as f:
-                self.horarios = json.load(f)
-        except Exception:
-            self.horarios = {}
+        self.horarios = self.horarios_doc.data
+
+        # Recuperar los avisos perdidos (reinicio) dentro de la ventana de gracia
+        ahora = datetime.now()
+        desde = ahora
+        last_run = get_scheduler(self.bot).last_run(self.JOB)
+        if last_run:
+            desde = max(last_run, ahora - self.grace)
+
+        for user_id_str in self.horarios:
+            self._programar_usuario(user_id_str, desde)
     
     def guardar_horarios(self) -> None:
-        try:
-            with open(self.archivo_horarios, 'w', encoding='utf-8') as f:
-                json.dump(self.horarios, f, ensure_ascii=False)
-        except Exception:
-            pass
+        """Marca los horarios como modificados; el almacén los escribe en diferido"""
+        self.horarios_doc.mark_dirty()
+
+    @staticmethod
+    def _siguiente(minuto_semana: int, desde: datetime) -> datetime:
+        """Primera fecha posterior a ``desde`` que cae en ese minuto de la semana"""
+        lunes = (desde - timedelta(days=desde.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        cuando = lunes + timedelta(minutes=minuto_semana)
+        if cuando <= desde:
+            cuando += timedelta(days=7)
+        return cuando
+
+    def _programar_usuario(self, user_id_str: str, desde: Optional[datetime] = None) -> None:
+        """(Re)programa los avisos y el índice de un usuario; los antiguos quedan invalidados"""
+        generacion = self._generacion.get(user_id_str, 0) + 1
+        self._generacion[user_id_str] = generacion
+        self.indice.quitar_usuario(user_id_str)
+        desde = desde or datetime.now()
+
+        for dia, horario in self.horarios.get(user_id_str, {}).items():
+            try:
+                entrada, salida = parse_hora(horario['entrada']), parse_hora(horario['salida'])
+                inicio, fin = turno_semanal(self.DIA_INDEX[dia], entrada, salida)
+            except (KeyError, ValueError):
+                print(f"Error procesando horario para usuario {user_id_str}: formato de hora inválido")
+                continue
+            self.indice.agregar(user_id_str, dia, self.DIA_INDEX[dia], entrada, salida)
+            for tipo, minuto in (('entrada', inicio), ('salida', fin)):
+                heapq.heappush(self._heap, (self._siguiente(minuto, desde), next(self._seq), tipo, user_id_str, dia, generacion))
+
+        # Compactar la cola si la mayoría de entradas han quedado invalidadas
+        vigentes = 2 * sum(len(dias) for dias in self.horarios.values())
+        if len(self._heap) > 64 and len(self._heap) > 2 * vigentes:
+            self._heap = [e for e in self._heap if e[5] == self._generacion.get(e[3])]
+            heapq.heapify(self._heap)
+
+        get_scheduler(self.bot).reschedule(self.JOB)
+
+    def _proximo_aviso(self, despues: datetime) -> Optional[datetime]:
+        """Fecha del primer aviso vigente posterior a ``despues`` (descarta los invalidados)"""
+        while self._heap and self._heap[0][5] != self._generacion.get(self._heap[0][3]):
+            heapq.heappop(self._heap)
+        if not self._heap or self._heap[0][0] > despues:
+            return self._heap[0][0] if self._heap else None
+        # Quedan avisos vencidos sin atender (recuperación tras un reinicio): el siguiente tras ellos
+        return min((e[0] for e in self._heap if e[0] > despues and e[5] == self._generacion.get(e[3])), default=None)
     
     @commands.command(name='horario', help='Establece tu horario de trabajo. Formato: ºhorario <día> HH:MM HH:MM #canal')
     async def establecer_horario(self, ctx, dia: str = None, entrada: str = None, salida: str = None, canal: discord.TextChannel = None):
@@ -82,8 +207,8 @@ class HorarioTrabajo(commands.Cog):
         
         try:
             # Parsear las horas para validar el formato
-            hora_entrada = datetime.strptime(entrada, '%H:%M').time()
-            hora_salida = datetime.strptime(salida, '%H:%M').time()
+            entrada = formatear_hora(parse_hora(entrada))
+            salida = formatear_hora(parse_hora(salida))
             
             # Si no se especifica canal, usar #el-cónclave-de-los-racistas por defecto
             if canal:
@@ -106,8 +231,9 @@ class HorarioTrabajo(commands.Cog):
                 'nombre': ctx.author.display_name
             }
             
-            # Guardar en archivo
+            # Guardar en archivo y reprogramar sus avisos
             self.guardar_horarios()
+            self._programar_usuario(user_id_str)
             
             embed = discord.Embed(
                 title="📅 Horario Establecido",
@@ -185,6 +311,7 @@ class HorarioTrabajo(commands.Cog):
             # Borrar todos los horarios
             del self.horarios[user_id_str]
             self.guardar_horarios()
+            self._programar_usuario(user_id_str)
             embed = discord.Embed(
                 title="🗑️ Todos los Horarios Eliminados",
                 description="Todos tus horarios han sido eliminados correctamente.",
@@ -211,6 +338,7 @@ class HorarioTrabajo(commands.Cog):
                 if not self.horarios[user_id_str]:
                     del self.horarios[user_id_str]
                 self.guardar_horarios()
+                self._programar_usuario(user_id_str)
                 embed = discord.Embed(
                     title="🗑️ Horario Eliminado",
                     description=f"Tu horario del **{dia_normalizado}** ha sido eliminado correctamente.",
@@ -225,77 +353,153 @@ class HorarioTrabajo(commands.Cog):
                 )
                 await ctx.send(embed=embed)
     
-    @tasks.loop(minutes=1)  # Revisa cada minuto
-    async def revisar_horarios(self):
-        """Task que revisa los horarios y envía notificaciones."""
+    def _embed_trabajando(self, guild: Optional[discord.Guild], minuto_semana: int, titulo: str) -> discord.Embed:
+        """Embed con quienes están en su turno en ese minuto de la semana"""
+        embed = discord.Embed(title=titulo, color=0x0099ff)
+        lineas = []
+        for user_id_str, dia in sorted(self.indice.consultar(minuto_semana), key=lambda clave: clave[1:] + clave[:1]):
+            horario = self.horarios.get(user_id_str, {}).get(dia)
+            if not horario:
+                continue
+            member = guild.get_member(int(user_id_str)) if guild else None
+            nombre = member.display_name if member else horario.get('nombre', user_id_str)
+            linea = f"• **{nombre}** — {horario['entrada']} a {horario['salida']}"
+            if self.DIA_INDEX[dia] != minuto_semana // MINUTOS_DIA:
+                linea += f" (turno del {dia})"
+            lineas.append(linea)
+
+        if lineas:
+            descripcion = "\n".join(lineas)
+            embed.description = descripcion if len(descripcion) <= 4096 else descripcion[:4000] + "\n…"
+        else:
+            embed.description = "Nadie está trabajando en ese momento."
+        embed.set_footer(text=f"{len(lineas)} persona(s) trabajando")
+        return embed
+
+    @commands.command(name='trabajando_ahora', help='Muestra quién está en su turno de trabajo ahora mismo.')
+    async def trabajando_ahora(self, ctx):
+        """Lista a los usuarios cuyo horario incluye el momento actual."""
         ahora = datetime.now()
-        hora_actual = ahora.time().replace(second=0, microsecond=0)  # Ignorar segundos y microsegundos
-        dia_actual = self.dias_semana[ahora.weekday()]  # Obtener día actual
-        
-        for user_id_str, horarios_usuario in self.horarios.items():
-            if dia_actual in horarios_usuario:
-                horario = horarios_usuario[dia_actual]
-                
-                # Convertir strings a objetos time para comparar
-                try:
-                    hora_entrada = datetime.strptime(horario['entrada'], '%H:%M').time()
-                    hora_salida = datetime.strptime(horario['salida'], '%H:%M').time()
-                    
-                    # Revisar entrada
-                    if hora_entrada == hora_actual:
-                        await self.enviar_notificacion_entrada(int(user_id_str), horario, dia_actual)
-                    
-                    # Revisar salida
-                    elif hora_salida == hora_actual:
-                        await self.enviar_notificacion_salida(int(user_id_str), horario, dia_actual)
-                        
-                except ValueError:
-                    print(f"Error procesando horario para usuario {user_id_str}: formato de hora inválido")
-    
-    @revisar_horarios.before_loop
-    async def antes_revisar_horarios(self):
-        """Espera a que el bot esté listo antes de iniciar el task."""
-        await self.bot.wait_until_ready()
-    
-    async def enviar_notificacion_entrada(self, user_id, horario, dia):
-        """Envía notificación de entrada al trabajo."""
+        minuto = ahora.weekday() * MINUTOS_DIA + ahora.hour * 60 + ahora.minute
+        await ctx.send(embed=self._embed_trabajando(ctx.guild, minuto, f"🏢 Trabajando ahora ({ahora.strftime('%H:%M')})"))
+
+    @commands.command(name='quien_trabaja', help='Muestra quién trabaja un día a una hora. Formato: ºquien_trabaja <día> HH:MM')
+    async def quien_trabaja(self, ctx, dia: str = None, hora: str = None):
+        """Lista a los usuarios cuyo horario incluye el día y la hora indicados."""
+        dia_normalizado = dia.lower().strip() if dia else None
+        if dia_normalizado not in self.DIA_INDEX or not hora:
+            embed = discord.Embed(
+                title="❌ Uso Incorrecto",
+                description=f"**Formato:** `ºquien_trabaja <día> HH:MM`\n**Ejemplo:** `ºquien_trabaja lunes 10:30`\n\n**Días válidos:** {', '.join(self.DIA_INDEX)}",
+                color=0xff0000
+            )
+            await ctx.send(embed=embed)
+            return
+
         try:
-            canal = self.bot.get_channel(horario['canal'])
-            if canal:
-                embed = discord.Embed(
-                    title="🏢 Inicio de Jornada",
-                    description=f"robuso ha empezado su jornada laboral del **{dia}**",
-                    color=0x00ff00,
-                    timestamp=datetime.now()
-                )
-                embed.add_field(name="Día", value=dia.capitalize(), inline=True)
-                embed.add_field(name="Hora de entrada", value=horario['entrada'], inline=True)
-                embed.add_field(name="Hora de salida", value=horario['salida'], inline=True)
-                embed.set_footer(text="¡Todos deseamos que te vaya genial y que los indios no toquen los huevos!")
-                
-                await canal.send(embed=embed)
-        except Exception as e:
-            print(f"Error enviando notificación de entrada: {e}")
+            minutos = parse_hora(hora)
+        except ValueError:
+            await ctx.send(embed=discord.Embed(title="❌ Error de Formato", description="Usa el formato de 24 horas `HH:MM`.", color=0xff0000))
+            return
+
+        minuto = self.DIA_INDEX[dia_normalizado] * MINUTOS_DIA + minutos
+        await ctx.send(embed=self._embed_trabajando(ctx.guild, minuto, f"📅 Trabajando el {dia_normalizado} a las {formatear_hora(minutos)}"))
+
+    async def revisar_horarios(self):
+        """Tarea del planificador: envía los avisos vencidos de la cola."""
+        ahora = datetime.now()
+        vencidos = []
+
+        while self._heap and self._heap[0][0] <= ahora:
+            cuando, _, tipo, user_id_str, dia, generacion = heapq.heappop(self._heap)
+            if generacion != self._generacion.get(user_id_str):
+                continue  # El horario cambió después de programarlo
+
+            # Reprogramar la misma ocurrencia para la semana siguiente
+            heapq.heappush(self._heap, (cuando + timedelta(days=7), next(self._seq), tipo, user_id_str, dia, generacion))
+            if ahora - cuando <= self.grace:
+                vencidos.append((tipo, user_id_str, dia))
+
+        if vencidos:
+            self.enviar_avisos(vencidos)
     
-    async def enviar_notificacion_salida(self, user_id, horario, dia):
-        """Envía notificación de salida del trabajo."""
-        try:
-            canal = self.bot.get_channel(horario['canal'])
-            if canal:
-                embed = discord.Embed(
-                    title="🏠 Fin de Jornada",
-                    description=f"robuso ha terminado su jornada laboral del **{dia}**",
-                    color=0xff6600,
-                    timestamp=datetime.now()
-                )
-                embed.add_field(name="Día", value=dia.capitalize(), inline=True)
-                embed.add_field(name="Hora de entrada", value=horario['entrada'], inline=True)
-                embed.add_field(name="Hora de salida", value=horario['salida'], inline=True)
-                embed.set_footer(text="¡Si no juega con vosotros es porque no os quiere!")
-                
-                await canal.send(embed=embed)
-        except Exception as e:
-            print(f"Error enviando notificación de salida: {e}")
+    # Textos de cada tipo de aviso: (título individual, verbo, color, pie, título agrupado)
+    AVISOS = {
+        'entrada': ("🏢 Inicio de Jornada", "ha empezado", 0x00ff00,
+                    "¡Todos deseamos que te vaya genial y que los indios no toquen los huevos!", "🏢 Empiezan su jornada"),
+        'salida': ("🏠 Fin de Jornada", "ha terminado", 0xff6600,
+                   "¡Si no juega con vosotros es porque no os quiere!", "🏠 Terminan su jornada"),
+    }
+    MAX_CAMPOS = 25
+    MAX_CARACTERES = 6000
+    MAX_EMBEDS = 10
+
+    def _embed_aviso(self, tipo: str, horario: Dict, dia: str, timestamp: datetime) -> discord.Embed:
+        """Embed de un único aviso de entrada o salida."""
+        titulo, verbo, color, pie, _ = self.AVISOS[tipo]
+        embed = discord.Embed(
+            title=titulo,
+            description=f"robuso {verbo} su jornada laboral del **{dia}**",
+            color=color,
+            timestamp=timestamp
+        )
+        embed.add_field(name="Día", value=dia.capitalize(), inline=True)
+        embed.add_field(name="Hora de entrada", value=horario['entrada'], inline=True)
+        embed.add_field(name="Hora de salida", value=horario['salida'], inline=True)
+        embed.set_footer(text=pie)
+        return embed
+
+    def _embeds_agrupados(self, avisos: List[Tuple[str, str, Dict]], timestamp: datetime) -> List[discord.Embed]:
+        """Un embed por tipo de aviso con un campo por usuario, partido solo en los límites de Discord."""
+        embeds = []
+        for tipo in ('entrada', 'salida'):
+            _, _, color, pie, titulo = self.AVISOS[tipo]
+            embed = None
+            for tipo_aviso, dia, horario in avisos:
+                if tipo_aviso != tipo:
+                    continue
+                nombre = horario.get('nombre', 'Alguien')[:256]
+                valor = f"**{dia.capitalize()}:** {horario['entrada']} - {horario['salida']}"
+                if embed is None or len(embed.fields) >= self.MAX_CAMPOS or len(embed) + len(nombre) + len(valor) > self.MAX_CARACTERES:
+                    embed = discord.Embed(title=titulo, color=color, timestamp=timestamp)
+                    embed.set_footer(text=pie)
+                    embeds.append(embed)
+                embed.add_field(name=nombre, value=valor, inline=True)
+        return embeds
+
+    def enviar_avisos(self, vencidos: List[Tuple[str, str, str]]) -> None:
+        """Agrupa los avisos vencidos por canal y encola un solo mensaje por canal.
+
+        El planificador de salida los envía en paralelo entre canales.
+        """
+        timestamp = datetime.now()
+        por_canal: Dict[int, List[Tuple[str, str, Dict]]] = {}
+        for tipo, user_id_str, dia in vencidos:
+            horario = self.horarios.get(user_id_str, {}).get(dia)
+            if horario:
+                por_canal.setdefault(horario['canal'], []).append((tipo, dia, horario))
+
+        outbound = get_outbound(self.bot)
+        for canal_id, avisos in por_canal.items():
+            canal = self.bot.get_channel(canal_id)
+            if not canal:
+                continue
+            try:
+                if len(avisos) == 1:
+                    tipo, dia, horario = avisos[0]
+                    outbound.enqueue(canal, embed=self._embed_aviso(tipo, horario, dia, timestamp))
+                else:
+                    # Varios embeds por mensaje mientras quepan en los límites de Discord
+                    mensaje, total = [], 0
+                    for embed in self._embeds_agrupados(avisos, timestamp):
+                        if mensaje and (len(mensaje) >= self.MAX_EMBEDS or total + len(embed) > self.MAX_CARACTERES):
+                            outbound.enqueue(canal, embeds=mensaje)
+                            mensaje, total = [], 0
+                        mensaje.append(embed)
+                        total += len(embed)
+                    outbound.enqueue(canal, embeds=mensaje)
+            except Exception as e:
+                print(f"Error enviando avisos de horario al canal {canal_id}: {e}")
 
 # Función de setup para añadir el cog al bot
 async def setup(bot):
@@ -1,15 +1,14 @@
 import discord
 from discord.ext import commands
 import asyncio
-import json
-import os
 from functools import partial
 import concurrent.futures
-import yt_dlp
 import re
+from utils.json_store import get_store
+from utils.lazy import lazy_import
+
+yt_dlp = lazy_import("yt_dlp")  # Se importa en el hilo de extracción la primera vez
 
-QUEUE_DIR = 'u:/BOT_discord/json'
-QUEUE_FILE = os.path.join(QUEUE_DIR, 'queue_data.json')
 MAX_QUEUE_SIZE = 50
 
 def is_url(text):
@@ -49,6 +48,7 @@ class VoiceChat(commands.Cog):
         self.queue = []  # (url, ctx, title, duration)
         self.is_playing = False
         self._executor = None
+        self.queue_doc = get_store(bot).document('queue_data', lambda: {'queue': []}, snapshot=self._queue_snapshot)
         self._load_queue()
 
     @property
@@ -57,28 +57,21 @@ class VoiceChat(commands.Cog):
             self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='yt_dlp')
         return self._executor
 
-    def _save_queue(self):
-        os.makedirs(QUEUE_DIR, exist_ok=True)
-        data = {
+    def _queue_snapshot(self):
+        return {
             'queue': [(url, ctx.author.id if ctx else None, title, duration) 
                      for url, ctx, title, duration in self.queue],
         }
-        try:
-            with open(QUEUE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f)
-        except Exception:
-            pass
+
+    def _save_queue(self):
+        self.queue_doc.mark_dirty()
 
     def _load_queue(self):
-        if os.path.exists(QUEUE_FILE):
-            try:
-                with open(QUEUE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.queue = [(url, None, title, duration) 
-                            for url, _, title, duration in data.get('queue', [])]
-            except Exception:
-                self.queue = []
-        else:
+        try:
+            self.queue = [(url, None, title, duration) 
+                        for url, _, title, duration in self.queue_doc.data.get('queue', [])]
+        except Exception as e:
+            print(f"Error loading queue: {e}")
             self.queue = []
 
     def _update_queue_ctx(self, ctx):
@@ -106,10 +99,11 @@ class VoiceChat(commands.Cog):
                 raise Exception("❌ Este video tiene restricción de edad")
             raise Exception(f"Error al extraer información: {error_msg}")
 
-    def cog_unload(self):
+    async def cog_unload(self):
         """Cleanup cuando el cog es descargado"""
         if self._executor:
             self._executor.shutdown(wait=False)
+        await self.queue_doc.flush()
         
     @commands.command(name='join', help='El bot se une a tu canal de voz actual.')
     async def join(self, ctx):
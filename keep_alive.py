@@ -1,15 +1,110 @@
-from flask import Flask
-from threading import Thread
+"""Servidor HTTP de salud y métricas en el propio event loop del bot.
 
-app = Flask('')
+Sustituye al Flask que corría en un hilo aparte solo para devolver un texto:
 
-@app.route('/')
-def home():
-    return "El bot se esta corriendo correctamente."
+    /         el texto de siempre, para el ping que mantiene vivo el Repl
+    /health   JSON con el estado del gateway, la latencia y el lag del loop
+              (503 si el bot no está conectado o el loop va muy retrasado)
+    /metrics  el registro de métricas (utils.metrics) en formato de texto
+              de Prometheus
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+El servidor se cierra con el bot: su task se cancela al terminar el loop y
+libera el puerto en el ``finally``.
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Optional
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
\ No newline at end of file
+from aiohttp import web
+
+from utils.loop_monitor import get_loop_monitor
+from utils.metrics import get_metrics
+
+LAG_MAXIMO = 1.0  # Segundos de lag a partir de los que /health deja de dar 200
+
+class ServidorSalud:
+    """Servidor ``aiohttp.web`` con /health y /metrics"""
+
+    def __init__(self, bot, host: str = '0.0.0.0', port: int = 8080):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.inicio = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._listo = asyncio.Event()
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health)
+        self.app.router.add_get('/metrics', self.metrics)
+
+    async def home(self, request):
+        return web.Response(text="El bot se esta corriendo correctamente.")
+
+    async def health(self, request):
+        bot = self.bot
+        lag = get_loop_monitor(bot).stats()
+        latencia = bot.latency
+        conectado = bot.is_ready() and not bot.is_closed()
+        sano = conectado and lag['last_ms'] / 1000 < LAG_MAXIMO
+        datos = {
+            'status': 'ok' if sano else 'degraded',
+            'gateway': {
+                'ready': bot.is_ready(),
+                'closed': bot.is_closed(),
+                'latency_ms': round(latencia * 1000, 1) if math.isfinite(latencia) else None,
+                'guilds': len(bot.guilds),
+            },
+            'event_loop_lag_ms': {clave: round(valor, 1) for clave, valor in lag.items() if clave.endswith('_ms')},
+            'event_loop_blocks': lag['blocks'],
+            'uptime_s': round(time.monotonic() - self.inicio),
+        }
+        return web.json_response(datos, status=200 if sano else 503)
+
+    async def metrics(self, request):
+        return web.Response(text=get_metrics(self.bot).prometheus(),
+                            content_type='text/plain', charset='utf-8',
+                            headers={'X-Prometheus-Format': '0.0.4'})
+
+    async def start(self):
+        """Arranca el servidor en el loop actual y espera a que escuche"""
+        get_loop_monitor(self.bot)
+        if self._task is None or self._task.done():
+            self._listo.clear()
+            self._task = asyncio.create_task(self._servir())
+        await self._listo.wait()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _servir(self):
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        try:
+            try:
+                await web.TCPSite(runner, self.host, self.port).start()
+                print(f"Servidor de salud escuchando en {self.host}:{self.port}")
+            except OSError as e:
+                print(f"No se pudo iniciar el servidor de salud en el puerto {self.port}: {e}")
+                return
+            finally:
+                self._listo.set()
+            # asyncio.run cancela este task al cerrar el bot; el finally libera el puerto
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+async def keep_alive(bot) -> ServidorSalud:
+    """Inicia el servidor de salud y métricas en el loop del bot"""
+    servidor = ServidorSalud(bot, port=int(os.environ.get("PORT", 8080)))
+    await servidor.start()
+    bot.servidor_salud = servidor
+    return servidor
\ No newline at end of file
@@ -1,12 +1,17 @@
 import sys
+import time
+ARRANQUE = time.perf_counter()
+
+import asyncio
+import importlib
 import discord
 from discord.ext import commands
 import os
 import traceback
 import nacl as PyNacl
 from keep_alive import keep_alive
-
-keep_alive()  # Inicia el servidor web para mantener el bot activo
+from utils.lazy import register_on_demand
+from utils.metrics import instrument_bot
 
 # Define los intents necesarios para tu bot
 intents = discord.Intents.default()
@@ -14,24 +19,88 @@ intents.message_content = True
 intents.members = True
 intents.presences = True  # Añade esta línea
 
+class Bot(commands.Bot):
+    async def close(self):
+        """Vacía la cola de envíos y guarda el estado de los servicios compartidos antes de salir"""
+        # La cola se vacía antes de cerrar la conexión HTTP, que la necesita
+        outbound = getattr(self, 'outbound', None)
+        if outbound is not None:
+            await outbound.close()
+        scheduler = getattr(self, 'job_scheduler', None)
+        if scheduler is not None:
+            await scheduler.close()
+        servidor = getattr(self, 'servidor_salud', None)
+        if servidor is not None:
+            await servidor.close()
+        monitor = getattr(self, 'loop_monitor', None)
+        if monitor is not None:
+            monitor.stop()
+        await super().close()  # Descarga los cogs, que guardan sus documentos
+        store = getattr(self, 'json_store', None)
+        if store is not None:
+            await store.close()
+
 # Crea una instancia del bot con un prefijo para los comandos
-bot = commands.Bot(command_prefix='º', intents=intents)
+bot = Bot(command_prefix='º', intents=intents)
+
+# Lista de cogs que intentaremos cargar al inicio
+cogs_to_load = ['cogs.basico', 'cogs.cumpleanos', 'cogs.flexionesdelguille', 'cogs.eventosjuegos', 'cogs.BeerNight', 'cogs.robusotrabaja','cogs.grabadora']
+
+# Cogs pesados que se cargan la primera vez que se usa uno de sus comandos
+cogs_bajo_demanda = {
+    'cogs.magik': {'magik': 'Aplica un efecto mágico a la imagen adjunta.'},
+    'cogs.voicechat': {
+        'join': 'El bot se une a tu canal de voz actual.',
+        'kys': 'El bot sale del canal de voz.',
+        'musica': 'Reproduce música. Puedes usar un enlace de YouTube o escribir el nombre de la canción.',
+        'skip': 'Salta la canción actual y reproduce la siguiente de la cola.',
+        'resume': 'Reanuda la reproducción si está pausada.',
+        'cola': 'Muestra la cola de reproducción actual.',
+    },
+}
+
+# Tiempos de arranque, consultables con ºarranque
+bot.startup_report = {'cogs': {}, 'setup_ms': 0.0, 'ready_ms': None}
+
+async def cargar_cog(cog):
+    """Importa el cog (y sus dependencias pesadas) en un hilo y luego ejecuta su setup"""
+    informe = bot.startup_report['cogs'][cog] = {'import_ms': 0.0, 'setup_ms': 0.0, 'error': None}
+    try:
+        inicio = time.perf_counter()
+        # La importación en un hilo deja las dependencias en caché sin bloquear el loop,
+        # así un cog lento de importar no retrasa a los demás
+        await asyncio.to_thread(importlib.import_module, cog)
+        informe['import_ms'] = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        await bot.load_extension(cog)
+        informe['setup_ms'] = (time.perf_counter() - inicio) * 1000
+        print(f'Cog "{cog}" cargado correctamente ({informe["import_ms"]:.0f} ms + {informe["setup_ms"]:.0f} ms).✅')
+    except Exception as e:
+        informe['error'] = str(e)
+        print(f'Error al cargar el cog "{cog}": {e} ❌')
+
+# setup_hook se ejecuta una sola vez antes de conectar; on_ready se repite en cada reconexión
+@bot.event
+async def setup_hook():
+    instrument_bot(bot)  # Métricas de comandos y peticiones REST, antes de cargar los cogs
+    await keep_alive(bot)  # Servidor web de salud y métricas, en el mismo loop que el bot
+    print('Cargando extensiones...')
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cargar_cog(cog) for cog in cogs_to_load))
+    for cog, comandos in cogs_bajo_demanda.items():
+        register_on_demand(bot, cog, comandos)
+    bot.startup_report['setup_ms'] = (time.perf_counter() - inicio) * 1000
+    cargados = sum(1 for informe in bot.startup_report['cogs'].values() if not informe['error'])
+    print(f'{cargados}/{len(cogs_to_load)} cogs cargados en {bot.startup_report["setup_ms"]:.0f} ms')
 
 # Evento que se dispara cuando el bot está listo y conectado
 @bot.event
 async def on_ready():
     print(f'¡Bot conectado como {bot.user}!')
-    print('Cargando extensiones...')
-    
-    # Lista de cogs que intentaremos cargar al inicio
-    cogs_to_load = ['cogs.basico', 'cogs.cumpleanos', 'cogs.flexionesdelguille', 'cogs.eventosjuegos', 'cogs.BeerNight', 'cogs.robusotrabaja','cogs.voicechat','cogs.magik']
-
-    for cog in cogs_to_load:
-        try:
-            await bot.load_extension(cog)
-            print(f'Cog "{cog}" cargado correctamente.✅')
-        except Exception as e:
-            print(f'Error al cargar el cog "{cog}": {e} ❌')
+    if bot.startup_report['ready_ms'] is None:
+        bot.startup_report['ready_ms'] = (time.perf_counter() - ARRANQUE) * 1000
+        print(f'Listo {bot.startup_report["ready_ms"]:.0f} ms después de arrancar el proceso')
 
 @bot.command(name="reload")
 @commands.is_owner()
@@ -47,16 +116,7 @@ async def reload_cog(ctx, extension: str):
         await ctx.send(f'❌ Error al recargar `{extension}`: {e}')
         print(f'Error al recargar el cog "{extension}": {e}')
 
-
-token = os.environ.get("DISCORD_TOKEN") # Así se lee desde los Secrets de Replit
-
-if token:
-    bot.run(token)
-else:
-    print("Error: No se proporcionó un token de Discord.")
-    print("Por favor, asegúrate de que la variable 'token' contenga tu token de bot.")
-
-    # --- Manejador de errores para los comandos ---
+# --- Manejador de errores para los comandos ---
 @bot.event
 async def on_command_error(ctx, error):
     if isinstance(error, commands.NotOwner):
@@ -71,6 +131,10 @@ async def on_command_error(ctx, error):
 
 # --- Fin de comandos para gestionar cogs ---
 
+token = os.environ.get("DISCORD_TOKEN") # Así se lee desde los Secrets de Replit
 
-
-
+if token:
+    bot.run(token)
+else:
+    print("Error: No se proporcionó un token de Discord.")
+    print("Por favor, asegúrate de que la variable 'token' contenga tu token de bot.")
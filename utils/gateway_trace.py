@@ -0,0 +1,123 @@
+"""Formato compacto de trazas de eventos del gateway.
+
+Un fichero ``.jsonl.gz``: la primera línea es la cabecera con la foto
+inicial de cada guild y el resto son eventos ``[dt_ms, tipo, guild_id, ...]``
+con el tiempo relativo al inicio de la grabación.
+
+Tipos de evento:
+    p   presencia:       [dt, "p", guild, user, [juegos]]
+    mj  alta de miembro: [dt, "mj", guild, user, nombre, [roles], [juegos]]
+    mu  cambio miembro:  [dt, "mu", guild, user, nombre, [roles]]
+    mr  baja de miembro: [dt, "mr", guild, user]
+    v   estado de voz:   [dt, "v", guild, user, canal | null]
+    se  evento prog.:    [dt, "se", guild, evento, estado]
+    sd  evento borrado:  [dt, "sd", guild, evento]
+"""
+import asyncio
+import concurrent.futures
+import gzip
+import json
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import discord
+
+TRACE_VERSION = 1
+
+def playing_names(activities) -> List[str]:
+    """Nombres de las actividades de tipo 'jugando' (lo único que usan los cogs)"""
+    return [a.name for a in activities
+            if isinstance(a, (discord.Game, discord.Activity)) and a.type == discord.ActivityType.playing]
+
+def member_snapshot(member) -> list:
+    voice = member.voice.channel.id if member.voice and member.voice.channel else None
+    return [member.id, member.display_name, [r.id for r in member.roles], playing_names(member.activities), voice]
+
+def guild_snapshot(guild) -> dict:
+    return {
+        'id': guild.id,
+        'name': guild.name,
+        'roles': [r.id for r in guild.roles],
+        'members': [member_snapshot(m) for m in guild.members],
+    }
+
+def write_trace(path: str, header: dict, events: List[list]) -> None:
+    """Escribe una traza completa de una vez (para trazas generadas offline)"""
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(header, separators=(',', ':')) + '\n')
+        for event in events:
+            f.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+def read_trace(path: str) -> Tuple[dict, Iterator[list]]:
+    """Devuelve la cabecera y un iterador perezoso de eventos"""
+    f = gzip.open(path, 'rt', encoding='utf-8')
+    header = json.loads(f.readline())
+    if header.get('version') != TRACE_VERSION:
+        f.close()
+        raise ValueError(f"Versión de traza no soportada: {header.get('version')}")
+
+    def events():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, events()
+
+class TraceWriter:
+    """Escritor de trazas con buffer; el disco solo se toca desde un hilo propio"""
+
+    def __init__(self, path: str, guilds, flush_every: int = 500, flush_interval: float = 5):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.count = 0
+        self._buffer: List[str] = []
+        self._file: Optional[gzip.GzipFile] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='gateway_trace')
+        header = {
+            'version': TRACE_VERSION,
+            'started_at': discord.utils.utcnow().isoformat(),
+            'guilds': [guild_snapshot(g) for g in guilds],
+        }
+        self._buffer.append(json.dumps(header, separators=(',', ':')))
+
+    def record(self, kind: str, guild_id: int, *fields):
+        dt = int((time.monotonic() - self.started) * 1000)
+        self._buffer.append(json.dumps([dt, kind, guild_id, *fields], separators=(',', ':')))
+        self.count += 1
+        if len(self._buffer) >= self.flush_every:
+            asyncio.create_task(self.flush())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _write_lines(self, lines: List[str]):
+        if self._file is None:
+            self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._file.write('\n'.join(lines) + '\n')
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write_lines, lines)
+
+    async def close(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_file)
+        self._executor.shutdown(wait=False)
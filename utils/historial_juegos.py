@@ -0,0 +1,150 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    participants TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    peak_players INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_guild_time ON sessions (guild_id, end_ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_guild_game_time ON sessions (guild_id, game, end_ts);
+"""
+
+@dataclass
+class GameSession:
+    """Sesión de juego finalizada"""
+    guild_id: int
+    game: str
+    start_ts: int
+    end_ts: int
+    peak_players: int
+    participants: List[str] = field(default_factory=list)
+
+    @property
+    def duration(self) -> int:
+        return max(0, self.end_ts - self.start_ts)
+
+class GameHistoryStore:
+    """Historial de sesiones en SQLite (WAL) con inserciones por lotes.
+
+    Toda la E/S se hace en un único hilo dedicado, así que ``record`` nunca
+    toca el disco desde el event loop.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 10, batch_size: int = 50):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: List[GameSession] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='historial_juegos')
+
+    # --- Hilo de base de datos ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _insert_many(self, sessions: List[GameSession]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO sessions (guild_id, game, participants, start_ts, end_ts, peak_players) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(s.guild_id, s.game, json.dumps(s.participants, ensure_ascii=False),
+                  s.start_ts, s.end_ts, s.peak_players) for s in sessions]
+            )
+
+    def _query_recent(self, guild_id: int, game: Optional[str], limit: int) -> List[GameSession]:
+        conn = self._connect()
+        if game:
+            rows = conn.execute(
+                "SELECT guild_id, game, start_ts, end_ts, peak_players, participants FROM sessions "
+                "WHERE guild_id = ? AND game = ? ORDER BY end_ts DESC LIMIT ?",
+                (guild_id, game, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT guild_id, game, start_ts, end_ts, peak_players, participants FROM sessions "
+                "WHERE guild_id = ? ORDER BY end_ts DESC LIMIT ?",
+                (guild_id, limit)
+            ).fetchall()
+        return [GameSession(g, name, start, end, peak, json.loads(participants))
+                for g, name, start, end, peak, participants in rows]
+
+    def _query_top(self, guild_id: int, since_ts: int, limit: int) -> List[Tuple[str, int, int, int]]:
+        conn = self._connect()
+        return conn.execute(
+            "SELECT game, COUNT(*), SUM(end_ts - start_ts), MAX(peak_players) FROM sessions "
+            "WHERE guild_id = ? AND end_ts >= ? GROUP BY game "
+            "ORDER BY SUM(end_ts - start_ts) DESC LIMIT ?",
+            (guild_id, since_ts, limit)
+        ).fetchall()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # --- API del event loop ---
+
+    def record(self, session: GameSession) -> None:
+        """Encola una sesión; se escribe en el siguiente lote"""
+        self._pending.append(session)
+        if len(self._pending) >= self.batch_size:
+            asyncio.create_task(self.flush())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Escribe todas las sesiones pendientes en una sola transacción"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await self._run(self._insert_many, batch)
+        except Exception as e:
+            self._pending[:0] = batch
+            print(f"Error saving game history: {e}")
+
+    async def recent_sessions(self, guild_id: int, game: Optional[str] = None, limit: int = 10) -> List[GameSession]:
+        await self.flush()
+        return await self._run(self._query_recent, guild_id, game, limit)
+
+    async def top_games(self, guild_id: int, days: int = 30, limit: int = 10) -> List[Tuple[str, int, int, int]]:
+        """Devuelve (juego, sesiones, segundos totales, pico de jugadores)"""
+        await self.flush()
+        since_ts = int(time.time()) - days * 86400
+        return await self._run(self._query_top, guild_id, since_ts, limit)
+
+    async def close(self) -> None:
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
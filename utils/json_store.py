@@ -0,0 +1,178 @@
+"""Persistencia JSON compartida por los cogs.
+
+Cada cog registra un documento con nombre (``namespace``) y, en vez de
+escribir el fichero en cada cambio, lo marca como sucio. Los documentos
+sucios se escriben juntos tras ``flush_interval`` segundos (o al descargar
+el cog), de forma atómica (fichero temporal + ``os.replace``) y en un hilo
+dedicado, así que un disco lento nunca bloquea el gateway.
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+def _atomic_write(path: str, text: str) -> float:
+    """Escribe ``text`` en ``path`` de forma atómica; devuelve los segundos empleados"""
+    start = time.perf_counter()
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return time.perf_counter() - start
+
+class JsonDocument:
+    """Documento JSON con nombre dentro de un ``JsonStore``"""
+    __slots__ = ('store', 'namespace', 'path', 'data', 'snapshot', 'indent',
+                 'writes', 'failures', 'bytes_written', 'last_latency', 'max_latency')
+
+    def __init__(self, store: 'JsonStore', namespace: str, path: str, data: Any,
+                 snapshot: Optional[Callable[[], Any]], indent: Optional[int]):
+        self.store = store
+        self.namespace = namespace
+        self.path = path
+        self.data = data
+        self.snapshot = snapshot
+        self.indent = indent
+        self.writes = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def mark_dirty(self):
+        self.store.mark_dirty(self.namespace)
+
+    async def flush(self):
+        await self.store.flush(self.namespace)
+
+    def serialize(self) -> str:
+        if self.snapshot:
+            # ``data`` sigue la última instantánea: si el cog se recarga y vuelve a
+            # registrar el documento, recupera lo último escrito y no lo del arranque
+            self.data = self.snapshot()
+        return json.dumps(self.data, ensure_ascii=False, indent=self.indent)
+
+class JsonStore:
+    """Almacén de documentos JSON con escrituras diferidas y atómicas"""
+
+    def __init__(self, base_dir: str = "json", flush_interval: float = 2.0):
+        self.base_dir = base_dir
+        self.flush_interval = flush_interval
+        self._documents: Dict[str, JsonDocument] = {}
+        self._dirty: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='json_store')
+        self.latencies = deque(maxlen=512)  # últimas latencias de escritura (s)
+
+    def document(self, namespace: str, default: Callable[[], Any] = dict, *, path: Optional[str] = None,
+                 snapshot: Optional[Callable[[], Any]] = None, indent: Optional[int] = None) -> JsonDocument:
+        """Registra (o recupera, p. ej. al recargar un cog) un documento.
+
+        ``data`` contiene lo cargado del disco (o ``default()``). Si se pasa
+        ``snapshot``, se llama en cada escritura para obtener lo que se guarda.
+        """
+        doc = self._documents.get(namespace)
+        if doc is not None:
+            doc.snapshot = snapshot
+            doc.indent = indent
+            return doc
+
+        path = path or os.path.join(self.base_dir, f"{namespace}.json")
+        doc = JsonDocument(self, namespace, path, self._load(path, default), snapshot, indent)
+        self._documents[namespace] = doc
+        return doc
+
+    @staticmethod
+    def _load(path: str, default: Callable[[], Any]) -> Any:
+        if not os.path.exists(path):
+            return default()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            return default()
+
+    def mark_dirty(self, namespace: str):
+        self._dirty.add(namespace)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self, namespace: Optional[str] = None):
+        """Escribe los documentos sucios (o solo ``namespace``)"""
+        names = [namespace] if namespace else list(self._dirty)
+        loop = asyncio.get_running_loop()
+
+        for name in names:
+            if name not in self._dirty:
+                continue
+            self._dirty.discard(name)
+            doc = self._documents[name]
+            try:
+                text = doc.serialize()
+                latency = await loop.run_in_executor(self._executor, _atomic_write, doc.path, text)
+            except Exception as e:
+                self._dirty.add(name)
+                doc.failures += 1
+                print(f"Error saving {doc.path}: {e}")
+                continue
+
+            doc.writes += 1
+            doc.bytes_written += len(text)
+            doc.last_latency = latency
+            doc.max_latency = max(doc.max_latency, latency)
+            self.latencies.append(latency)
+
+    async def close(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+        return {
+            'dirty': sorted(self._dirty),
+            'write_ms_p50': pct(0.50),
+            'write_ms_p99': pct(0.99),
+            'documents': {
+                name: {
+                    'writes': doc.writes,
+                    'failures': doc.failures,
+                    'bytes_written': doc.bytes_written,
+                    'last_ms': doc.last_latency * 1000,
+                    'max_ms': doc.max_latency * 1000,
+                }
+                for name, doc in self._documents.items()
+            },
+        }
+
+def get_store(bot) -> JsonStore:
+    """Devuelve el almacén JSON compartido del bot (lo crea al primer uso)"""
+    store = getattr(bot, 'json_store', None)
+    if store is None:
+        store = JsonStore()
+        bot.json_store = store
+    return store
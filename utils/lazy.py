@@ -0,0 +1,134 @@
+"""Importación diferida de dependencias pesadas y cogs bajo demanda.
+
+``lazy_import("numpy")`` devuelve un módulo vacío que solo se importa de
+verdad al acceder al primero de sus atributos, así que cv2, numpy, PIL,
+yt_dlp, aiohttp o psutil no cuestan nada al arrancar si nadie los usa.
+Para no bloquear el event loop con la primera importación, los comandos
+pueden hacer ``await modulo.load_async()`` antes de usarlo.
+
+``register_on_demand`` registra comandos provisionales con los nombres de
+los de una extensión; la primera vez que se invoca uno, carga la extensión
+real y vuelve a procesar el mensaje.
+"""
+import asyncio
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Optional
+
+from discord.ext import commands
+
+class LazyModule(ModuleType):
+    """Módulo que se importa al usarse por primera vez"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__dict__['_lazy_name'])
+                    import_times[self.__dict__['_lazy_name']] = (time.perf_counter() - start) * 1000
+                    # Copiar los atributos: los siguientes accesos ya no pasan por __getattr__
+                    for attr, value in module.__dict__.items():
+                        self.__dict__.setdefault(attr, value)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    async def load_async(self) -> ModuleType:
+        """Importa el módulo en un hilo (si no lo estaba ya) para no bloquear el loop"""
+        if self.__dict__['_lazy_module'] is not None:
+            return self.__dict__['_lazy_module']
+        if self.__dict__['_lazy_name'] in sys.modules:
+            return self._load()  # Ya lo importó otro módulo: no hace falta el hilo
+        return await asyncio.to_thread(self._load)
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__['_lazy_module'] is not None
+
+    def available(self) -> bool:
+        """Si el módulo está instalado (sin importarlo)"""
+        if self.loaded:
+            return True
+        try:
+            return importlib.util.find_spec(self.__dict__['_lazy_name']) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        estado = "cargado" if self.loaded else "sin cargar"
+        return f"<módulo diferido {self.__dict__['_lazy_name']!r} ({estado})>"
+
+# Milisegundos que costó importar cada módulo diferido, para ºarranque
+import_times: Dict[str, float] = {}
+
+def lazy_import(name: str) -> LazyModule:
+    """Devuelve un ``LazyModule``, aunque el módulo ya esté importado, para que
+    ``available()`` y ``load_async()`` funcionen siempre"""
+    return LazyModule(name)
+
+class OnDemandExtension:
+    """Comandos provisionales de una extensión que aún no se ha cargado"""
+
+    def __init__(self, bot, extension: str, command_help: Dict[str, Optional[str]]):
+        self.bot = bot
+        self.extension = extension
+        self.command_help = command_help
+        self.lock = asyncio.Lock()
+
+    def _add_commands(self):
+        for name, help_text in self.command_help.items():
+            async def callback(ctx):
+                await self.load(ctx)
+            self.bot.add_command(commands.Command(callback, name=name, help=help_text, ignore_extra=True))
+
+    def _remove_commands(self):
+        for name in self.command_help:
+            self.bot.remove_command(name)
+
+    async def load(self, ctx: commands.Context):
+        """Carga la extensión real y vuelve a procesar el mensaje con ella"""
+        async with self.lock:
+            if self.extension not in self.bot.extensions:
+                start = time.perf_counter()
+                self._remove_commands()
+                try:
+                    await asyncio.to_thread(importlib.import_module, self.extension)
+                    await self.bot.load_extension(self.extension)
+                except Exception as e:
+                    self._add_commands()  # Se reintentará en la siguiente invocación
+                    await ctx.send(f"❌ No se pudo cargar `{self.extension}`: {e}")
+                    return
+                report = getattr(self.bot, 'startup_report', None)
+                if report is not None:
+                    report['cogs'][self.extension] = {
+                        'import_ms': 0.0, 'setup_ms': (time.perf_counter() - start) * 1000, 'error': None,
+                    }
+                print(f'Cog "{self.extension}" cargado bajo demanda ✅')
+
+        new_ctx = await self.bot.get_context(ctx.message)
+        if new_ctx.command is not None:
+            await self.bot.invoke(new_ctx)
+
+def register_on_demand(bot, extension: str, command_help: Dict[str, Optional[str]]) -> OnDemandExtension:
+    """Registra los comandos de ``extension`` para que la carguen al usarse por primera vez"""
+    stub = OnDemandExtension(bot, extension, command_help)
+    stub._add_commands()
+    return stub
@@ -0,0 +1,158 @@
+"""Medida del retraso (lag) del event loop y detector de bloqueos.
+
+Un task duerme ``interval`` segundos una y otra vez; lo que tarda de más en
+despertar es el tiempo que el loop estuvo ocupado con otra cosa. Si un cog
+bloquea el loop (E/S síncrona, CPU), el lag sube para todos los comandos.
+
+Además, un hilo vigilante comprueba que el task despierta a tiempo. Si el
+loop lleva más de ``threshold`` segundos sin atenderlo, copia la pila del
+hilo del loop (``sys._current_frames``) mientras sigue bloqueado y avisa de
+qué cog y qué función lo están bloqueando.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Deque, List, Optional
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Block:
+    """Un bloqueo del loop detectado por el vigilante"""
+    __slots__ = ('location', 'cog', 'function', 'started', 'duration', 'stack')
+
+    def __init__(self, location: str, cog: Optional[str], function: str, started: float, stack: List[str]):
+        self.location = location
+        self.cog = cog
+        self.function = function
+        self.started = started
+        self.duration: Optional[float] = None  # Se rellena cuando el loop vuelve a despertar
+        self.stack = stack
+
+def _culprit(frames: traceback.StackSummary):
+    """El cog y la función del repo más internos de la pila bloqueada, y la línea exacta"""
+    cog = None
+    own = None
+    for frame in reversed(frames):
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(_RAIZ + os.sep) or filename == os.path.abspath(__file__):
+            continue
+        relative = os.path.relpath(filename, _RAIZ)
+        if own is None:
+            own = frame, relative
+        if relative.startswith('cogs' + os.sep):
+            cog = os.path.splitext(os.path.basename(relative))[0]
+            break
+    if own is None:
+        frame = frames[-1]
+        return None, f"{os.path.basename(frame.filename)}:{frame.name}", f"{frame.filename}:{frame.lineno}"
+    frame, relative = own
+    return cog, f"{relative}:{frame.name}", f"{relative}:{frame.lineno}"
+
+class LoopMonitor:
+    """Muestrea el lag del event loop con un task propio y vigila bloqueos desde un hilo"""
+
+    def __init__(self, interval: float = 0.5, window: int = 600, threshold: float = 0.5,
+                 check_interval: float = 0.05):
+        self.interval = interval
+        self.threshold = threshold
+        self.check_interval = check_interval
+        self.samples: Deque[float] = deque(maxlen=window)  # Segundos de lag de cada muestra
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocks: Deque[Block] = deque(maxlen=50)
+        self.block_counts: Counter = Counter()  # Bloqueos por cog/función
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._deadline = 0.0  # Cuándo debería despertar el task
+        self._pending: Optional[Block] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop_thread = threading.get_ident()
+            self._deadline = time.monotonic() + self.interval
+            self._task = asyncio.create_task(self._run())
+        if self.threshold and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            self._deadline = start + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.samples.append(lag)
+
+            block = self._pending
+            if block is not None:
+                self._pending = None
+                block.duration = lag
+                print(f"Event loop desbloqueado tras {lag:.2f} s ({block.location})")
+
+    # --- Hilo vigilante ---
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            stalled = time.monotonic() - self._deadline
+            if stalled < self.threshold or self._pending is not None:
+                continue
+            if self._task is None or self._task.done():
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            frames = traceback.extract_stack(frame)
+            del frame
+            # Si el loop despertó mientras copiábamos la pila, no era un bloqueo
+            if time.monotonic() - self._deadline < self.threshold:
+                continue
+            self._report(frames, stalled)
+
+    def _report(self, frames: traceback.StackSummary, stalled: float):
+        cog, function, line = _culprit(frames)
+        # Sin número de línea: la etiqueta de la métrica no debe crecer con cada línea del bucle
+        location = f"{cog} · {function}" if cog else function
+        block = Block(location, cog, function, time.time() - stalled, traceback.format_list(frames[-8:]))
+        self._pending = block
+        self.blocks.append(block)
+        self.block_counts[location] += 1
+        print(f"⚠️ Event loop bloqueado más de {stalled:.2f} s en {location} ({line})\n{''.join(block.stack).rstrip()}")
+
+    def stats(self) -> dict:
+        samples = sorted(self.samples)
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 if samples else 0.0
+
+        return {
+            'last_ms': self.last_lag * 1000,
+            'max_ms': self.max_lag * 1000,
+            'p50_ms': pct(0.50),
+            'p90_ms': pct(0.90),
+            'p99_ms': pct(0.99),
+            'blocks': sum(self.block_counts.values()),
+        }
+
+def get_loop_monitor(bot) -> LoopMonitor:
+    """Devuelve el monitor del loop compartido del bot (lo crea y arranca al primer uso)"""
+    monitor = getattr(bot, 'loop_monitor', None)
+    if monitor is None:
+        monitor = LoopMonitor()
+        bot.loop_monitor = monitor
+    monitor.start()
+    return monitor
@@ -0,0 +1,401 @@
+"""Registro de métricas del bot: contadores, gauges e histogramas.
+
+Pensado para dejarlo siempre activo: cada métrica guarda sus series en un
+dict por tupla de etiquetas y los histogramas tienen buckets fijos, así que
+observar un valor es un ``bisect`` y dos sumas. Los servicios que ya llevan
+sus propios contadores (cola de envíos, almacén JSON, planificador) no se
+duplican: un *collector* los copia al registro justo antes de leerlo.
+
+``instrument_bot`` engancha:
+
+    comandos    invocaciones, errores por tipo y latencia de cada comando
+    REST        peticiones a la API de Discord por cog, ruta y resultado
+    bucles      duración de cada ejecución de las tareas programadas y de
+                los ``tasks.loop`` decorados con ``timed_loop``
+
+Las peticiones REST se atribuyen al cog que las origina mediante la
+variable de contexto ``origin``, que fijan el check global de comandos, el
+planificador, ``timed_loop`` y la cola de envíos.
+"""
+import bisect
+import contextvars
+import functools
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import discord
+from discord.ext import commands
+
+# Cog (o tarea) en cuyo nombre se ejecuta el código actual
+origin: contextvars.ContextVar[str] = contextvars.ContextVar('origin', default='otro')
+
+_START = time.monotonic()
+
+# Segundos: de 5 ms a 1 min, suficiente para comandos, REST y bucles
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        """Para reflejar un total que ya cuenta otro servicio"""
+        self.value = value
+
+class GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+class HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # El último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimación por interpolación lineal dentro del bucket (como ``histogram_quantile``)"""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]  # Cae en +Inf: el mayor límite conocido
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+class Metric:
+    """Métrica con nombre y etiquetas; ``labels(...)`` devuelve la serie"""
+    kind = ''
+    child = None
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.series: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        return self.child()
+
+    def labels(self, *values):
+        child = self.series.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            child = self.series[values] = self._new_child()
+        return child
+
+class Counter(Metric):
+    kind = 'counter'
+    child = CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+class Gauge(Metric):
+    kind = 'gauge'
+    child = GaugeChild
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def grouped(self, label: str) -> Dict[str, HistogramChild]:
+        """Suma las series que comparten el valor de la etiqueta ``label``"""
+        index = self.labelnames.index(label)
+        groups: Dict[str, HistogramChild] = {}
+        for values, child in self.series.items():
+            group = groups.get(values[index])
+            if group is None:
+                group = groups[values[index]] = HistogramChild(self.buckets)
+            group.counts = [a + b for a, b in zip(group.counts, child.counts)]
+            group.sum += child.sum
+            group.count += child.count
+        return groups
+
+def _format_value(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+class MetricsRegistry:
+    """Conjunto de métricas del proceso"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[['MetricsRegistry'], None]] = []
+
+    def _get(self, cls, name: str, help: str, labels: Sequence[str], **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"La métrica {name} ya existe como {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        """Devuelve el contador ``name`` (lo crea la primera vez)"""
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[['MetricsRegistry'], None]) -> None:
+        """``collector(registry)`` se llama antes de cada lectura para actualizar valores externos"""
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                print(f"Error recogiendo métricas: {e}")
+        return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def prometheus(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, child in sorted(metric.series.items()):
+                if metric.kind != 'histogram':
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, values)} {_format_value(child.value)}")
+                    continue
+                cumulative = 0
+                names = metric.labelnames + ('le',)
+                for bound, n in zip(metric.buckets + (math.inf,), child.counts):
+                    cumulative += n
+                    labels = _format_labels(names, values + (_format_value(float(bound)),))
+                    lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(metric.labelnames, values)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{metric.name}_count{labels} {child.count}")
+        return "\n".join(lines) + "\n"
+
+# --- Métricas del bot ---
+
+def record_loop(registry: MetricsRegistry, name: str, seconds: float, failed: bool = False) -> None:
+    """Registra una ejecución de un bucle o tarea programada"""
+    registry.histogram('bot_loop_duration_seconds', "Duración de cada ejecución de tareas y bucles",
+                       ('loop',)).labels(name).observe(seconds)
+    if failed:
+        registry.counter('bot_loop_failures_total', "Ejecuciones de tareas y bucles que lanzaron una excepción",
+                         ('loop',)).labels(name).inc()
+
+def timed_loop(name: str):
+    """Decorador para el cuerpo de un ``tasks.loop`` de un cog: mide cada iteración"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            origin.set(getattr(self, 'qualified_name', name))
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(self, *args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                record_loop(get_metrics(self.bot), name, time.perf_counter() - start, failed)
+        return wrapper
+    return decorator
+
+def _collect_services(bot, registry: MetricsRegistry) -> None:
+    """Copia al registro el estado del gateway y los contadores de los servicios que ya existan"""
+    registry.gauge('bot_uptime_seconds', "Segundos desde que arrancó el proceso").set(time.monotonic() - _START)
+    registry.gauge('bot_up', "1 si el bot está conectado al gateway").set(int(bot.is_ready() and not bot.is_closed()))
+    registry.gauge('bot_gateway_latency_seconds', "Latencia del websocket del gateway").set(bot.latency)
+    registry.gauge('bot_guilds', "Servidores en los que está el bot").set(len(bot.guilds))
+    registry.gauge('bot_extensions_loaded', "Extensiones cargadas").set(len(bot.extensions))
+
+    monitor = getattr(bot, 'loop_monitor', None)
+    if monitor is not None:
+        lag = monitor.stats()
+        gauge = registry.gauge('bot_event_loop_lag_seconds', "Lag del event loop por cuantil (ventana reciente)",
+                               ('quantile',))
+        gauge.labels('0.5').set(lag['p50_ms'] / 1000)
+        gauge.labels('0.9').set(lag['p90_ms'] / 1000)
+        gauge.labels('0.99').set(lag['p99_ms'] / 1000)
+        registry.gauge('bot_event_loop_lag_max_seconds', "Mayor lag del event loop observado").set(lag['max_ms'] / 1000)
+        blocks = registry.counter('bot_event_loop_blocks_total', "Bloqueos del event loop detectados por el vigilante",
+                                  ('location',))
+        for location, n in list(monitor.block_counts.items()):
+            blocks.labels(location).set(n)
+
+    sampler = getattr(bot, 'resource_sampler', None)
+    latest = sampler.latest() if sampler is not None else None
+    if latest is not None:
+        registry.gauge('bot_process_cpu_percent', "CPU del proceso en la última muestra").set(latest['cpu'])
+        registry.gauge('bot_process_resident_memory_bytes', "Memoria residente del proceso").set(latest['rss_mb'] * 1024 * 1024)
+        registry.gauge('bot_process_threads', "Hilos del proceso").set(latest['threads'])
+        registry.gauge('bot_process_open_fds', "Descriptores (o handles) abiertos").set(latest['fds'])
+
+    outbound = getattr(bot, 'outbound', None)
+    if outbound is not None:
+        stats = outbound.stats()
+        counter = registry.counter('bot_outbound_messages_total', "Mensajes de la cola de envíos por resultado",
+                                   ('result',))
+        for result in ('sent', 'failed', 'coalesced', 'rate_limited'):
+            counter.labels(result).set(stats[result])
+        registry.gauge('bot_outbound_queue_depth', "Mensajes esperando en la cola de envíos").set(stats['queue_depth'])
+
+    store = getattr(bot, 'json_store', None)
+    if store is not None:
+        stats = store.stats()
+        writes = registry.counter('bot_store_writes_total', "Escrituras de cada documento JSON", ('document',))
+        failures = registry.counter('bot_store_write_failures_total', "Escrituras fallidas de cada documento JSON",
+                                    ('document',))
+        for name, doc in stats['documents'].items():
+            writes.labels(name).set(doc['writes'])
+            failures.labels(name).set(doc['failures'])
+        registry.gauge('bot_store_dirty_documents', "Documentos pendientes de escribir").set(len(stats['dirty']))
+
+    scheduler = getattr(bot, 'job_scheduler', None)
+    if scheduler is not None:
+        lag = registry.gauge('bot_scheduler_lag_seconds', "Retraso de la última ejecución de cada tarea", ('job',))
+        for name, job in scheduler.stats().items():
+            lag.labels(name).set(job['last_lag_ms'] / 1000)
+
+def get_metrics(bot) -> MetricsRegistry:
+    """Devuelve el registro de métricas compartido del bot (lo crea al primer uso)"""
+    registry = getattr(bot, 'metrics', None)
+    if registry is None:
+        registry = MetricsRegistry()
+        registry.add_collector(functools.partial(_collect_services, bot))
+        bot.metrics = registry
+    return registry
+
+def instrument_bot(bot) -> MetricsRegistry:
+    """Engancha las métricas de comandos y de peticiones REST (una sola vez)"""
+    registry = get_metrics(bot)
+    if getattr(bot, '_metrics_instrumented', False):
+        return registry
+    bot._metrics_instrumented = True
+
+    invocations = registry.counter('bot_commands_total', "Comandos invocados", ('command',))
+    errors = registry.counter('bot_command_errors_total', "Comandos que terminaron en error", ('command', 'error'))
+    latency = registry.histogram('bot_command_duration_seconds', "Duración de los comandos", ('command', 'status'))
+    started: Dict[int, float] = {}
+
+    def command_name(ctx) -> str:
+        return ctx.command.qualified_name if ctx.command else 'desconocido'
+
+    # El check global se ejecuta dentro del task del comando antes que nada,
+    # así que marca el inicio y deja fijado el cog para las peticiones REST
+    def start_check(ctx):
+        if len(started) > 1000:
+            started.clear()  # Comandos cancelados que nunca avisaron de su fin
+        started[id(ctx)] = time.perf_counter()
+        cog = ctx.command.cog_name if ctx.command else None
+        origin.set(cog or 'main')
+        return True
+
+    async def on_command(ctx):
+        invocations.labels(command_name(ctx)).inc()
+
+    async def on_command_completion(ctx):
+        start = started.pop(id(ctx), None)
+        if start is not None:
+            latency.labels(command_name(ctx), 'ok').observe(time.perf_counter() - start)
+
+    async def on_command_error(ctx, error):
+        if isinstance(error, commands.CommandNotFound):
+            return
+        error = getattr(error, 'original', error)
+        errors.labels(command_name(ctx), type(error).__name__).inc()
+        start = started.pop(id(ctx), None)
+        if start is not None:
+            latency.labels(command_name(ctx), 'error').observe(time.perf_counter() - start)
+
+    bot.add_check(start_check, call_once=True)
+    bot.add_listener(on_command)
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
+
+    rest_total = registry.counter('bot_rest_requests_total', "Peticiones a la API de Discord",
+                                  ('cog', 'method', 'route', 'status'))
+    rest_latency = registry.histogram('bot_rest_duration_seconds', "Duración de las peticiones a la API por cog",
+                                      ('cog',))
+    request = bot.http.request
+
+    @functools.wraps(request)
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        status = '2xx'
+        try:
+            return await request(route, **kwargs)
+        except discord.HTTPException as e:
+            status = str(e.status)
+            raise
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            cog = origin.get()
+            rest_total.labels(cog, route.method, route.path, status).inc()
+            rest_latency.labels(cog).observe(time.perf_counter() - start)
+
+    bot.http.request = timed_request
+    return registry
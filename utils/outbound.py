@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import discord
+
+from utils.metrics import origin
+
+# Prioridades (menor = antes)
+HIGH = 0
+NORMAL = 5
+LOW = 10
+
+class TokenBucket:
+    """Token bucket por destino (Discord permite ~5 mensajes / 5 s por canal)"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos hasta que haya un token disponible"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def penalize(self, retry_after: float):
+        """Vacía el bucket tras un 429 para respetar el retry_after"""
+        self.tokens = min(self.tokens, 0.0) - retry_after * self.rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+@dataclass(order=True)
+class OutboundMessage:
+    """Mensaje pendiente de enviar"""
+    priority: int
+    seq: int
+    destination: discord.abc.Messageable = field(compare=False)
+    kwargs: dict = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    coalesce_key: Optional[Hashable] = field(default=None, compare=False)
+    attempts: int = field(default=0, compare=False)
+    origin: str = field(default='otro', compare=False)  # Cog que lo encoló, para las métricas REST
+
+def _destination_key(destination) -> Tuple[str, int]:
+    """Clave del bucket: los DMs se limitan por usuario y el resto por canal"""
+    if isinstance(destination, (discord.User, discord.Member)):
+        return ('user', destination.id)
+    channel = getattr(destination, 'channel', destination)  # Context -> canal
+    return ('channel', channel.id)
+
+class OutboundScheduler:
+    """Cola central de mensajes salientes compartida por todos los cogs.
+
+    Los cogs encolan y siguen; un único dispatcher reparte los envíos
+    respetando un token bucket por canal/DM, prioridades y un límite de
+    envíos concurrentes. Los mensajes con la misma ``coalesce_key`` que aún
+    no se han enviado se sustituyen por el más reciente.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate: float = 1.0, burst: float = 5.0, max_attempts: int = 3):
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues: Dict[Tuple[str, int], List[OutboundMessage]] = {}
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        self._pending_by_coalesce: Dict[Tuple[Tuple[str, int], Hashable], OutboundMessage] = {}
+        self._in_flight: set = set()
+        self._deliveries: set = set()  # Referencias a los envíos en curso para que no los recoja el GC
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.metrics = {'sent': 0, 'failed': 0, 'coalesced': 0, 'rate_limited': 0}
+
+    # --- API pública ---
+
+    def enqueue(self, destination, *, priority: int = NORMAL, coalesce_key: Optional[Hashable] = None,
+                **send_kwargs) -> asyncio.Future:
+        """Encola un ``destination.send(**send_kwargs)`` y devuelve un future con el mensaje"""
+        key = _destination_key(destination)
+
+        if coalesce_key is not None:
+            pending = self._pending_by_coalesce.get((key, coalesce_key))
+            if pending is not None:
+                pending.kwargs = send_kwargs
+                self.metrics['coalesced'] += 1
+                return pending.future
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        job = OutboundMessage(priority, next(self._seq), destination, send_kwargs, future, coalesce_key,
+                              origin=origin.get())
+        heapq.heappush(self._queues.setdefault(key, []), job)
+        if coalesce_key is not None:
+            self._pending_by_coalesce[(key, coalesce_key)] = job
+
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        return future
+
+    async def send(self, destination, **kwargs):
+        """Encola y espera a que el mensaje se envíe"""
+        return await self.enqueue(destination, **kwargs)
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth(),
+            'in_flight': len(self._in_flight),
+            'destinations': len(self._queues),
+            **self.metrics,
+        }
+
+    async def close(self, timeout: float = 5.0):
+        """Intenta vaciar la cola; después detiene el dispatcher y cancela los envíos que sigan en curso"""
+        deadline = time.monotonic() + timeout
+        while (self._queues or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for task in self._deliveries:
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    # --- Dispatcher ---
+
+    def _ensure_dispatcher(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    def _bucket(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            next_wait = None
+
+            # Destinos ordenados por la prioridad de su primer mensaje
+            for key in sorted(self._queues, key=lambda k: self._queues[k][0]):
+                if key in self._in_flight:
+                    continue  # un envío a la vez por destino para mantener el orden
+                delay = self._bucket(key).delay(now)
+                if delay > 0:
+                    next_wait = delay if next_wait is None else min(next_wait, delay)
+                    continue
+                if self._semaphore.locked():
+                    break  # se despierta cuando termina algún envío
+
+                await self._semaphore.acquire()
+                queue = self._queues[key]
+                job = heapq.heappop(queue)
+                if not queue:
+                    del self._queues[key]
+                if job.coalesce_key is not None:
+                    self._pending_by_coalesce.pop((key, job.coalesce_key), None)
+
+                self._bucket(key).consume()
+                self._in_flight.add(key)
+                task = asyncio.create_task(self._deliver(key, job))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+            self._prune_buckets(now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune_buckets(self, now: float):
+        """Olvida los buckets llenos de destinos sin mensajes pendientes"""
+        if len(self._buckets) > 256:
+            for key in [k for k, b in self._buckets.items()
+                        if k not in self._queues and k not in self._in_flight and b.is_full(now)]:
+                del self._buckets[key]
+
+    async def _deliver(self, key, job: OutboundMessage):
+        origin.set(job.origin)
+        try:
+            job.attempts += 1
+            message = await job.destination.send(**job.kwargs)
+            self.metrics['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(message)
+        except (discord.HTTPException, discord.RateLimited) as e:
+            # RateLimited se lanza cuando el retry_after supera el máximo de discord.py
+            if isinstance(e, discord.RateLimited) or e.status == 429:
+                self.metrics['rate_limited'] += 1
+                if job.attempts < self.max_attempts:
+                    self._bucket(key).penalize(getattr(e, 'retry_after', 5.0))
+                    heapq.heappush(self._queues.setdefault(key, []), job)
+                    if job.coalesce_key is not None:
+                        # Vuelve a estar en cola: los siguientes enqueue deben sustituirlo
+                        self._pending_by_coalesce.setdefault((key, job.coalesce_key), job)
+                    return
+            self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            self._in_flight.discard(key)
+            self._semaphore.release()
+            self._wakeup.set()
+
+    def _fail(self, job: OutboundMessage, error: Exception):
+        self.metrics['failed'] += 1
+        print(f"Error sending queued message: {error}")
+        if not job.future.done():
+            job.future.set_exception(error)
+
+def _consume_exception(future: asyncio.Future):
+    """Evita avisos de 'exception was never retrieved' en envíos sin esperar"""
+    if not future.cancelled():
+        future.exception()
+
+def get_outbound(bot) -> OutboundScheduler:
+    """Devuelve el scheduler compartido del bot (lo crea al primer uso)"""
+    scheduler = getattr(bot, 'outbound', None)
+    if scheduler is None:
+        scheduler = OutboundScheduler()
+        bot.outbound = scheduler
+    return scheduler
@@ -0,0 +1,119 @@
+"""Muestreo en segundo plano de los recursos del proceso.
+
+Cada ``interval`` segundos una tarea del planificador apunta CPU, RSS,
+hilos, descriptores abiertos y el peor lag del event loop desde la muestra
+anterior en un buffer circular de tamaño fijo (15 minutos). ``ºinfo`` lee
+de aquí en vez de medir en el momento, así que responde al instante: nada
+de ``cpu_percent(interval=0.1)`` durmiendo el loop ni de crear un
+``psutil.Process`` en cada llamada.
+"""
+import itertools
+import math
+import os
+import time
+from array import array
+from typing import Dict, Optional
+
+from utils.lazy import lazy_import
+from utils.loop_monitor import get_loop_monitor
+from utils.scheduler import Every, get_scheduler
+
+psutil = lazy_import("psutil")
+
+COLUMNS = ('cpu', 'rss_mb', 'threads', 'fds', 'lag_ms')
+WINDOWS = {'1m': 60, '5m': 300, '15m': 900}
+
+class ResourceSampler:
+    """Buffer circular de muestras de recursos del proceso"""
+
+    def __init__(self, interval: float = 5.0, history: float = 900.0, monitor=None):
+        self.interval = interval
+        self.capacity = int(math.ceil(history / interval)) + 1
+        self._times = array('d', [0.0] * self.capacity)
+        self._columns = {name: array('d', [math.nan] * self.capacity) for name in COLUMNS}
+        self._next = 0  # Posición de la próxima muestra
+        self._size = 0
+        self._process = None
+        self.create_time: Optional[float] = None
+        self._monitor = monitor  # LoopMonitor del que sacar el lag, si lo hay
+
+    async def sample(self):
+        """Toma una muestra (la llama el planificador)"""
+        if self._process is None:
+            if not psutil.available():
+                return
+            await psutil.load_async()
+            self._process = psutil.Process(os.getpid())
+            self.create_time = self._process.create_time()
+            self._process.cpu_percent(None)  # La primera llamada solo fija la referencia
+            return
+
+        proc = self._process
+        with proc.oneshot():
+            cpu = proc.cpu_percent(None)
+            rss = proc.memory_info().rss / (1024 * 1024)
+            threads = proc.num_threads()
+            fds = proc.num_fds() if hasattr(proc, 'num_fds') else proc.num_handles()
+
+        lag = 0.0
+        if self._monitor is not None:
+            # El peor lag desde la muestra anterior, no solo el último
+            recent = int(self.interval / self._monitor.interval) + 1
+            lag = max(itertools.islice(reversed(self._monitor.samples), recent), default=0.0) * 1000
+        self.record(time.time(), cpu=cpu, rss_mb=rss, threads=threads, fds=fds, lag_ms=lag)
+
+    def record(self, when: float, **values: float):
+        i = self._next
+        self._times[i] = when
+        for name, column in self._columns.items():
+            column[i] = values.get(name, math.nan)
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self._size:
+            return None
+        i = (self._next - 1) % self.capacity
+        return {'time': self._times[i], **{name: column[i] for name, column in self._columns.items()}}
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """Media, p50, p95 y máximo de cada columna en los últimos ``seconds``"""
+        now = time.time() if now is None else now
+        indices = []
+        for k in range(1, self._size + 1):
+            i = (self._next - k) % self.capacity
+            if now - self._times[i] > seconds:
+                break
+            indices.append(i)
+
+        result = {}
+        for name, column in self._columns.items():
+            values = sorted(v for v in (column[i] for i in indices) if not math.isnan(v))
+            if not values:
+                result[name] = {'avg': math.nan, 'p50': math.nan, 'p95': math.nan, 'max': math.nan, 'n': 0}
+                continue
+            result[name] = {
+                'avg': sum(values) / len(values),
+                'p50': values[min(len(values) - 1, int(len(values) * 0.50))],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+                'n': len(values),
+            }
+        return result
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {'latest': self.latest(), **{name: self.window(seconds, now) for name, seconds in WINDOWS.items()}}
+
+def get_resource_sampler(bot) -> ResourceSampler:
+    """Devuelve el muestreador compartido del bot (lo crea y lo programa al primer uso).
+
+    El intervalo se puede cambiar con la variable de entorno ``RESOURCE_SAMPLE_SECONDS``.
+    """
+    sampler = getattr(bot, 'resource_sampler', None)
+    if sampler is None:
+        sampler = ResourceSampler(interval=float(os.environ.get("RESOURCE_SAMPLE_SECONDS", 5.0)),
+                                  monitor=get_loop_monitor(bot))
+        get_scheduler(bot).add("recursos", Every(sampler.interval), sampler.sample, persist=False)
+        bot.resource_sampler = sampler
+    return sampler
@@ -0,0 +1,296 @@
+"""Planificador de tareas compartido por los cogs.
+
+Los cogs registran tareas con nombre (``add``) y una regla de ejecución
+(``Cron``, ``Every`` o ``At``) en vez de lanzar cada uno su propio
+``tasks.loop`` o ``asyncio.sleep``. Un único task duerme hasta la próxima
+tarea del heap. La última ejecución de cada tarea se guarda en el almacén
+JSON para recuperar, tras un reinicio, las ejecuciones perdidas dentro de su
+ventana ``catch_up``. Las horas son locales, igual que el ``datetime.now()``
+que usan los cogs.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from utils.json_store import JsonDocument, get_store
+from utils.metrics import MetricsRegistry, get_metrics, origin, record_loop
+
+class Schedule:
+    """Regla de ejecución: devuelve la siguiente ejecución posterior a ``after``"""
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        raise NotImplementedError
+
+def _as_set(value: Union[None, int, Iterable[int]], full: range) -> List[int]:
+    if value is None:
+        return list(full)
+    if isinstance(value, int):
+        return [value]
+    return sorted(set(value))
+
+class Cron(Schedule):
+    """Minuto/hora/día de la semana al estilo cron (``None`` = cualquiera).
+
+    ``Cron(hour=16)`` se ejecuta todos los días a las 16:00 y
+    ``Cron(hour=9, minute=30, weekdays=[0, 2])`` los lunes y miércoles a las 9:30.
+    """
+    __slots__ = ('minutes', 'hours', 'weekdays')
+
+    def __init__(self, minute: Union[None, int, Iterable[int]] = 0, hour: Union[None, int, Iterable[int]] = None,
+                 weekdays: Union[None, int, Iterable[int]] = None):
+        self.minutes = _as_set(minute, range(60))
+        self.hours = _as_set(hour, range(24))
+        self.weekdays = set(_as_set(weekdays, range(7)))
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(8):
+            candidate_day = day + timedelta(days=offset)
+            if candidate_day.weekday() not in self.weekdays:
+                continue
+            for hour in self.hours:
+                for minute in self.minutes:
+                    candidate = candidate_day.replace(hour=hour, minute=minute)
+                    if candidate > after:
+                        return candidate
+        return None
+
+    def __repr__(self):
+        return f"Cron(minute={self.minutes}, hour={self.hours}, weekdays={sorted(self.weekdays)})"
+
+class Every(Schedule):
+    """Cada ``seconds`` segundos, más un retraso aleatorio opcional de hasta ``jitter``"""
+    __slots__ = ('seconds', 'jitter')
+
+    def __init__(self, seconds: float = 0.0, *, minutes: float = 0.0, hours: float = 0.0, jitter: float = 0.0):
+        self.seconds = seconds + minutes * 60 + hours * 3600
+        self.jitter = jitter
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        delay = self.seconds + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        return after + timedelta(seconds=delay)
+
+    def __repr__(self):
+        return f"Every({self.seconds}s, jitter={self.jitter}s)"
+
+class At(Schedule):
+    """Una sola ejecución en ``when``"""
+    __slots__ = ('when',)
+
+    def __init__(self, when: datetime):
+        self.when = when
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        return self.when if self.when > after else None
+
+    def __repr__(self):
+        return f"At({self.when.isoformat(timespec='seconds')})"
+
+@dataclass(eq=False)
+class Job:
+    """Tarea registrada y sus métricas"""
+    name: str
+    schedule: Schedule
+    callback: Callable[[], Awaitable]
+    catch_up: Optional[timedelta]
+    persist: bool
+    next_run: Optional[datetime] = None
+    last_run: Optional[datetime] = None
+    running: bool = False
+    runs: int = 0
+    failures: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+    last_runtime: float = 0.0
+    total_runtime: float = 0.0
+    _entry: int = field(default=-1, repr=False)
+
+class JobScheduler:
+    """Ejecuta las tareas de todos los cogs desde un único timer.
+
+    Una tarea nunca se solapa consigo misma: la siguiente ejecución se
+    calcula cuando termina la actual. Si se pierden varias ejecuciones
+    (bot caído, loop bloqueado), se recuperan como una sola.
+    """
+
+    MAX_SLEEP = 300.0  # Reajustarse si cambia el reloj del sistema
+
+    def __init__(self, state: JsonDocument, ready: Optional[Callable[[], Awaitable]] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self._state = state
+        self._ready = ready
+        self._metrics = metrics
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[datetime, int, Job]] = []
+        self._seq = itertools.count()
+        self._waiter: Optional[asyncio.Future] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._running_tasks: set = set()
+
+    # --- API pública ---
+
+    def add(self, name: str, schedule: Schedule, callback: Callable[[], Awaitable], *,
+            catch_up: Optional[timedelta] = None, persist: bool = True) -> Job:
+        """Registra (o sustituye) la tarea ``name``.
+
+        Si la tarea ya se había ejecutado antes y perdió alguna ejecución hace
+        menos de ``catch_up``, se ejecuta en cuanto arranque el planificador.
+        """
+        self.remove(name)
+        now = datetime.now()
+        job = Job(name, schedule, callback, catch_up, persist)
+        job.last_run = self.last_run(name) if persist else None
+
+        next_run = None
+        if job.last_run and catch_up is not None:
+            # La última ejecución perdida dentro de la ventana (no la primera: tras
+            # varios días caído, la primera queda fuera y la de hoy no)
+            missed = schedule.next_after(max(job.last_run, now - catch_up - timedelta(microseconds=1)))
+            while missed is not None and missed <= now:
+                next_run = missed
+                missed = schedule.next_after(missed)
+                if missed is not None and missed <= next_run:
+                    break  # Regla que no avanza: no colgar el arranque
+        if next_run is None:
+            next_run = schedule.next_after(now)
+
+        self._jobs[name] = job
+        self._push(job, next_run)
+        return job
+
+    def remove(self, name: str) -> None:
+        """Da de baja la tarea; si se está ejecutando, termina pero no se reprograma"""
+        job = self._jobs.pop(name, None)
+        if job is not None:
+            job._entry = -1
+
+    def reschedule(self, name: str) -> None:
+        """Recalcula la siguiente ejecución (p. ej. cuando cambian los datos de la regla)"""
+        job = self._jobs.get(name)
+        if job is not None and not job.running:
+            self._push(job, job.schedule.next_after(datetime.now()))
+
+    def last_run(self, name: str) -> Optional[datetime]:
+        """Última ejecución guardada de la tarea ``name``"""
+        job = self._jobs.get(name)
+        if job is not None and job.last_run is not None:
+            return job.last_run
+        saved = self._state.data['jobs'].get(name, {}).get('last_run')
+        return datetime.fromisoformat(saved) if saved else None
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                'next_run': job.next_run,
+                'last_run': job.last_run,
+                'running': job.running,
+                'runs': job.runs,
+                'failures': job.failures,
+                'last_lag_ms': job.last_lag * 1000,
+                'max_lag_ms': job.max_lag * 1000,
+                'last_runtime_ms': job.last_runtime * 1000,
+                'avg_runtime_ms': job.total_runtime / job.runs * 1000 if job.runs else 0.0,
+            }
+            for name, job in sorted(self._jobs.items())
+        }
+
+    async def close(self):
+        if self._runner:
+            self._runner.cancel()
+            self._runner = None
+        for task in list(self._running_tasks):
+            task.cancel()
+        await self._state.flush()
+
+    # --- Timer ---
+
+    def _push(self, job: Job, when: Optional[datetime]):
+        job.next_run = when
+        if when is None:
+            job._entry = -1
+            return
+        job._entry = next(self._seq)
+        heapq.heappush(self._heap, (when, job._entry, job))
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run_loop())
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _run_loop(self):
+        if self._ready is not None:
+            await self._ready()
+
+        loop = asyncio.get_running_loop()
+        while True:
+            now = datetime.now()
+
+            while self._heap and self._heap[0][0] <= now:
+                when, entry, job = heapq.heappop(self._heap)
+                if entry != job._entry or self._jobs.get(job.name) is not job:
+                    continue  # Entrada sustituida o tarea dada de baja
+                job._entry = -1
+                job.running = True
+                task = asyncio.create_task(self._execute(job, when))
+                self._running_tasks.add(task)
+                task.add_done_callback(self._running_tasks.discard)
+
+            timeout = self.MAX_SLEEP
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - datetime.now()).total_seconds()))
+            # Un future simple en vez de wait_for(Event.wait()): en 3.11 wait_for
+            # puede tragarse la cancelación si el evento se activa a la vez
+            self._waiter = loop.create_future()
+            timer = loop.call_later(timeout, self._wake)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+
+    async def _execute(self, job: Job, scheduled: datetime):
+        started = datetime.now()
+        job.last_lag = max(0.0, (started - scheduled).total_seconds())
+        job.max_lag = max(job.max_lag, job.last_lag)
+        # Cada ejecución es su propio task: las peticiones REST se atribuyen al cog de la tarea
+        origin.set(getattr(getattr(job.callback, '__self__', None), 'qualified_name', job.name))
+        start = time.perf_counter()
+        failed = False
+        try:
+            await job.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = True
+            job.failures += 1
+            print(f"Error en la tarea programada {job.name}: {e}")
+        finally:
+            job.last_runtime = time.perf_counter() - start
+            if self._metrics is not None:
+                record_loop(self._metrics, job.name, job.last_runtime, failed)
+            job.total_runtime += job.last_runtime
+            job.runs += 1
+            job.running = False
+            job.last_run = started
+
+        if job.persist:
+            self._state.data['jobs'][job.name] = {'last_run': started.isoformat()}
+            self._state.mark_dirty()
+        if self._jobs.get(job.name) is job:
+            self._push(job, job.schedule.next_after(datetime.now()))
+
+def get_scheduler(bot) -> JobScheduler:
+    """Devuelve el planificador compartido del bot (lo crea al primer uso)"""
+    scheduler = getattr(bot, 'job_scheduler', None)
+    if scheduler is None:
+        state = get_store(bot).document("scheduler", lambda: {'jobs': {}})
+        scheduler = JobScheduler(state, ready=getattr(bot, 'wait_until_ready', None), metrics=get_metrics(bot))
+        bot.job_scheduler = scheduler
+    return scheduler
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import base64
+import io
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
+
+async def preload():
+    """Importa numpy en un hilo; hay que llamarlo antes del primer ``observe_guild``"""
+    await np.load_async()
+
+# Resoluciones estilo RRD: nombre -> (segundos por hueco, número de huecos)
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "minute": (60, 1440),    # 24 horas
+    "hour": (3600, 168),     # 7 días
+    "day": (86400, 365),     # 1 año
+}
+
+class _Archive:
+    """Buffer circular de tamaño fijo con la media de cada hueco"""
+    __slots__ = ('step', 'size', 'values', 'counts', 'last_slot')
+
+    def __init__(self, step: int, size: int):
+        self.step = step
+        self.size = size
+        self.values = np.zeros(size, dtype=np.float32)
+        self.counts = np.zeros(size, dtype=np.uint16)
+        self.last_slot: Optional[int] = None
+
+    def _advance(self, slot: int):
+        """Pone a cero los huecos que se han saltado desde la última muestra"""
+        if self.last_slot is None or slot - self.last_slot >= self.size:
+            self.values[:] = 0
+            self.counts[:] = 0
+        elif slot > self.last_slot:
+            idx = np.arange(self.last_slot + 1, slot + 1) % self.size
+            self.values[idx] = 0
+            self.counts[idx] = 0
+        self.last_slot = slot
+
+    def add(self, ts: float, value: float):
+        slot = int(ts) // self.step
+        if self.last_slot is None or slot > self.last_slot:
+            self._advance(slot)
+        elif slot <= self.last_slot - self.size:
+            return  # demasiado antigua para este archivo
+        i = slot % self.size
+        n = self.counts[i]
+        if n < np.iinfo(np.uint16).max:
+            self.values[i] = (self.values[i] * n + value) / (n + 1)
+            self.counts[i] = n + 1
+
+    def window(self, now: float) -> np.ndarray:
+        """Copia ordenada (más antiguo primero) terminando en el hueco actual"""
+        slot = int(now) // self.step
+        if self.last_slot is None or slot - self.last_slot >= self.size:
+            return np.zeros(self.size, dtype=np.float32)
+        out = np.roll(self.values, -(self.last_slot % self.size + 1))
+        gap = slot - self.last_slot
+        if gap > 0:
+            out = np.concatenate((out[gap:], np.zeros(gap, dtype=np.float32)))
+        return out
+
+    def dump(self) -> dict:
+        """Estado serializable: los buffers van en base64 tal cual están en memoria"""
+        return {
+            'last_slot': self.last_slot,
+            'values': base64.b64encode(self.values.tobytes()).decode('ascii'),
+            'counts': base64.b64encode(self.counts.tobytes()).decode('ascii'),
+        }
+
+    def restore(self, data: dict):
+        values = np.frombuffer(base64.b64decode(data['values']), dtype=np.float32)
+        counts = np.frombuffer(base64.b64decode(data['counts']), dtype=np.uint16)
+        if len(values) != self.size or len(counts) != self.size:
+            return  # Guardado con otra resolución: se descarta
+        self.values = values.copy()
+        self.counts = counts.copy()
+        self.last_slot = data['last_slot']
+
+class GameSeries:
+    """Serie temporal de jugadores concurrentes de un juego a varias resoluciones"""
+    __slots__ = ('archives', 'last_active')
+
+    def __init__(self):
+        self.archives = {name: _Archive(step, size) for name, (step, size) in RESOLUTIONS.items()}
+        self.last_active = 0.0
+
+    def observe(self, value: int, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        if value:
+            self.last_active = ts
+        for archive in self.archives.values():
+            archive.add(ts, value)
+
+    def window(self, resolution: str, now: Optional[float] = None) -> np.ndarray:
+        return self.archives[resolution].window(time.time() if now is None else now)
+
+    def dump(self) -> dict:
+        return {'last_active': self.last_active, 'archives': {name: a.dump() for name, a in self.archives.items()}}
+
+    def restore(self, data: dict):
+        self.last_active = data.get('last_active', 0.0)
+        for name, archive in data.get('archives', {}).items():
+            if name in self.archives:
+                self.archives[name].restore(archive)
+
+class GameSeriesRegistry:
+    """Series por (guild, juego) con un número máximo fijo de series por guild.
+
+    ``saved`` es lo que devolvió ``dump`` en la ejecución anterior; se
+    reconstruye en ``restore`` (necesita numpy, así que después de ``preload``).
+    """
+
+    def __init__(self, max_series_per_guild: int = 40, saved: Optional[dict] = None):
+        self.max_series_per_guild = max_series_per_guild
+        self._series: Dict[int, Dict[str, GameSeries]] = {}
+        self._saved = saved or None  # Pendiente de restaurar
+
+    def observe_guild(self, guild_id: int, counts: Dict[str, int], ts: Optional[float] = None):
+        """Registra una muestra del tick: los juegos ausentes cuentan como 0"""
+        ts = time.time() if ts is None else ts
+        guild_series = self._series.setdefault(guild_id, {})
+
+        for game in counts:
+            if game not in guild_series:
+                if len(guild_series) >= self.max_series_per_guild:
+                    # Expulsar la serie que lleva más tiempo sin jugadores
+                    stale = min(guild_series, key=lambda g: guild_series[g].last_active)
+                    del guild_series[stale]
+                guild_series[game] = GameSeries()
+
+        for game, series in guild_series.items():
+            series.observe(counts.get(game, 0), ts)
+
+    def windows(self, guild_id: int, resolution: str, games: Optional[List[str]] = None,
+                limit: int = 5, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Copias de las ventanas de los juegos con más jugadores en el periodo"""
+        guild_series = self._series.get(guild_id, {})
+        names = games if games else list(guild_series)
+        data = {name: guild_series[name].window(resolution, now) for name in names if name in guild_series}
+        data = {name: values for name, values in data.items() if values.any()}
+        top = sorted(data, key=lambda name: float(data[name].max()), reverse=True)[:limit]
+        return {name: data[name] for name in top}
+
+    def forget_guild(self, guild_id: int):
+        self._series.pop(guild_id, None)
+
+    def restore(self):
+        """Reconstruye las series guardadas (una sola vez)"""
+        saved, self._saved = self._saved, None
+        for guild_id, games in (saved or {}).items():
+            guild_series = self._series.setdefault(int(guild_id), {})
+            for game, data in list(games.items())[:self.max_series_per_guild]:
+                try:
+                    series = GameSeries()
+                    series.restore(data)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Error restaurando la serie de {game}: {e}")
+                    continue
+                guild_series.setdefault(game, series)
+
+    def dump(self) -> dict:
+        """Estado para el almacén JSON (lo guardado, tal cual, si aún no se ha restaurado)"""
+        if self._saved is not None:
+            return self._saved
+        return {str(guild_id): {game: series.dump() for game, series in guild_series.items()}
+                for guild_id, guild_series in self._series.items()}
+
+# --- Renderizado (se ejecuta fuera del event loop) ---
+
+_COLORS = [(67, 181, 129), (114, 137, 218), (250, 166, 26), (240, 71, 71), (155, 89, 182)]
+
+def render_chart(series: Dict[str, np.ndarray], step: int, title: str,
+                 width: int = 800, height: int = 360) -> bytes:
+    """Dibuja un gráfico de líneas con PIL y lo devuelve como PNG"""
+    img = Image.new('RGB', (width, height), (35, 39, 42))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+
+    left, right, top, bottom = 40, width - 10, 30, height - 60
+    draw.text((left, 8), title, fill=(245, 246, 250), font=font)
+
+    max_value = max((float(v.max()) for v in series.values()), default=0.0)
+    y_max = max(2, int(np.ceil(max_value)))
+    points = max((len(v) for v in series.values()), default=2)
+
+    # Rejilla horizontal y eje Y
+    for i in range(y_max + 1):
+        if y_max > 10 and i % (y_max // 5 or 1):
+            continue
+        y = bottom - (bottom - top) * i / y_max
+        draw.line([(left, y), (right, y)], fill=(60, 64, 68))
+        draw.text((5, y - 6), str(i), fill=(185, 187, 190), font=font)
+
+    # Marcas del eje X (tiempo relativo a ahora)
+    span = points * step
+    unit, unit_name = (86400, "d") if span > 2 * 86400 else (3600, "h")
+    ticks = 6
+    for i in range(ticks + 1):
+        x = left + (right - left) * i / ticks
+        ago = round(span * (ticks - i) / ticks / unit)
+        label = "ahora" if ago == 0 else f"-{ago}{unit_name}"
+        draw.line([(x, bottom), (x, bottom + 4)], fill=(185, 187, 190))
+        draw.text((min(x - 12, right - 30), bottom + 6), label, fill=(185, 187, 190), font=font)
+
+    # Líneas de cada juego
+    for n, (name, values) in enumerate(series.items()):
+        color = _COLORS[n % len(_COLORS)]
+        xs = np.linspace(left, right, len(values))
+        ys = bottom - (bottom - top) * values / y_max
+        draw.line(list(zip(xs.tolist(), ys.tolist())), fill=color, width=2)
+
+        # Leyenda
+        lx = left + n * ((right - left) // max(1, len(series)))
+        draw.rectangle([lx, height - 22, lx + 10, height - 12], fill=color)
+        draw.text((lx + 14, height - 24), name[:24], fill=(245, 246, 250), font=font)
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()